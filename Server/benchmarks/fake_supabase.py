@@ -0,0 +1,411 @@
+"""In-memory stand-in for the parts of the Supabase query builder the Server jobs use.
+
+Supports table/from_, select (with column lists and one-level embeds such as
+"*, license_type_settings(*)"), eq/neq/gt/gte/lt/lte/like/in_/is_/filter/or_,
+order/limit/range, insert, update and upsert. Every execute() is counted so the benchmarks can
+report queries per table. Rows are matched with the same null semantics PostgREST uses:
+a comparison against a null column never matches.
+"""
+import re
+import json
+import bisect
+import threading
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Mirrors api.max_rows in supabase/config.toml
+DEFAULT_MAX_ROWS = 1000
+
+# Columns kept in hash indexes for eq/in lookups
+INDEXED_COLUMNS = ("id", "user_id")
+
+
+def _sort_key(value: Any) -> Tuple[int, Any]:
+    """Comparable key for a column value; ISO timestamps compare as instants."""
+    if isinstance(value, bool):
+        return (1, int(value))
+    if isinstance(value, (int, float)):
+        return (1, value)
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return (2, value.timestamp())
+    if isinstance(value, str):
+        if len(value) >= 19 and value[10] == "T":
+            try:
+                parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+                if parsed.tzinfo is None:
+                    parsed = parsed.replace(tzinfo=timezone.utc)
+                return (2, parsed.timestamp())
+            except ValueError:
+                pass
+        if len(value) == 10 and value[4] == "-" and value[7] == "-":
+            try:
+                parsed = datetime.fromisoformat(value).replace(tzinfo=timezone.utc)
+                return (2, parsed.timestamp())
+            except ValueError:
+                pass
+        return (3, value)
+    return (4, str(value))
+
+
+def _coerce(value: Any) -> Any:
+    """Turn a PostgREST filter literal into the Python value it stands for."""
+    if isinstance(value, str):
+        lowered = value.lower()
+        if lowered == "null":
+            return None
+        if lowered == "true":
+            return True
+        if lowered == "false":
+            return False
+    return value
+
+
+def _like(pattern: str) -> "re.Pattern":
+    return re.compile("^" + ".*".join(re.escape(part) for part in pattern.split("%")) + "$", re.S)
+
+
+def _condition(column: str, op: str, value: Any) -> Callable[[Dict[str, Any]], bool]:
+    """Build a row predicate for one PostgREST operator."""
+    if op in ("is", "not.is"):
+        expected = _coerce(value)
+        negate = op == "not.is"
+        return lambda row: (row.get(column) is expected) != negate
+    if op == "like":
+        regex = _like(value)
+        return lambda row: row.get(column) is not None and bool(regex.match(str(row.get(column))))
+    if op == "in":
+        members = value
+        if isinstance(members, str):
+            members = members.strip("()").split(",")
+        keys = {_sort_key(_coerce(member)) for member in members}
+        return lambda row: row.get(column) is not None and _sort_key(row.get(column)) in keys
+
+    target = _sort_key(_coerce(value))
+    compare = {
+        "eq": lambda key: key == target,
+        "neq": lambda key: key != target,
+        "gt": lambda key: key > target,
+        "gte": lambda key: key >= target,
+        "lt": lambda key: key < target,
+        "lte": lambda key: key <= target
+    }[op]
+    return lambda row: row.get(column) is not None and compare(_sort_key(row.get(column)))
+
+
+def _split_top_level(columns: str) -> List[str]:
+    parts, depth, current = [], 0, []
+    for char in columns:
+        if char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        if char == "," and depth == 0:
+            parts.append("".join(current).strip())
+            current = []
+        else:
+            current.append(char)
+    if current:
+        parts.append("".join(current).strip())
+    return [part for part in parts if part]
+
+
+class FakeResponse:
+    def __init__(self, data: List[Dict[str, Any]], count: Optional[int] = None):
+        self.data = data
+        self.count = count
+
+
+class FakeQuery:
+    def __init__(self, client: "FakeSupabase", table: str):
+        self.client = client
+        self.table = table
+        self.operation = "select"
+        self.columns = "*"
+        self.payload = None
+        self.conditions: List[Tuple[str, str, Any, Callable]] = []
+        self.order_by: Optional[Tuple[str, bool]] = None
+        self.row_limit: Optional[int] = None
+        self.row_range: Optional[Tuple[int, int]] = None
+        self.count_mode = None
+        self.on_conflict: Optional[str] = None
+        self.ignore_duplicates = False
+
+    # Query shape
+    def select(self, columns: str = "*", count: Optional[str] = None, **kwargs) -> "FakeQuery":
+        self.columns = columns
+        self.count_mode = count
+        return self
+
+    def insert(self, payload, **kwargs) -> "FakeQuery":
+        self.operation = "insert"
+        self.payload = payload
+        return self
+
+    def upsert(self, payload, on_conflict: str = "", ignore_duplicates: bool = False, **kwargs) -> "FakeQuery":
+        self.operation = "upsert"
+        self.payload = payload
+        self.on_conflict = on_conflict or "id"
+        self.ignore_duplicates = ignore_duplicates
+        return self
+
+    def update(self, payload: Dict[str, Any], **kwargs) -> "FakeQuery":
+        self.operation = "update"
+        self.payload = payload
+        return self
+
+    def delete(self, **kwargs) -> "FakeQuery":
+        self.operation = "delete"
+        return self
+
+    def order(self, column: str, desc: bool = False, **kwargs) -> "FakeQuery":
+        self.order_by = (column, desc)
+        return self
+
+    def limit(self, size: int, **kwargs) -> "FakeQuery":
+        self.row_limit = size
+        return self
+
+    def range(self, start: int, end: int, **kwargs) -> "FakeQuery":
+        self.row_range = (start, end)
+        return self
+
+    # Filters
+    def filter(self, column: str, operator: str, criteria: Any) -> "FakeQuery":
+        self.conditions.append((column, operator, criteria, _condition(column, operator, criteria)))
+        return self
+
+    def eq(self, column: str, value: Any) -> "FakeQuery":
+        return self.filter(column, "eq", value)
+
+    def neq(self, column: str, value: Any) -> "FakeQuery":
+        return self.filter(column, "neq", value)
+
+    def gt(self, column: str, value: Any) -> "FakeQuery":
+        return self.filter(column, "gt", value)
+
+    def gte(self, column: str, value: Any) -> "FakeQuery":
+        return self.filter(column, "gte", value)
+
+    def lt(self, column: str, value: Any) -> "FakeQuery":
+        return self.filter(column, "lt", value)
+
+    def lte(self, column: str, value: Any) -> "FakeQuery":
+        return self.filter(column, "lte", value)
+
+    def like(self, column: str, pattern: str) -> "FakeQuery":
+        return self.filter(column, "like", pattern)
+
+    def in_(self, column: str, values) -> "FakeQuery":
+        return self.filter(column, "in", list(values))
+
+    def is_(self, column: str, value: Any) -> "FakeQuery":
+        return self.filter(column, "is", value)
+
+    def or_(self, filters: str, **kwargs) -> "FakeQuery":
+        alternatives = []
+        for part in _split_top_level(filters):
+            column, rest = part.split(".", 1)
+            if rest.startswith("not."):
+                operator, value = rest[4:].split(".", 1)
+                inner = _condition(column, operator, value.strip('"'))
+                alternatives.append(lambda row, inner=inner: not inner(row))
+            else:
+                operator, value = rest.split(".", 1)
+                alternatives.append(_condition(column, operator, value.strip('"')))
+        self.conditions.append(("", "or", filters, lambda row: any(alt(row) for alt in alternatives)))
+        return self
+
+    def execute(self) -> FakeResponse:
+        return self.client._execute(self)
+
+
+class FakeSupabase:
+    """Thread-safe in-memory database with a Supabase-like client surface."""
+
+    def __init__(self, tables: Optional[Dict[str, List[Dict[str, Any]]]] = None, max_rows: int = DEFAULT_MAX_ROWS):
+        self.tables: Dict[str, List[Dict[str, Any]]] = {name: list(rows) for name, rows in (tables or {}).items()}
+        self.max_rows = max_rows
+        self.queries: Counter = Counter()
+        self.rows_returned = 0
+        # JSON size of the rows returned by selects and updates, as PostgREST would send them
+        self.bytes_returned = 0
+        self._indexes: Dict[Tuple[str, str], Dict[Any, List[Dict[str, Any]]]] = {}
+        self._sorted: Dict[Tuple[str, str], Tuple[List[Any], List[Dict[str, Any]]]] = {}
+        self._next_id = 1
+        self._lock = threading.RLock()
+
+    def table(self, name: str) -> FakeQuery:
+        return FakeQuery(self, name)
+
+    from_ = table
+
+    @property
+    def total_queries(self) -> int:
+        return sum(self.queries.values())
+
+    def reset_stats(self) -> None:
+        self.queries.clear()
+        self.rows_returned = 0
+        self.bytes_returned = 0
+
+    # Caches
+    def _invalidate(self, table: str, columns=None) -> None:
+        for cache in (self._indexes, self._sorted):
+            for key in [key for key in cache if key[0] == table and (columns is None or key[1] in columns)]:
+                del cache[key]
+
+    def _index(self, table: str, column: str) -> Dict[Any, List[Dict[str, Any]]]:
+        key = (table, column)
+        if key not in self._indexes:
+            index: Dict[Any, List[Dict[str, Any]]] = {}
+            for row in self.tables.get(table, []):
+                if row.get(column) is not None:
+                    index.setdefault(_sort_key(row[column]), []).append(row)
+            self._indexes[key] = index
+        return self._indexes[key]
+
+    def _sorted_rows(self, table: str, column: str) -> Tuple[List[Any], List[Dict[str, Any]]]:
+        key = (table, column)
+        if key not in self._sorted:
+            rows = [row for row in self.tables.get(table, []) if row.get(column) is not None]
+            rows.sort(key=lambda row: _sort_key(row[column]))
+            self._sorted[key] = ([_sort_key(row[column]) for row in rows], rows)
+        return self._sorted[key]
+
+    # Execution
+    def _candidates(self, query: FakeQuery):
+        """Pick the cheapest row source: a hash index, a sorted scan, or the whole table."""
+        for column, operator, value, _ in query.conditions:
+            if column in INDEXED_COLUMNS and operator in ("eq", "in"):
+                index = self._index(query.table, column)
+                values = value if operator == "in" else [value]
+                rows = []
+                for member in values:
+                    rows.extend(index.get(_sort_key(_coerce(member)), []))
+                return rows, False
+
+        if query.order_by and not query.order_by[1]:
+            column = query.order_by[0]
+            keys, rows = self._sorted_rows(query.table, column)
+            start = 0
+            for cond_column, operator, value, _ in query.conditions:
+                if cond_column == column and operator in ("gt", "gte"):
+                    target = _sort_key(_coerce(value))
+                    position = bisect.bisect_right(keys, target) if operator == "gt" else bisect.bisect_left(keys, target)
+                    start = max(start, position)
+            return rows[start:], True
+
+        return self.tables.get(query.table, []), False
+
+    def _matches(self, query: FakeQuery) -> List[Dict[str, Any]]:
+        offset, wanted = 0, None
+        if query.row_range:
+            offset = query.row_range[0]
+            wanted = query.row_range[1] - query.row_range[0] + 1
+        if query.row_limit is not None:
+            wanted = query.row_limit if wanted is None else min(wanted, query.row_limit)
+
+        rows, presorted = self._candidates(query)
+        predicates = [predicate for _, _, _, predicate in query.conditions]
+        if presorted and wanted is not None and query.operation == "select":
+            # Ordered scan: stop as soon as the requested window is filled
+            matched = []
+            for row in rows:
+                if all(predicate(row) for predicate in predicates):
+                    matched.append(row)
+                    if len(matched) >= offset + wanted:
+                        break
+            return matched[offset:offset + wanted]
+
+        matched = [row for row in rows if all(predicate(row) for predicate in predicates)]
+        if query.order_by and not presorted:
+            column, descending = query.order_by
+            present = [row for row in matched if row.get(column) is not None]
+            missing = [row for row in matched if row.get(column) is None]
+            present.sort(key=lambda row: _sort_key(row[column]), reverse=descending)
+            matched = present + missing
+        if wanted is not None or offset:
+            matched = matched[offset:offset + wanted if wanted is not None else None]
+        return matched
+
+    def _project(self, row: Dict[str, Any], columns: str) -> Dict[str, Any]:
+        if columns.strip() == "*":
+            return dict(row)
+        projected: Dict[str, Any] = {}
+        for part in _split_top_level(columns):
+            if part == "*":
+                projected.update(row)
+            elif "(" in part:
+                # One-level embed of a child table joined on child.user_id = parent.id
+                child, child_columns = part[:-1].split("(", 1)
+                child = child.strip()
+                children = self._index(child, "user_id").get(_sort_key(row.get("id")), [])
+                projected[child] = [self._project(child_row, child_columns) for child_row in children]
+            else:
+                projected[part] = row.get(part)
+        return projected
+
+    def _execute(self, query: FakeQuery) -> FakeResponse:
+        with self._lock:
+            self.queries[(query.table, query.operation)] += 1
+
+            if query.operation == "insert":
+                records = query.payload if isinstance(query.payload, list) else [query.payload]
+                stored = []
+                now = datetime.now(timezone.utc).isoformat()
+                for record in records:
+                    row = dict(record)
+                    if row.get("id") is None:
+                        row["id"] = self._next_id
+                        self._next_id += 1
+                    row.setdefault("created_at", now)
+                    stored.append(row)
+                self.tables.setdefault(query.table, []).extend(stored)
+                self._invalidate(query.table)
+                return FakeResponse([dict(row) for row in stored])
+
+            if query.operation == "upsert":
+                key_columns = [column.strip() for column in query.on_conflict.split(",")]
+                rows = self.tables.setdefault(query.table, [])
+                by_key = {tuple(row.get(column) for column in key_columns): row for row in rows}
+                records = query.payload if isinstance(query.payload, list) else [query.payload]
+                stored = []
+                for record in records:
+                    row = by_key.get(tuple(record.get(column) for column in key_columns))
+                    if row is None:
+                        row = dict(record)
+                        rows.append(row)
+                        by_key[tuple(record.get(column) for column in key_columns)] = row
+                    elif query.ignore_duplicates:
+                        continue
+                    else:
+                        row.update(record)
+                    stored.append(row)
+                self._invalidate(query.table)
+                return FakeResponse([dict(row) for row in stored])
+
+            matched = self._matches(query)
+
+            if query.operation == "delete":
+                deleted = {id(row) for row in matched}
+                self.tables[query.table] = [row for row in self.tables.get(query.table, []) if id(row) not in deleted]
+                self._invalidate(query.table)
+                return FakeResponse([dict(row) for row in matched])
+
+            if query.operation == "update":
+                for row in matched:
+                    row.update(query.payload)
+                self._invalidate(query.table, set(query.payload))
+                data = [self._project(row, query.columns) for row in matched]
+                self.rows_returned += len(data)
+                self.bytes_returned += len(json.dumps(data, default=str))
+                return FakeResponse(data)
+
+            count = len(matched) if query.count_mode else None
+            data = [self._project(row, query.columns) for row in matched[:self.max_rows]]
+            self.rows_returned += len(data)
+            self.bytes_returned += len(json.dumps(data, default=str))
+            return FakeResponse(data, count)
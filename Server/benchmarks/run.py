@@ -0,0 +1,168 @@
+"""Offline benchmarks for the Server jobs.
+
+Runs LicenseReminderService.send_reminders, NotificationManager.process_all_tables and
+update_expired_subscriptions against an in-memory Supabase stand-in and a local SMTP
+sink, at several synthetic user counts, and reports wall time, queries per user and
+messages per second.
+
+Run from the Server directory:
+
+    python -m benchmarks.run                       # 1k, 10k and 100k users
+    python -m benchmarks.run --users 1000 --jobs reminders --concurrent
+    python -m benchmarks.run --users 100000 --jobs reminders --schedule
+    python -m benchmarks.run --users 1000 --jobs reminders --check-rerun
+    python -m benchmarks.run --json bench.json
+
+--check-rerun runs send_reminders a second time on the same day's data with the journal
+and outbox off, and fails if that run sends anything: the reminder frequency and pause
+notice checks alone must hold back every email already sent.
+"""
+import io
+import os
+import sys
+import shutil
+import tempfile
+import json
+import time
+import logging
+import argparse
+import contextlib
+from typing import Any, Callable, Dict, List
+
+from benchmarks.fake_supabase import FakeSupabase
+from benchmarks.smtp_sink import SMTPSink
+from benchmarks.synthetic import generate_dataset
+
+JOBS = ("reminders", "notify", "subscriptions")
+
+
+def _measure(users: int, fake: FakeSupabase, run: Callable[[], Any], sink: SMTPSink = None) -> Dict[str, Any]:
+    fake.reset_stats()
+    if sink:
+        sink.reset_stats()
+    started = time.perf_counter()
+    # The jobs print or log per item; keep that out of the measurement
+    with contextlib.redirect_stdout(io.StringIO()):
+        run()
+    wall_time = time.perf_counter() - started
+    queries = fake.total_queries
+    messages = sink.messages if sink else 0
+    return {
+        "users": users,
+        "wall_time_s": round(wall_time, 3),
+        "queries": queries,
+        "queries_per_user": round(queries / users, 4) if users else 0,
+        "rows_returned": fake.rows_returned,
+        "bytes_returned": fake.bytes_returned,
+        "messages": messages,
+        "messages_per_s": round(messages / wall_time, 1) if wall_time else 0,
+        "smtp_connections": sink.connections if sink else 0,
+        "queries_by_table": {f"{table}.{operation}": count for (table, operation), count in sorted(fake.queries.items())}
+    }
+
+
+def bench_reminders(users: int, seed: int, concurrent: bool, sink: SMTPSink, schedule: bool = False,
+                    check_rerun: bool = False) -> Dict[str, Any]:
+    import send_reminders
+    from smtp_pool import SMTPConnectionPool
+
+    fake = FakeSupabase(generate_dataset(users, seed))
+    # Outbox messages are parsed back before sending, so they need a real From address
+    send_reminders.EMAIL_USERNAME = send_reminders.EMAIL_USERNAME or "reminders@bench.example"
+    journal_dir = tempfile.mkdtemp(prefix="reminder-bench-")
+    pool = SMTPConnectionPool("127.0.0.1", sink.port, "bench", "bench",
+                              pool_size=send_reminders.SMTP_POOL_SIZE, use_starttls=False)
+    service = send_reminders.LicenseReminderService(
+        fake, smtp_pool=pool, journal_path=os.path.join(journal_dir, "journal.sqlite3"),
+        outbox_path=os.path.join(journal_dir, "outbox.sqlite3"), use_schedule=schedule)
+    try:
+        result = _measure(users, fake, lambda: service.send_reminders(concurrent=concurrent), sink)
+        result["notifications_written"] = service.notification_writer.written_count
+        if check_rerun:
+            rerun = send_reminders.LicenseReminderService(fake, smtp_pool=pool, journal_path="", outbox_path="",
+                                                          use_schedule=schedule)
+            sink.reset_stats()
+            with contextlib.redirect_stdout(io.StringIO()):
+                rerun.send_reminders(concurrent=concurrent)
+            result["rerun_messages"] = sink.messages
+    finally:
+        pool.close()
+        shutil.rmtree(journal_dir, ignore_errors=True)
+    return result
+
+
+def bench_notify(users: int, seed: int) -> Dict[str, Any]:
+    import manage_notify
+
+    fake = FakeSupabase(generate_dataset(users, seed))
+    manager = manage_notify.NotificationManager(fake)
+    outcome = {}
+    result = _measure(users, fake, lambda: outcome.update(manager.process_all_tables()))
+    result["rows_updated"] = sum(len(ids) for ids in outcome.values())
+    return result
+
+
+def bench_subscriptions(users: int, seed: int) -> Dict[str, Any]:
+    import check_subscriptions
+
+    fake = FakeSupabase(generate_dataset(users, seed))
+    outcome = []
+    result = _measure(users, fake, lambda: outcome.append(check_subscriptions.update_expired_subscriptions(fake)))
+    result["rows_updated"] = outcome[0] if outcome else 0
+    return result
+
+
+def run(user_counts: List[int], jobs: List[str], seed: int, concurrent: bool, schedule: bool = False,
+        check_rerun: bool = False) -> List[Dict[str, Any]]:
+    results = []
+    with SMTPSink() as sink:
+        for users in user_counts:
+            for job in jobs:
+                if job == "reminders":
+                    result = bench_reminders(users, seed, concurrent, sink, schedule, check_rerun)
+                elif job == "notify":
+                    result = bench_notify(users, seed)
+                else:
+                    result = bench_subscriptions(users, seed)
+                result["job"] = job
+                results.append(result)
+                print(f"{job:<14} users={users:<7} wall={result['wall_time_s']:>8.3f}s "
+                      f"queries={result['queries']:<7} q/user={result['queries_per_user']:<8} "
+                      f"messages={result['messages']:<6} msg/s={result['messages_per_s']}", flush=True)
+    return results
+
+
+def main(argv: List[str] = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the Server jobs offline.")
+    parser.add_argument("--users", type=int, nargs="+", default=[1000, 10000, 100000],
+                        help="synthetic user counts to run (default: 1000 10000 100000)")
+    parser.add_argument("--jobs", nargs="+", choices=JOBS, default=list(JOBS))
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--concurrent", action="store_true", help="run send_reminders with the staged pipeline")
+    parser.add_argument("--schedule", action="store_true", help="run send_reminders from the reminder_schedule table")
+    parser.add_argument("--check-rerun", action="store_true",
+                        help="fail if a second send_reminders run on the same day sends any email")
+    parser.add_argument("--json", help="write the results to this file as JSON")
+    parser.add_argument("--verbose", action="store_true", help="keep the jobs' INFO logging")
+    args = parser.parse_args(argv)
+
+    # Import the jobs first so their logging setup runs, then quieten it
+    import send_reminders, manage_notify, check_subscriptions  # noqa: F401
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+
+    results = run(args.users, args.jobs, args.seed, args.concurrent, args.schedule, args.check_rerun)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as output:
+            json.dump(results, output, indent=2)
+        print(f"Wrote {args.json}", file=sys.stderr)
+    resent = [result for result in results if result.get("rerun_messages")]
+    for result in resent:
+        print(f"Rerun check failed: a second run for {result['users']} users sent {result['rerun_messages']} emails",
+              file=sys.stderr)
+    if resent:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Local SMTP server that accepts and discards mail, counting what it receives.
+
+It speaks enough SMTP for smtplib: EHLO/HELO, AUTH PLAIN/LOGIN (any credentials), MAIL,
+RCPT, DATA, RSET, NOOP and QUIT. STARTTLS is not offered, so clients must connect
+with STARTTLS disabled (SMTPConnectionPool(use_starttls=False)).
+"""
+import socketserver
+import threading
+
+
+class _SMTPSinkHandler(socketserver.StreamRequestHandler):
+    def _reply(self, line: str) -> None:
+        self.wfile.write((line + "\r\n").encode("ascii"))
+
+    def handle(self) -> None:
+        sink: "SMTPSink" = self.server.sink
+        with sink._lock:
+            sink.connections += 1
+        self._reply("220 smtp-sink ready")
+
+        while True:
+            raw = self.rfile.readline()
+            if not raw:
+                return
+            command = raw.decode("utf-8", "replace").strip()
+            verb = command.split(" ", 1)[0].upper()
+
+            if verb in ("EHLO", "HELO"):
+                self.wfile.write(b"250-smtp-sink\r\n250-AUTH PLAIN LOGIN\r\n250 8BITMIME\r\n")
+            elif verb == "AUTH":
+                mechanism = command.split(" ")[1].upper() if " " in command else ""
+                if mechanism == "LOGIN" and len(command.split(" ")) == 2:
+                    self._reply("334 VXNlcm5hbWU6")
+                    self.rfile.readline()
+                    self._reply("334 UGFzc3dvcmQ6")
+                    self.rfile.readline()
+                self._reply("235 2.7.0 Authentication successful")
+            elif verb in ("MAIL", "RCPT", "RSET", "NOOP"):
+                self._reply("250 OK")
+            elif verb == "DATA":
+                self._reply("354 End data with <CR><LF>.<CR><LF>")
+                size = 0
+                while True:
+                    line = self.rfile.readline()
+                    if not line or line in (b".\r\n", b".\n"):
+                        break
+                    size += len(line)
+                with sink._lock:
+                    sink.messages += 1
+                    sink.bytes_received += size
+                self._reply("250 OK: queued")
+            elif verb == "QUIT":
+                self._reply("221 Bye")
+                return
+            else:
+                self._reply("502 Command not implemented")
+
+
+class _ThreadingSMTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class SMTPSink:
+    """Run the sink on a background thread; use as a context manager or call start/stop."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self.host = host
+        self.port = port
+        self.connections = 0
+        self.messages = 0
+        self.bytes_received = 0
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    def start(self) -> "SMTPSink":
+        self._server = _ThreadingSMTPServer((self.host, self.port), _SMTPSinkHandler)
+        self._server.sink = self
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name="smtp-sink", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self.connections = 0
+            self.messages = 0
+            self.bytes_received = 0
+
+    def __enter__(self) -> "SMTPSink":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
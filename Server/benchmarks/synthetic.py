@@ -0,0 +1,157 @@
+"""Synthetic users, settings, license rows and notification history for the benchmarks.
+
+The shape follows the tables the Server jobs read: profiles with subscriptions, per-type
+license_type_settings, the ten license tables with their expiry and status columns, the
+reminder_schedule the migration's triggers would maintain, and a tail of recent
+notifications. Output is deterministic for a given seed.
+"""
+import random
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, List
+
+from reminder_history import pause_notice_message, reminder_message
+from reminder_schedule import next_due_date
+
+# Settings type -> table, as in LicenseReminderService.type_to_table_map
+SETTINGS_TYPES = {
+    "drivers": "drivers",
+    "firearms": "firearms",
+    "prpd": "prpd",
+    "vehicles": "vehicles",
+    "works": "works",
+    "others": "other_documents",
+    "passports": "passports",
+    "tvlicenses": "tv_licenses",
+    "psira": "psira_records",
+    "competency": "competency"
+}
+
+# Tables with a status column and the value that marks an active row
+STATUS_COLUMNS = {
+    "drivers": ("status", "active"),
+    "firearms": ("status", "active"),
+    "prpd": ("status", "active"),
+    "vehicles": ("status", "active"),
+    "works": ("status", "active"),
+    "psira_records": ("reg_status", "ACTIVE"),
+    "competency": ("status", "active")
+}
+
+FIRST_NAMES = ["Thabo", "Lerato", "Sipho", "Anele", "Johan", "Priya", "Zanele", "Pieter", "Naledi", "Ayesha"]
+LAST_NAMES = ["Nkosi", "van der Merwe", "Dlamini", "Naidoo", "Botha", "Mokoena", "Pillay", "Smith", "Khumalo", "Jacobs"]
+
+# Average license rows per user, spread across the tables
+ROWS_PER_USER = 3
+
+
+def _display_fields(table: str, rng: random.Random) -> Dict[str, Any]:
+    first_name, last_name = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+    number = f"{rng.randrange(10**8):08d}"
+    fields = {
+        "vehicles": {"make": rng.choice(["Toyota", "VW", "Ford"]), "model": rng.choice(["Hilux", "Polo", "Ranger"]),
+                     "registration_number": f"CA {number[:6]}"},
+        "firearms": {"make_model": rng.choice(["Glock 19", "CZ P-10", "Beretta 92"]), "caliber": "9mm",
+                     "registration_number": number},
+        "works": {"contract_name": f"Contract {number[:4]}", "company_name": rng.choice(["Acme", "Sasol", "Eskom"])},
+        "other_documents": {"description": rng.choice(["Insurance policy", "Lease agreement", "Permit"])},
+        "passports": {"first_name": first_name, "last_name": last_name, "passport_number": f"A{number}"},
+        "tv_licenses": {"first_name": first_name, "last_name": last_name, "license_number": number},
+        "psira_records": {"first_name": first_name, "last_name": last_name, "psira_number": number},
+        "competency": {"first_name": first_name, "last_name": last_name, "firearm_type": "Handgun"}
+    }.get(table, {"first_name": first_name, "last_name": last_name, "id_number": number + number[:5]})
+    # Wide free-text columns the jobs never read
+    fields["notes"] = "x" * rng.randrange(0, 400)
+    fields["front_image"] = f"https://storage.example/{number}.jpg"
+    return fields
+
+
+def generate_dataset(users: int, seed: int = 42, today: date = None) -> Dict[str, List[Dict[str, Any]]]:
+    """Build every table for the given number of users."""
+    rng = random.Random(seed)
+    today = today or date.today()
+    now = datetime.now(timezone.utc)
+    tables: Dict[str, List[Dict[str, Any]]] = {name: [] for name in
+                                               ["profiles", "license_type_settings", "notifications", "reminder_schedule",
+                                                *SETTINGS_TYPES.values()]}
+    row_id = 0
+
+    for index in range(users):
+        user_id = f"00000000-0000-4000-8000-{index:012d}"
+        active = rng.random() < 0.9
+        end_offset = rng.randrange(-60, 365)
+        tables["profiles"].append({
+            "id": user_id,
+            "email": f"user{index}@example.com",
+            "first_name": rng.choice(FIRST_NAMES),
+            "last_name": rng.choice(LAST_NAMES),
+            "type_of_user": "premium" if active else "registered",
+            "subscription_status": "active" if active else "expired",
+            "subscription_end_date": (now + timedelta(days=end_offset)).isoformat() if rng.random() < 0.8 else None,
+            "updated_at": (now - timedelta(days=rng.randrange(0, 90))).isoformat()
+        })
+
+        settings_by_table = {}
+        for settings_type, settings_table in SETTINGS_TYPES.items():
+            if rng.random() < 0.6:
+                settings_by_table[settings_table] = {
+                    "id": f"s-{index}-{settings_type}",
+                    "user_id": user_id,
+                    "type": settings_type,
+                    "notifications_enabled": rng.random() < 0.8,
+                    "reminder_days_before": rng.choice([7, 14, 30, 60]),
+                    "reminder_frequency": rng.choice(["daily", "weekly", "monthly"])
+                }
+                tables["license_type_settings"].append(settings_by_table[settings_table])
+
+        for _ in range(rng.randrange(0, ROWS_PER_USER * 2 + 1)):
+            table = rng.choice(list(SETTINGS_TYPES.values()))
+            row_id += 1
+            expiry_field = "certificate_expiry_date" if table == "psira_records" else "expiry_date"
+            expiry = today + timedelta(days=rng.randrange(-30, 730))
+            paused = rng.random() < 0.1
+            row = {
+                "id": f"{table}-{row_id}",
+                "user_id": user_id,
+                expiry_field: expiry.isoformat() if rng.random() < 0.95 else None,
+                "notifications_paused": paused,
+                "updated_at": (now - timedelta(days=rng.randrange(0, 10), hours=rng.randrange(0, 24))).isoformat(),
+                **_display_fields(table, rng)
+            }
+            if table in STATUS_COLUMNS:
+                column, active_value = STATUS_COLUMNS[table]
+                row[column] = active_value if rng.random() < 0.9 else active_value.swapcase()
+            tables[table].append(row)
+
+            status = STATUS_COLUMNS.get(table)
+            if row[expiry_field] and (status is None or row[status[0]] == status[1]):
+                settings = settings_by_table.get(table, {})
+                due = next_due_date(expiry, settings.get("reminder_days_before"), settings.get("reminder_frequency"),
+                                    settings.get("notifications_enabled", False), None)
+                tables["reminder_schedule"].append({
+                    "license_type": table,
+                    "license_id": row["id"],
+                    "user_id": user_id,
+                    "expiry_date": expiry.isoformat(),
+                    "next_due_date": due.isoformat() if due else None,
+                    "last_sent_at": None
+                })
+
+            # Some items already had a reminder or pause notice recently
+            if rng.random() < 0.05:
+                # The messages the reminder run writes, so the history checks see them
+                days_until = rng.randrange(1, 30)
+                message = rng.choice([
+                    reminder_message(days_until, today + timedelta(days=days_until)),
+                    pause_notice_message(today + timedelta(days=5))
+                ])
+                tables["notifications"].append({
+                    "id": f"n-{row_id}",
+                    "user_id": user_id,
+                    "license_type": table,
+                    "license_id": row["id"],
+                    "message": message,
+                    "read": False,
+                    "created_at": (now - timedelta(days=rng.randrange(0, 40))).isoformat()
+                })
+
+    return tables
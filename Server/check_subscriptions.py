@@ -1,72 +1,159 @@
 import os
+import time
+import logging
+import argparse
 from datetime import datetime, timezone, timedelta
 from supabase import create_client
 from dotenv import load_dotenv
 
+from column_projections import columns_for, select_list
+from log_setup import configure_logging
+from metrics import RunMetrics, instrument_client
+from rate_limit import supabase_rate_limits
+from watermarks import WatermarkStore
+
+# Log through the shared queued setup (see log_setup)
+configure_logging("check_subscriptions.log", logging.INFO)
+logger = logging.getLogger(__name__)
+
 # Load environment variables
 load_dotenv()
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
+# Profiles updated per page when falling back to paginated updates
+SUBSCRIPTION_PAGE_SIZE = int(os.getenv("SUBSCRIPTION_PAGE_SIZE") or 500)
+# Where run metrics go at the end: Prometheus textfile for .prom, JSON summary otherwise
+METRICS_FILE = os.getenv("SUBSCRIPTION_METRICS_FILE", "check_subscriptions_metrics.json")
+# Name and scope the job's watermark (the last end date cutoff checked) is stored under
+WATERMARK_JOB = "check_subscriptions"
+WATERMARK_SCOPE = "profiles"
+
+# Profiles that are not already downgraded (null-safe: NOT (expired AND registered))
+NOT_ALREADY_EXPIRED = (
+    "subscription_status.is.null,subscription_status.neq.expired,"
+    "type_of_user.is.null,type_of_user.neq.registered"
+)
+# Profile columns read back: only the ids of the rows updated
+PROFILE_SELECT = select_list(columns_for("check_subscriptions", "profiles"))
 
-# Initialize Supabase client
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
-print("Connected to Supabase database successfully.")
+def expired_subscription_update(current_time):
+    """The fields written to a profile whose subscription has expired."""
+    return {
+        "type_of_user": "registered",
+        "subscription_status": "expired",
+        "updated_at": current_time.isoformat()
+    }
 
-def update_expired_subscriptions():
+def _ended_before(query, current_time, since=None):
+    """Restrict a profiles query to subscriptions that ended before current_time, and at or after since if given."""
+    query = query.filter("subscription_end_date", "lt", current_time.isoformat())
+    if since is not None:
+        query = query.filter("subscription_end_date", "gte", since.isoformat())
+    return query.or_(NOT_ALREADY_EXPIRED)
+
+def expire_subscriptions_bulk(supabase, current_time, since=None):
     """
-    Check for expired subscriptions and update user status accordingly.
-    Skip admin users when checking for expired subscriptions.
+    Downgrade every profile whose subscription ended before current_time in one update.
+    With since, only subscriptions that ended at or after it are looked at.
+    Returns the IDs of the updated profiles.
     """
-    try:
-        # Get all users with subscription end dates (regardless of current status)
-        response = supabase.from_("profiles") \
-            .select("*") \
-            .filter("subscription_end_date", "not.is", "null") \
+    query = supabase.from_("profiles").update(expired_subscription_update(current_time))
+    response = _ended_before(query, current_time, since) \
+        .select(PROFILE_SELECT) \
+        .execute()
+    return [user['id'] for user in response.data or []]
+
+def expire_subscriptions_paginated(supabase, current_time, page_size=SUBSCRIPTION_PAGE_SIZE, since=None):
+    """
+    Downgrade expired profiles a page at a time, walking candidates by id.
+    With since, only subscriptions that ended at or after it are looked at.
+    Returns the IDs of the updated profiles.
+    """
+    updated_ids = []
+    last_id = None
+    while True:
+        query = _ended_before(supabase.from_("profiles").select(PROFILE_SELECT), current_time, since)
+        if last_id is not None:
+            query = query.filter("id", "gt", last_id)
+        response = query.order("id").limit(page_size).execute()
+
+        page_ids = [user['id'] for user in response.data or []]
+        if not page_ids:
+            break
+
+        update_response = supabase.from_("profiles") \
+            .update(expired_subscription_update(current_time)) \
+            .in_("id", page_ids) \
+            .select(PROFILE_SELECT) \
             .execute()
+        updated_ids.extend(user['id'] for user in update_response.data or [])
+        logger.info("Updated page of %d expired subscriptions", len(update_response.data or []))
 
+        if len(page_ids) < page_size:
+            break
+        last_id = page_ids[-1]
+    return updated_ids
+
+def update_expired_subscriptions(supabase, paginated=False, metrics=None, full=False):
+    """
+    Check for expired subscriptions and update user status accordingly.
+    Only profiles whose end date has passed and that are not already expired are touched.
+    Uses a single bulk update, falling back to paginated updates if that fails.
+    Only subscriptions that ended since the last run's cutoff (its watermark) are looked
+    at, unless full is set or a full reconcile is due (see watermarks.WatermarkStore).
+    Queries and timings are recorded in metrics when it is given. Queries are rate
+    limited, and retried while Supabase throttles them.
+    """
+    supabase = instrument_client(supabase, metrics or RunMetrics("check_subscriptions"), supabase_rate_limits())
+    try:
         # Use South African timezone (UTC+2)
         sa_timezone = timezone(timedelta(hours=2))
         current_time = datetime.now(sa_timezone)
-        updated_count = 0
-
-        for user in response.data:
-            if not user.get('subscription_end_date'):
-                continue
-
-            # Convert subscription_end_date string to datetime
-            end_date = datetime.fromisoformat(user['subscription_end_date'].replace('Z', '+00:00'))
-            
-            # Check if subscription has expired
-            if current_time > end_date:
-                print(f"Updating expired subscription for user {user['id']}")
-                
-                # Update user to registered type and expired status
-                update_response = supabase.from_("profiles") \
-                    .update({
-                        "type_of_user": "registered",
-                        "subscription_status": "expired",
-                        "updated_at": current_time.isoformat()
-                    }) \
-                    .filter("id", "eq", user['id']) \
-                    .execute()
-                
-                if update_response.data:
-                    updated_count += 1
-                    print(f"Successfully updated user {user['id']}")
-                else:
-                    print(f"Failed to update user {user['id']}")
-
-        print(f"Updated {updated_count} expired subscriptions")
+
+        watermarks = WatermarkStore(supabase)
+        since = watermarks.scan_starts(WATERMARK_JOB, [WATERMARK_SCOPE], full)[WATERMARK_SCOPE]
+        logger.info(f"Checking subscriptions that ended {'at any time' if since is None else f'since {since.isoformat()}'}")
+
+        started = time.perf_counter()
+        if paginated:
+            updated_ids = expire_subscriptions_paginated(supabase, current_time, since=since)
+        else:
+            try:
+                updated_ids = expire_subscriptions_bulk(supabase, current_time, since)
+            except Exception as e:
+                logger.warning(f"Bulk update failed ({e}), falling back to paginated updates")
+                updated_ids = expire_subscriptions_paginated(supabase, current_time, since=since)
+        watermarks.advance(WATERMARK_JOB, WATERMARK_SCOPE, current_time, full=since is None)
+        if metrics is not None:
+            metrics.increment("scans_total", table="profiles", mode="full" if since is None else "incremental")
+            metrics.observe("phase_duration_seconds", time.perf_counter() - started, phase="update_expired_subscriptions")
+            metrics.increment("subscriptions_expired_total", len(updated_ids))
+
+        for user_id in updated_ids:
+            logger.info("Successfully updated user %s", user_id, extra={"user_id": user_id})
+
+        updated_count = len(updated_ids)
+        logger.info(f"Updated {updated_count} expired subscriptions")
         return updated_count
 
     except Exception as e:
-        print(f"Error updating expired subscriptions: {e}")
+        logger.error(f"Error updating expired subscriptions: {e}")
         return 0
 
-def main():
-    print("Starting subscription check...")
-    updated_count = update_expired_subscriptions()
-    print(f"Subscription check completed. Updated {updated_count} users.")
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Downgrade profiles whose subscription has ended.")
+    parser.add_argument("--full", action="store_true", help="check every profile, not just those since the watermark")
+    args = parser.parse_args(argv)
+
+    # Initialize Supabase client
+    supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+    logger.info("Connected to Supabase database successfully.")
+
+    logger.info("Starting subscription check...")
+    metrics = RunMetrics("check_subscriptions")
+    updated_count = update_expired_subscriptions(supabase, metrics=metrics, full=args.full)
+    logger.info(f"Subscription check completed. Updated {updated_count} users.")
+    metrics.write(METRICS_FILE)
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
@@ -0,0 +1,72 @@
+"""The columns each job reads from each table, for building select lists instead of select("*").
+
+A column that is not listed here is not fetched, so a job reading a new column (or a
+template showing a new field) needs it added to the job's entry. License tables share
+one entry per job, under LICENSE_TABLES; each table's expiry and status columns are
+added to it, and for jobs that render license items, the display fields its
+license_formats pattern reads.
+"""
+from typing import Dict, Iterable, Optional, Tuple
+
+# Registry key for the columns a job reads from every license table
+LICENSE_TABLES = "licenses"
+
+SETTINGS_COLUMNS = ("user_id", "type", "reminder_days_before", "reminder_frequency", "notifications_enabled")
+
+COLUMNS: Dict[str, Dict[str, Tuple[str, ...]]] = {
+    # send_reminders: the email greets the user by name; LicenseItem.from_row reads the license columns.
+    # updated_at dates a pause, which manage_notify lifts PAUSE_DAYS later, here and in forecast
+    "reminders": {
+        "profiles": ("id", "email", "first_name", "last_name"),
+        "license_type_settings": SETTINGS_COLUMNS,
+        "notifications": ("created_at",),
+        LICENSE_TABLES: ("id", "user_id", "notifications_paused", "updated_at")
+    },
+    "forecast": {
+        "profiles": ("id", "email"),
+        "license_type_settings": SETTINGS_COLUMNS,
+        LICENSE_TABLES: ("id", "user_id", "notifications_paused", "updated_at")
+    },
+    # manage_notify and check_subscriptions only report the ids of the rows they updated
+    "manage_notify": {
+        LICENSE_TABLES: ("id",)
+    },
+    "check_subscriptions": {
+        "profiles": ("id",)
+    }
+}
+
+# Jobs that render license items, so also read each table's display fields
+RENDERING_JOBS = {"reminders"}
+
+
+def _unique(columns: Iterable[str]) -> Tuple[str, ...]:
+    return tuple(dict.fromkeys(column for column in columns if column))
+
+
+def columns_for(job: str, table: str) -> Tuple[str, ...]:
+    """The registered columns job reads from table."""
+    try:
+        return COLUMNS[job][table]
+    except KeyError:
+        raise KeyError(f"No columns registered for table {table!r} in job {job!r}")
+
+
+def license_columns(job: str, table: str, expiry_field: str = "expiry_date",
+                    status_field: Optional[str] = None) -> Tuple[str, ...]:
+    """The columns job reads from a license table with the given expiry and status columns."""
+    columns = list(columns_for(job, LICENSE_TABLES))
+    columns += [expiry_field, status_field]
+    if job in RENDERING_JOBS:
+        # Imported here so jobs that render nothing do not need license_formats' dependencies
+        from license_formats import get_license_format
+        columns += get_license_format(table).fields
+    return _unique(columns)
+
+
+def select_list(columns: Iterable[str], embeds: Optional[Dict[str, Iterable[str]]] = None) -> str:
+    """A PostgREST select parameter for the columns, with embeds as related_table(columns)."""
+    parts = list(_unique(columns))
+    for related_table, related_columns in (embeds or {}).items():
+        parts.append(f"{related_table}({select_list(related_columns)})")
+    return ",".join(parts)
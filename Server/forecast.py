@@ -0,0 +1,306 @@
+"""Forecast of reminder emails and notification rows per day, for capacity planning.
+
+Loads every active user's license expiry dates and reminder settings once, then replays
+the reminder run's rules over a range of days: the reminder window from
+filter_expiring_licenses, the daily/weekly/monthly frequency from should_send_reminder,
+and pause state, including manage_notify switching pauses back off after PAUSE_DAYS.
+A user's last reminder moves to each day they are emailed about an expiring item, and a
+paused item's last pause notice to each day it is mentioned (every PAUSE_NOTICE_DAYS).
+
+Uses numpy when it is installed, evaluating every item for a day at once, and a plain
+Python walk over each user's reminder windows otherwise.
+
+    python forecast.py                          # next 90 days
+    python forecast.py --days 365 --start 2026-11-01 --json forecast.json
+"""
+import json
+import time
+import logging
+import argparse
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from column_projections import columns_for, license_columns, select_list
+from license_item import LicenseItem
+from license_settings import DEFAULT_REMINDER_DAYS_BEFORE, PAUSE_DAYS
+from log_setup import configure_logging
+from reminder_history import PAUSE_NOTICE_DAYS, ReminderHistoryIndex, parse_created_at
+from reminder_schedule import FREQUENCY_DAYS
+
+logger = logging.getLogger(__name__)
+
+# Days of reminder history the forecast seeds from
+HISTORY_DAYS = max(FREQUENCY_DAYS.values())
+
+
+class ForecastItem(NamedTuple):
+    """One license item reduced to what decides when it is reminded about."""
+    user_id: str
+    expiry_date: date
+    reminder_days_before: Any
+    reminder_frequency: Optional[str]
+    # First day the item is no longer paused; None if it is not paused, date.max if it never resumes
+    paused_until: Optional[date]
+    # Day of the item's last pause notice, None if it has had none recently
+    last_pause_notice: Optional[date] = None
+
+
+class DayForecast(NamedTuple):
+    day: date
+    emails: int
+    notifications: int
+
+
+def _paused_until(row: Dict[str, Any]) -> Optional[date]:
+    """When manage_notify will unpause a paused row: PAUSE_DAYS after its last update."""
+    if not row.get("notifications_paused"):
+        return None
+    updated_at = parse_created_at(row.get("updated_at"))
+    if updated_at is None:
+        return date.max
+    return updated_at.date() + timedelta(days=PAUSE_DAYS)
+
+
+def _select_all(build_query, page_size: int) -> Iterator[Dict[str, Any]]:
+    """Page through a query built fresh for each page by build_query."""
+    start = 0
+    while True:
+        page = build_query().range(start, start + page_size - 1).execute().data or []
+        yield from page
+        if len(page) < page_size:
+            return
+        start += page_size
+
+
+def load_forecast_items(service, start: date, days: int) -> Tuple[List[ForecastItem], Dict[str, date]]:
+    """Read the items that could be reminded about between start and start + days.
+
+    Uses the reminder service's client and table configuration. Returns the items and
+    each user's last reminder date from recent history.
+    """
+    supabase = service.supabase
+    page_size = service.page_size
+    history = ReminderHistoryIndex.load(
+        supabase, datetime.combine(start, datetime.min.time(), timezone.utc) - timedelta(days=HISTORY_DAYS),
+        page_size=page_size
+    )
+
+    profile_columns = select_list(columns_for("forecast", "profiles"))
+    user_ids = {
+        profile["id"] for profile in _select_all(
+            lambda: supabase.table("profiles").select(profile_columns).eq("subscription_status", "active").order("id"),
+            page_size
+        ) if profile.get("email")
+    }
+
+    settings_columns = select_list(columns_for("forecast", "license_type_settings"))
+    settings_by_user: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    for settings in _select_all(
+            lambda: supabase.table("license_type_settings").select(settings_columns).order("id"), page_size):
+        settings_by_user[settings.get("user_id")].append(settings)
+    resolvers = {user_id: service.settings_resolver(rows) for user_id, rows in settings_by_user.items()}
+    longest_days_before = max(
+        [settings["reminder_days_before"] for resolver in resolvers.values() for settings in resolver.settings()
+         if isinstance(settings["reminder_days_before"], int)],
+        default=DEFAULT_REMINDER_DAYS_BEFORE
+    )
+
+    # An item can only be reminded about on days from its window start up to its expiry
+    window_end = (start + timedelta(days=days - 1 + max(longest_days_before, 0))).isoformat()
+    items: List[ForecastItem] = []
+    for table_name in service.tables.values():
+        expiry_field = service.expiry_fields.get(table_name, "expiry_date")
+        status_filter = service.status_filters.get(table_name)
+        columns = select_list(license_columns("forecast", table_name, expiry_field,
+                                              status_filter[0] if status_filter else None))
+
+        def build_query(table_name=table_name, expiry_field=expiry_field, status_filter=status_filter, columns=columns):
+            query = supabase.table(table_name) \
+                .select(columns) \
+                .filter(expiry_field, "not.is", "null") \
+                .gte(expiry_field, start.isoformat()) \
+                .lte(expiry_field, window_end)
+            if status_filter:
+                query = query.eq(*status_filter)
+            return query.order("id")
+
+        for row in _select_all(build_query, page_size):
+            user_id = row.get("user_id")
+            resolver = resolvers.get(user_id)
+            settings = resolver.for_table(table_name) if resolver else None
+            if user_id not in user_ids or settings is None:
+                continue
+            item = LicenseItem.from_row(table_name, row, expiry_field)
+            if item is None:
+                continue
+            item.apply_settings(settings)
+            if item.notifications_enabled:
+                last_pause_notice = history.last_pause_notice(user_id, item.id)
+                items.append(ForecastItem(user_id, item.expiry_date, item.reminder_days_before,
+                                          item.reminder_frequency, _paused_until(row),
+                                          last_pause_notice.date() if last_pause_notice else None))
+
+    last_reminders = {}
+    for user_id in {item.user_id for item in items}:
+        last_reminder = history.last_reminder_date(user_id)
+        if last_reminder is not None:
+            last_reminders[user_id] = last_reminder.date()
+    logger.info(f"Forecast: {len(items)} items of {len({item.user_id for item in items})} users may be reminded about")
+    return items, last_reminders
+
+
+def _frequency_interval(frequency: Optional[str]) -> int:
+    """Days between reminders, or 0 for a frequency that never repeats (should_send_reminder's False)."""
+    return FREQUENCY_DAYS.get(frequency, 0)
+
+
+def forecast(items: List[ForecastItem], start: date, days: int,
+             last_reminders: Optional[Dict[str, date]] = None) -> List[DayForecast]:
+    """Emails and notification rows the reminder run would produce on each of days days from start."""
+    last_reminders = last_reminders or {}
+    if np is not None:
+        return _forecast_vectorized(items, start, days, last_reminders)
+    return _forecast_python(items, start, days, last_reminders)
+
+
+def _forecast_vectorized(items: List[ForecastItem], start: date, days: int,
+                         last_reminders: Dict[str, date]) -> List[DayForecast]:
+    # Items whose days_before cannot make a reminder window never count
+    items = [item for item in items if isinstance(item.reminder_days_before, int)]
+    user_index: Dict[str, int] = {}
+    users = np.fromiter((user_index.setdefault(item.user_id, len(user_index)) for item in items), dtype=np.int64,
+                        count=len(items))
+    expiry = np.fromiter((item.expiry_date.toordinal() for item in items), dtype=np.int64, count=len(items))
+    days_before = np.fromiter((item.reminder_days_before for item in items), dtype=np.int64, count=len(items))
+    interval = np.fromiter((_frequency_interval(item.reminder_frequency) for item in items), dtype=np.int64,
+                           count=len(items))
+    paused_until = np.fromiter(
+        (0 if item.paused_until is None else min(item.paused_until, date.max - timedelta(days=1)).toordinal()
+         for item in items), dtype=np.int64, count=len(items))
+    # Ordinal 0 is long enough ago to allow a pause notice
+    last_notice = np.fromiter((0 if item.last_pause_notice is None else item.last_pause_notice.toordinal()
+                               for item in items), dtype=np.int64, count=len(items))
+    sendable = days_before > 0
+
+    user_count = len(user_index)
+    last = np.zeros(user_count, dtype=np.int64)
+    reminded = np.zeros(user_count, dtype=bool)
+    for user_id, last_reminder in last_reminders.items():
+        if user_id in user_index:
+            last[user_index[user_id]] = last_reminder.toordinal()
+            reminded[user_index[user_id]] = True
+
+    results = []
+    first_day = start.toordinal()
+    for day in range(first_day, first_day + days):
+        days_until = expiry - day
+        in_window = (days_until >= 0) & (days_until <= days_before)
+        paused = in_window & (paused_until > day)
+        noticed = paused & (day - last_notice >= PAUSE_NOTICE_DAYS)
+        since = day - last[users]
+        due = in_window & ~paused & sendable & (
+            ~reminded[users] | ((interval > 0) & (since >= interval))
+        )
+
+        users_due = np.bincount(users[due], minlength=user_count) > 0
+        users_paused = np.bincount(users[noticed], minlength=user_count) > 0
+        last[users_due] = day
+        last_notice[noticed] = day
+        reminded |= users_due
+        # A row per due item, and a pause notice per paused item mentioned
+        results.append(DayForecast(date.fromordinal(day), int(np.count_nonzero(users_due | users_paused)),
+                                   int(np.count_nonzero(due) + np.count_nonzero(noticed))))
+    return results
+
+
+def _forecast_python(items: List[ForecastItem], start: date, days: int,
+                     last_reminders: Dict[str, date]) -> List[DayForecast]:
+    """Walk each user through only the days one of their items is in its reminder window."""
+    end = start + timedelta(days=days - 1)
+    by_user: Dict[str, List[ForecastItem]] = defaultdict(list)
+    for item in items:
+        if isinstance(item.reminder_days_before, int):
+            by_user[item.user_id].append(item)
+
+    emails = [0] * days
+    notifications = [0] * days
+    for user_id, user_items in by_user.items():
+        window_days = set()
+        for item in user_items:
+            window_start = max(start, item.expiry_date - timedelta(days=item.reminder_days_before))
+            for offset in range((min(end, item.expiry_date) - window_start).days + 1):
+                window_days.add(window_start + timedelta(days=offset))
+
+        last_reminder = last_reminders.get(user_id)
+        last_notices = [item.last_pause_notice for item in user_items]
+        for day in sorted(window_days):
+            due_count, notice_count = 0, 0
+            for index, item in enumerate(user_items):
+                days_until = (item.expiry_date - day).days
+                if not 0 <= days_until <= item.reminder_days_before:
+                    continue
+                if item.paused_until is not None and day < item.paused_until:
+                    last_notice = last_notices[index]
+                    if last_notice is None or (day - last_notice).days >= PAUSE_NOTICE_DAYS:
+                        notice_count += 1
+                        last_notices[index] = day
+                    continue
+                if item.reminder_days_before <= 0:
+                    continue
+                interval = _frequency_interval(item.reminder_frequency)
+                if last_reminder is None or (interval and (day - last_reminder).days >= interval):
+                    due_count += 1
+            if due_count or notice_count:
+                position = (day - start).days
+                emails[position] += 1
+                notifications[position] += due_count + notice_count
+            if due_count:
+                last_reminder = day
+
+    return [DayForecast(start + timedelta(days=offset), emails[offset], notifications[offset]) for offset in range(days)]
+
+
+def main(argv: List[str] = None) -> None:
+    # Before send_reminders is imported, so the forecast keeps a log of its own
+    configure_logging("forecast.log", logging.INFO)
+    import send_reminders
+
+    parser = argparse.ArgumentParser(description="Forecast reminder emails and notifications per day.")
+    parser.add_argument("--start", type=date.fromisoformat, default=None, help="first day (default: today)")
+    parser.add_argument("--days", type=int, default=90, help="days to forecast (default: 90)")
+    parser.add_argument("--json", metavar="PATH", help="also write the forecast as JSON")
+    args = parser.parse_args(argv)
+    start = args.start or datetime.now().date()
+
+    service = send_reminders.LicenseReminderService(send_reminders.connect())
+    try:
+        items, last_reminders = load_forecast_items(service, start, args.days)
+    finally:
+        service.smtp_pool.close()
+    started = time.perf_counter()
+    days = forecast(items, start, args.days, last_reminders)
+    logger.info(f"Forecast of {args.days} days over {len(items)} items took {time.perf_counter() - started:.2f}s "
+                f"({'numpy' if np is not None else 'pure Python'})")
+
+    print(f"{'date':<12}{'emails':>8}{'notifications':>15}")
+    for day in days:
+        print(f"{day.day.isoformat():<12}{day.emails:>8}{day.notifications:>15}")
+    peak = max(days, key=lambda day: day.emails, default=None)
+    if peak is not None:
+        print(f"\nTotal: {sum(day.emails for day in days)} emails, {sum(day.notifications for day in days)} notifications; "
+              f"peak {peak.emails} emails on {peak.day.isoformat()}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as handle:
+            json.dump([{"date": day.day.isoformat(), "emails": day.emails, "notifications": day.notifications}
+                       for day in days], handle, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+from string import Formatter
+from typing import Any, Dict, List, Optional, Tuple
+
+from markupsafe import escape
+
+
+class LicenseFormat:
+    """How one kind of license or document is described in reminder emails.
+
+    The details pattern is a str.format-style string over the row's fields. It is parsed
+    once, when the format is built, so rendering an item is a single join over the
+    pre-split literal text and field lookups. Missing or null fields render as
+    empty strings.
+    """
+
+    def __init__(self, icon: str, label: Optional[str], details: str, fallback: str = ""):
+        self.icon = icon
+        self.label = label
+        self.fallback = fallback
+        self._parts: List[Tuple[str, Optional[str]]] = [
+            (literal, field) for literal, field, _, _ in Formatter().parse(details)
+        ]
+        # Row columns the details pattern reads
+        self.fields: Tuple[str, ...] = tuple(field for _, field in self._parts if field is not None)
+
+    def _details(self, item: Any, html: bool) -> str:
+        rendered = []
+        for literal, field in self._parts:
+            rendered.append(literal)
+            if field is not None:
+                value = item.get(field)
+                if value is not None:
+                    rendered.append(str(escape(value)) if html else str(value))
+        details = "".join(rendered).strip()
+        if not details:
+            return str(escape(self.fallback)) if html else self.fallback
+        return details
+
+    def render(self, item: Any, expiry_date: Any) -> Dict[str, Any]:
+        """Render both the plain-text line and the HTML summary for an item in one pass.
+
+        item is a row dict or anything else with a dict-style get(), such as a LicenseItem.
+        """
+        text_details = self._details(item, html=False)
+        html_details = self._details(item, html=True)
+        if self.label:
+            text = f"{self.label}: {text_details} expires on {expiry_date}"
+            html = f"<strong>{self.label}:</strong> {html_details}"
+        else:
+            text = f"{text_details} expires on {expiry_date}"
+            html = f"<strong>{html_details}</strong>"
+        return {
+            "icon": self.icon,
+            "text": text,
+            "html": html,
+            "expiry_date": expiry_date
+        }
+
+
+# One entry per license table; adding a document type only needs a new entry here
+LICENSE_FORMATS: Dict[str, LicenseFormat] = {
+    "vehicles": LicenseFormat("🚗", "Vehicle License", "{make} {model} ({registration_number})"),
+    "drivers": LicenseFormat("🪪", "Driver License", "{first_name} {last_name}"),
+    "prpd": LicenseFormat("📇", "PRPD License", "{first_name} {last_name}"),
+    "firearms": LicenseFormat("🎯", "Firearm License", "{make_model} ({registration_number})"),
+    "works": LicenseFormat("💼", "Work Contract", "{contract_name} with {company_name}"),
+    "passports": LicenseFormat("🛂", "Passport", "{first_name} {last_name} ({passport_number})"),
+    "tv_licenses": LicenseFormat("📺", "TV License", "{first_name} {last_name} ({license_number})"),
+    "psira_records": LicenseFormat("🛡️", "PSIRA Record", "{first_name} {last_name} ({psira_number})"),
+    "competency": LicenseFormat("📜", "Competency Certificate", "{first_name} {last_name} ({firearm_type})"),
+    "other_documents": LicenseFormat("📄", None, "{description}", fallback="Unnamed Document")
+}
+
+# Used for rows from a table without an entry of its own
+DEFAULT_LICENSE_FORMAT = LICENSE_FORMATS["other_documents"]
+
+
+def get_license_format(table: str) -> LicenseFormat:
+    return LICENSE_FORMATS.get(table, DEFAULT_LICENSE_FORMAT)
@@ -0,0 +1,84 @@
+import logging
+from datetime import date, datetime
+from typing import Any, Dict, Optional
+
+from license_formats import get_license_format
+from license_settings import resolve_settings
+
+logger = logging.getLogger(__name__)
+
+
+def parse_expiry_date(value: Any) -> Optional[date]:
+    """Parse a license expiry value (ISO date string, date or datetime) into a date."""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if isinstance(value, str) and value:
+        return datetime.strptime(value[:10], "%Y-%m-%d").date()
+    return None
+
+
+class LicenseItem:
+    """One license row as the reminder run uses it.
+
+    Built once per row: the expiry is parsed up front, the reminder settings for the
+    item's type are resolved onto it, and of the row's columns only those its email
+    line displays are kept.
+    """
+
+    __slots__ = ("id", "user_id", "table", "expiry_field", "expiry_date", "notifications_paused",
+                 "updated_at", "reminder_days_before", "reminder_frequency",
+                 "notifications_enabled", "display")
+
+    def __init__(self, id: Any, user_id: Any, table: str, expiry_field: str, expiry_date: date,
+                 notifications_paused: bool = False, updated_at: Optional[str] = None,
+                 display: Optional[Dict[str, Any]] = None):
+        self.id = id
+        self.user_id = user_id
+        self.table = table
+        self.expiry_field = expiry_field
+        self.expiry_date = expiry_date
+        self.notifications_paused = notifications_paused
+        # The row's last update, which dates a pause; kept as the raw timestamp string
+        self.updated_at = updated_at
+        # Unset until settings for the item's type are applied; notifications stay off without them
+        self.reminder_days_before: Optional[int] = None
+        self.reminder_frequency: Optional[str] = None
+        self.notifications_enabled = False
+        self.display = display or {}
+
+    @classmethod
+    def from_row(cls, table: str, row: Dict[str, Any], expiry_field: str) -> Optional["LicenseItem"]:
+        """Build an item from a license table row, or None if it has no usable expiry date."""
+        try:
+            expiry_date = parse_expiry_date(row.get(expiry_field))
+        except (ValueError, TypeError) as e:
+            logger.warning("Invalid date format for item ID %s field %s: %s", row.get("id"), expiry_field, e)
+            return None
+        if expiry_date is None:
+            return None
+        return cls(
+            row.get("id"),
+            row.get("user_id"),
+            table,
+            expiry_field,
+            expiry_date,
+            notifications_paused=bool(row.get("notifications_paused", False)),
+            updated_at=row.get("updated_at"),
+            display={field: row.get(field) for field in get_license_format(table).fields}
+        )
+
+    def apply_settings(self, settings_data: Dict[str, Any]) -> None:
+        """Resolve the reminder settings for the item's license type onto it, defaults included."""
+        settings_data = resolve_settings(settings_data)
+        self.reminder_days_before = settings_data["reminder_days_before"]
+        self.reminder_frequency = settings_data["reminder_frequency"]
+        self.notifications_enabled = settings_data["notifications_enabled"]
+
+    def get(self, field: str, default: Any = None) -> Any:
+        """Look up a display field, so formats can read an item like the row it came from."""
+        return self.display.get(field, default)
+
+    def __repr__(self) -> str:
+        return f"LicenseItem({self.table}-{self.id}, expires {self.expiry_date})"
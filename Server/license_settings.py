@@ -0,0 +1,47 @@
+from typing import Any, Dict, Iterable, Optional
+
+# What applies to a license type with no value of its own
+DEFAULT_REMINDER_DAYS_BEFORE = 7
+DEFAULT_REMINDER_FREQUENCY = "weekly"
+DEFAULT_NOTIFICATIONS_ENABLED = False
+# Days a license's notifications stay paused before manage_notify switches them back on
+PAUSE_DAYS = 5
+
+
+def resolve_settings(settings_data: Dict[str, Any]) -> Dict[str, Any]:
+    """One license_type_settings row with the defaults filled in for missing or null values."""
+    days_before = settings_data.get("reminder_days_before")
+    frequency = settings_data.get("reminder_frequency")
+    enabled = settings_data.get("notifications_enabled")
+    return {
+        "reminder_days_before": DEFAULT_REMINDER_DAYS_BEFORE if days_before is None else days_before,
+        "reminder_frequency": frequency or DEFAULT_REMINDER_FREQUENCY,
+        "notifications_enabled": DEFAULT_NOTIFICATIONS_ENABLED if enabled is None else bool(enabled)
+    }
+
+
+class LicenseSettingsResolver:
+    """A user's reminder settings by license table, built from their license_type_settings rows.
+
+    Settings rows name a license type ("others", "tvlicenses", ...); they are keyed here by
+    the table the type is stored in, so looking up the settings for a table is a dict hit.
+    When a user has several rows for one type the first wins. Tables without a row have no
+    settings, and their notifications stay off.
+    """
+
+    __slots__ = ("_by_table",)
+
+    def __init__(self, license_settings: Optional[Iterable[Dict[str, Any]]], type_to_table: Dict[str, str]):
+        self._by_table: Dict[str, Dict[str, Any]] = {}
+        for settings_data in license_settings or ():
+            settings_type = settings_data.get("type")
+            table_name = type_to_table.get(settings_type, settings_type)
+            if table_name not in self._by_table:
+                self._by_table[table_name] = resolve_settings(settings_data)
+
+    def for_table(self, table_name: str) -> Optional[Dict[str, Any]]:
+        """The resolved settings for a table, or None if the user has none for it."""
+        return self._by_table.get(table_name)
+
+    def settings(self) -> Iterable[Dict[str, Any]]:
+        return self._by_table.values()
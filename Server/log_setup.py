@@ -0,0 +1,188 @@
+"""Shared logging setup for the Server scripts.
+
+Records are put on an in-memory queue by the logging call and written to the log file
+and stdout by a background listener thread, so the threads doing the work do not wait on
+disk or the terminal. Nothing is formatted on the calling thread: the message and its
+arguments are only merged, and the JSON or text line built, by the listener. When the
+queue is full, DEBUG and INFO records are dropped, while warnings and errors wait briefly
+for room and are otherwise written out by the caller. Records from a busy call site can
+be thinned before they are queued: INFO and DEBUG records can be sampled and rate limited
+per call site, with the count of records suppressed attached to the next one that gets
+through. Both are off by default, and WARNING and above are always kept.
+"""
+import os
+import sys
+import json
+import time
+import queue
+import atexit
+import logging
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Overrides each script's default level when set, e.g. DEBUG or WARNING
+LOG_LEVEL = os.getenv("LOG_LEVEL")
+# json for one structured record per line, text for the plain format
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+# Records waiting for the listener; further DEBUG and INFO records are dropped rather than block the caller
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE") or 10000)
+# Seconds a warning or error waits for room on a full queue before the caller writes it out itself
+LOG_QUEUE_WAIT = float(os.getenv("LOG_QUEUE_WAIT") or 1.0)
+# INFO and DEBUG records per second each call site may log after an initial burst; 0 disables the limit
+LOG_RATE_LIMIT = float(os.getenv("LOG_RATE_LIMIT") or 0)
+LOG_RATE_BURST = int(os.getenv("LOG_RATE_BURST") or 100)
+# Share of INFO and DEBUG records kept per call site, e.g. 0.1 keeps every tenth
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE") or 1.0)
+
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+# LogRecord attributes that are not extra fields passed by the caller
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName"}
+
+_listener: Optional[QueueListener] = None
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, including any extra= fields given to the logging call."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "thread": record.threadName
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                payload[key] = value
+        if record.exc_info:
+            payload["exception"] = self.formatException(record.exc_info)
+        if record.stack_info:
+            payload["stack"] = self.formatStack(record.stack_info)
+        return json.dumps(payload, default=str)
+
+
+class SamplingRateLimitFilter(logging.Filter):
+    """Thins repetitive records per call site (file and line) before they are queued.
+
+    Only records below WARNING are thinned: every sample_every-th record of a call site is
+    kept, starting with the first, and those are rate limited by a token bucket per call
+    site. The number of records dropped is set as `suppressed` on the next record let
+    through. Warnings and errors always pass.
+    """
+
+    def __init__(self, rate: float, burst: int, sample_rate: float = 1.0):
+        super().__init__()
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.sample_every = max(1, round(1 / sample_rate)) if 0 < sample_rate < 1 else 1
+        # Call site -> [tokens, last refill, records seen, records suppressed since the last one kept]
+        self._events: Dict[Tuple[str, int], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        key = (record.pathname, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            state = self._events.get(key)
+            if state is None:
+                state = self._events[key] = [float(self.burst), now, 0, 0]
+            state[2] += 1
+            if (state[2] - 1) % self.sample_every:
+                return False
+            if self.rate > 0:
+                state[0] = min(self.burst, state[0] + (now - state[1]) * self.rate)
+                state[1] = now
+                if state[0] < 1:
+                    state[3] += 1
+                    return False
+                state[0] -= 1
+            suppressed, state[3] = state[3], 0
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+    def pending_suppressed(self) -> Dict[str, int]:
+        """Records suppressed since each call site last logged, for reporting at shutdown."""
+        with self._lock:
+            return {f"{os.path.basename(path)}:{line}": int(state[3])
+                    for (path, line), state in self._events.items() if state[3]}
+
+
+class DeferredQueueHandler(QueueHandler):
+    """Queues records unformatted, dropping DEBUG and INFO records when the queue is full.
+
+    Warnings and errors are never dropped: they wait up to wait_seconds for room, then go
+    straight to the fallback handlers on the calling thread. The stock QueueHandler
+    formats each record on the calling thread before queueing it; here that is left to
+    the listener, so arguments should not be mutated after logging.
+    """
+
+    def __init__(self, log_queue: queue.Queue, fallback_handlers: Iterable[logging.Handler] = (),
+                 wait_seconds: float = 1.0):
+        super().__init__(log_queue)
+        self.fallback_handlers = list(fallback_handlers)
+        self.wait_seconds = wait_seconds
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        if record.levelno < logging.WARNING:
+            try:
+                self.queue.put_nowait(record)
+            except queue.Full:
+                self.dropped += 1
+            return
+        try:
+            self.queue.put(record, timeout=self.wait_seconds)
+        except queue.Full:
+            for handler in self.fallback_handlers:
+                if record.levelno >= handler.level:
+                    handler.handle(record)
+
+
+def configure_logging(log_file: str, level: int = logging.INFO) -> None:
+    """Send the process's logging through a background listener to log_file and stdout.
+
+    Only the first call in a process takes effect, so scripts imported together (as by
+    the scheduler) share the setup of the first one.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    formatter = JsonFormatter() if LOG_FORMAT == "json" else logging.Formatter(TEXT_FORMAT)
+    handlers = [logging.FileHandler(log_file), logging.StreamHandler(sys.stdout)]
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    queue_handler = DeferredQueueHandler(queue.Queue(LOG_QUEUE_SIZE), handlers, LOG_QUEUE_WAIT)
+    rate_filter = SamplingRateLimitFilter(LOG_RATE_LIMIT, LOG_RATE_BURST, LOG_SAMPLE_RATE)
+    queue_handler.addFilter(rate_filter)
+    root = logging.getLogger()
+    root.addHandler(queue_handler)
+    root.setLevel(LOG_LEVEL.upper() if LOG_LEVEL else level)
+
+    _listener = QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_shutdown, queue_handler, rate_filter)
+
+
+def _shutdown(queue_handler: DeferredQueueHandler, rate_filter: SamplingRateLimitFilter) -> None:
+    """Report what was thinned out, then write out everything still queued."""
+    global _listener
+    suppressed = rate_filter.pending_suppressed()
+    if suppressed or queue_handler.dropped:
+        logging.getLogger(__name__).warning(
+            "Log records suppressed by rate limits: %s; dropped on a full queue: %d",
+            suppressed, queue_handler.dropped
+        )
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -1,21 +1,23 @@
 import os
 import sys
 import logging
-from datetime import datetime, timedelta
-from typing import List
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
 
 from dotenv import load_dotenv
 from supabase import create_client, Client
 
-# Configure logging
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("manage_notify.log"),
-        logging.StreamHandler(sys.stdout)
-    ]
-)
+from column_projections import LICENSE_TABLES, columns_for, select_list
+from license_settings import PAUSE_DAYS
+from log_setup import configure_logging
+from metrics import RunMetrics, instrument_client
+from rate_limit import supabase_rate_limits
+from watermarks import WatermarkStore
+
+# Log through the shared queued setup (see log_setup); LOG_LEVEL=DEBUG lists unpaused IDs
+configure_logging("manage_notify.log", logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Load environment variables
@@ -23,14 +25,16 @@ load_dotenv()
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 
-# Check for required environment variables
-if not all([SUPABASE_URL, SUPABASE_KEY]):
-    logger.critical("Missing required environment variables: SUPABASE_URL and/or SUPABASE_KEY")
-    sys.exit(1)
+# Name the job's per-table watermarks are stored under
+WATERMARK_JOB = "manage_notify"
+# Where run metrics go at the end: Prometheus textfile for .prom, JSON summary otherwise
+METRICS_FILE = os.getenv("NOTIFY_METRICS_FILE", "manage_notify_metrics.json")
 
 class NotificationManager:
-    def __init__(self, supabase_client: Client):
-        self.supabase = supabase_client
+    def __init__(self, supabase_client: Client, metrics: Optional[RunMetrics] = None):
+        self.metrics = metrics or RunMetrics("manage_notify")
+        # Queries are counted per table, and rate limited with the other jobs in the process
+        self.supabase = instrument_client(supabase_client, self.metrics, supabase_rate_limits())
         self.tables = [
             "drivers",
             "firearms",
@@ -41,57 +45,74 @@ class NotificationManager:
             "competency",
             "psira_records"
         ]
+        # Each table's last unpause cutoff, so later runs only scan rows paused since
+        self.watermarks = WatermarkStore(self.supabase)
 
-    def update_notification_status(self, table: str) -> None:
+    def update_notification_status(self, table: str, since: Optional[datetime] = None) -> List[str]:
         """
-        Update notification status for a specific table.
+        Unpause notifications for a specific table with a single filtered update.
+        With since, only records last updated after it are looked at; without, every
+        paused record is. The table's watermark moves to the cutoff once the update succeeds.
+        Returns the IDs of the records that were unpaused.
         """
         try:
-            # Calculate the datetime 5 days ago
-            five_days_ago = datetime.utcnow() - timedelta(days=5)
-
-            # Get all records where notifications_paused is True
-            response = (self.supabase.table(table)
-                       .select("id, notifications_paused, updated_at")
-                       .eq("notifications_paused", True)
-                       .execute())
-
-            for record in response.data:
-                try:
-                    updated_at_str = record.get('updated_at')
-                    if updated_at_str is None:
-                        logger.warning(f"No updated_at found for record {record.get('id')} in {table}")
-                        continue
-
-                    # Parse the updated_at timestamp
-                    updated_at = datetime.strptime(updated_at_str, "%Y-%m-%dT%H:%M:%S.%fZ")
-                    
-                    if updated_at <= five_days_ago:
-                        # Update the record to unpause notifications
-                        update_response = (self.supabase.table(table)
-                                         .update({
-                                             "notifications_paused": False
-                                         })
-                                         .eq("id", record['id'])
-                                         .execute())
-                        
-                        logger.info(f"Updated {table} record {record['id']}: notifications unpaused")
-                except (ValueError, KeyError) as e:
-                    logger.warning(f"Error processing record {record.get('id')} in {table}: {str(e)}")
-                    continue
+            # Records paused at least PAUSE_DAYS ago are due to be unpaused
+            cutoff = datetime.now(timezone.utc) - timedelta(days=PAUSE_DAYS)
+
+            with self.metrics.timer("phase_duration_seconds", phase="update_notification_status", table=table):
+                query = (self.supabase.table(table)
+                         .update({
+                             "notifications_paused": False
+                         })
+                         .eq("notifications_paused", True)
+                         .lte("updated_at", cutoff.isoformat()))
+                if since is not None:
+                    query = query.gt("updated_at", since.isoformat())
+                response = query.select(select_list(columns_for("manage_notify", LICENSE_TABLES))).execute()
+            self.watermarks.advance(WATERMARK_JOB, table, cutoff, full=since is None)
+
+            updated_ids = [record['id'] for record in response.data or []]
+            self.metrics.increment("scans_total", table=table, mode="full" if since is None else "incremental")
+            self.metrics.increment("records_unpaused_total", len(updated_ids), table=table)
+            if updated_ids:
+                logger.info(f"Updated {table}: {len(updated_ids)} records unpaused")
+                logger.debug("Unpaused %s records: %s", table, updated_ids)
+            return updated_ids
 
         except Exception as e:
             logger.error(f"Error updating {table}: {str(e)}")
+            return []
 
-    def process_all_tables(self) -> None:
+    def process_all_tables(self, full: bool = False) -> Dict[str, List[str]]:
         """
-        Process all tables to update notification statuses.
+        Process all tables concurrently to update notification statuses.
+        Tables are scanned from their watermarks, or in full when full is set or a
+        reconcile is due (see watermarks.WatermarkStore).
+        Returns the unpaused record IDs per table.
         """
-        for table in self.tables:
-            logger.info(f"Processing table: {table}")
-            self.update_notification_status(table)
+        results = {}
+        scan_starts = self.watermarks.scan_starts(WATERMARK_JOB, self.tables, full)
+        with ThreadPoolExecutor(max_workers=len(self.tables)) as executor:
+            futures = {}
+            for table in self.tables:
+                since = scan_starts[table]
+                logger.info(f"Processing table: {table} ({'full scan' if since is None else f'since {since.isoformat()}'})")
+                futures[executor.submit(self.update_notification_status, table, since)] = table
+            for future in as_completed(futures):
+                results[futures[future]] = future.result()
+        return results
+
+def main(argv: List[str] = None) -> None:
+    parser = argparse.ArgumentParser(description="Switch paused license notifications back on.")
+    parser.add_argument("--full", action="store_true", help="scan every paused record, not just those since the watermark")
+    args = parser.parse_args(argv)
+
+    # Check for required environment variables
+    if not all([SUPABASE_URL, SUPABASE_KEY]):
+        logger.critical("Missing required environment variables: SUPABASE_URL and/or SUPABASE_KEY")
+        sys.exit(1)
 
-def main() -> None:
+    notification_manager = None
     try:
         # Initialize Supabase client
         supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
@@ -99,13 +120,17 @@ def main() -> None:
 
         # Create notification manager and process tables
         notification_manager = NotificationManager(supabase)
-        notification_manager.process_all_tables()
+        results = notification_manager.process_all_tables(full=args.full)
         
-        logger.info("Notification management process completed successfully")
+        unpaused_count = sum(len(ids) for ids in results.values())
+        logger.info(f"Notification management process completed successfully: {unpaused_count} records unpaused")
 
     except Exception as e:
         logger.error(f"Main process error: {str(e)}")
         sys.exit(1)
+    finally:
+        if notification_manager is not None:
+            notification_manager.metrics.write(METRICS_FILE)
 
 if __name__ == "__main__":
     main()
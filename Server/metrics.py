@@ -0,0 +1,234 @@
+import os
+import json
+import time
+import logging
+import functools
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from rate_limit import RateLimits, postgrest_retry_after
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds, in seconds, of the duration histogram buckets
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Builder methods that decide what kind of request a query is
+QUERY_OPERATIONS = ("select", "insert", "update", "upsert", "delete")
+
+LabelSet = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: Dict[str, Any]) -> LabelSet:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(labels: LabelSet, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = ",".join(f'{key}="{value}"'.replace("\n", "\\n") for key, value in pairs)
+    return "{" + escaped + "}"
+
+
+class _Histogram:
+    def __init__(self):
+        self.buckets = [0] * len(DURATION_BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.sum += value
+        for index, bound in enumerate(DURATION_BUCKETS):
+            if value <= bound:
+                self.buckets[index] += 1
+
+
+class RunMetrics:
+    """Counters, gauges and duration histograms for one job run, exportable at the end."""
+
+    def __init__(self, job: str):
+        self.job = job
+        self.started_at = time.time()
+        self._counters: Dict[Tuple[str, LabelSet], float] = {}
+        self._gauges: Dict[Tuple[str, LabelSet], float] = {}
+        self._histograms: Dict[Tuple[str, LabelSet], _Histogram] = {}
+        self._lock = threading.Lock()
+
+    def increment(self, name: str, value: float = 1, **labels) -> None:
+        key = (name, _labels(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels) -> None:
+        with self._lock:
+            self._gauges[(name, _labels(labels))] = value
+
+    def observe(self, name: str, seconds: float, **labels) -> None:
+        key = (name, _labels(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram()
+            histogram.observe(seconds)
+
+    @contextmanager
+    def timer(self, name: str, **labels) -> Iterator[None]:
+        """Record how long the block takes in the named duration histogram."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def summary(self) -> Dict[str, Any]:
+        """A JSON-friendly snapshot of every metric."""
+        with self._lock:
+            return {
+                "job": self.job,
+                "started_at": self.started_at,
+                "duration_seconds": round(time.time() - self.started_at, 3),
+                "counters": [{"name": name, "labels": dict(labels), "value": value}
+                             for (name, labels), value in sorted(self._counters.items())],
+                "gauges": [{"name": name, "labels": dict(labels), "value": value}
+                           for (name, labels), value in sorted(self._gauges.items())],
+                "histograms": [{"name": name, "labels": dict(labels), "count": histogram.count,
+                                "sum": round(histogram.sum, 6),
+                                "buckets": dict(zip(map(str, DURATION_BUCKETS), histogram.buckets))}
+                               for (name, labels), histogram in sorted(self._histograms.items())]
+            }
+
+    def to_prometheus(self) -> str:
+        """Render every metric in the Prometheus text exposition format."""
+        job_label = ("job", self.job)
+        lines = []
+        with self._lock:
+            for kind, values in (("counter", self._counters), ("gauge", self._gauges)):
+                typed = set()
+                for (name, labels), value in sorted(values.items()):
+                    if name not in typed:
+                        lines.append(f"# TYPE {name} {kind}")
+                        typed.add(name)
+                    lines.append(f"{name}{_format_labels(labels, job_label)} {value}")
+            typed = set()
+            for (name, labels), histogram in sorted(self._histograms.items()):
+                if name not in typed:
+                    lines.append(f"# TYPE {name} histogram")
+                    typed.add(name)
+                for bound, count in zip(DURATION_BUCKETS, histogram.buckets):
+                    lines.append(f"{name}_bucket{_format_labels(labels + (('le', str(bound)),), job_label)} {count}")
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),), job_label)} {histogram.count}")
+                lines.append(f"{name}_sum{_format_labels(labels, job_label)} {histogram.sum}")
+                lines.append(f"{name}_count{_format_labels(labels, job_label)} {histogram.count}")
+        lines.append("# TYPE job_last_run_timestamp_seconds gauge")
+        lines.append(f"job_last_run_timestamp_seconds{_format_labels((), job_label)} {time.time()}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: Optional[str]) -> None:
+        """Write the metrics to path: Prometheus textfile for .prom, JSON summary otherwise."""
+        if not path:
+            return
+        try:
+            content = self.to_prometheus() if path.endswith(".prom") else json.dumps(self.summary(), indent=2)
+            # Write then rename so a textfile collector never reads a half-written file
+            temporary_path = f"{path}.tmp"
+            with open(temporary_path, "w", encoding="utf-8") as metrics_file:
+                metrics_file.write(content)
+            os.replace(temporary_path, path)
+            logger.info(f"Metrics written to {path}")
+        except OSError as e:
+            logger.error(f"Failed to write metrics to {path}: {str(e)}")
+
+
+def timed(phase: str, histogram: str = "phase_duration_seconds"):
+    """Method decorator timing each call into self.metrics under the given phase label."""
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self.metrics.timer(histogram, phase=phase):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class _InstrumentedQuery:
+    """Wraps a query builder so execute() is counted and timed per table and operation.
+
+    With rate limits, execute() also runs under the table's adaptive limiter and is
+    retried while PostgREST throttles it.
+    """
+
+    def __init__(self, builder, table: str, metrics: RunMetrics, operation: str = "select",
+                 limits: Optional[RateLimits] = None):
+        self._builder = builder
+        self._table = table
+        self._metrics = metrics
+        self._operation = operation
+        self._limits = limits
+
+    def _wrap(self, result, operation: str):
+        if hasattr(result, "execute"):
+            return _InstrumentedQuery(result, self._table, self._metrics, operation, self._limits)
+        return result
+
+    def execute(self, *args, **kwargs):
+        labels = {"table": self._table, "operation": self._operation}
+        try:
+            with self._metrics.timer("supabase_query_duration_seconds", **labels):
+                if self._limits is None:
+                    return self._builder.execute(*args, **kwargs)
+                # An insert that hit a 503 may have been applied, so only other operations retry it
+                idempotent = self._operation != "insert"
+                return self._limits.call(
+                    self._table,
+                    lambda: self._builder.execute(*args, **kwargs),
+                    lambda error: postgrest_retry_after(error, idempotent),
+                    metrics=self._metrics
+                )
+        except Exception:
+            self._metrics.increment("supabase_query_errors_total", **labels)
+            raise
+        finally:
+            self._metrics.increment("supabase_queries_total", **labels)
+
+    def __getattr__(self, name: str):
+        attribute = getattr(self._builder, name)
+        # A select() chained after a write only picks the columns the write returns
+        operation = name if name in QUERY_OPERATIONS and self._operation == "select" else self._operation
+        if not callable(attribute):
+            return self._wrap(attribute, operation)
+
+        @functools.wraps(attribute)
+        def call(*args, **kwargs):
+            return self._wrap(attribute(*args, **kwargs), operation)
+        return call
+
+
+class InstrumentedClient:
+    """Supabase client proxy that counts and times every query made through table()/from_().
+
+    Given rate limits (see rate_limit.RateLimits), queries are also rate limited per table.
+    """
+
+    def __init__(self, client, metrics: RunMetrics, limits: Optional[RateLimits] = None):
+        self._client = client
+        self.metrics = metrics
+        self.limits = limits
+
+    def table(self, name: str) -> _InstrumentedQuery:
+        return _InstrumentedQuery(self._client.table(name), name, self.metrics, limits=self.limits)
+
+    def from_(self, name: str) -> _InstrumentedQuery:
+        return _InstrumentedQuery(self._client.from_(name), name, self.metrics, limits=self.limits)
+
+    def __getattr__(self, name: str):
+        return getattr(self._client, name)
+
+
+def instrument_client(client, metrics: RunMetrics, limits: Optional[RateLimits] = None):
+    """Wrap a Supabase client for metrics and optional rate limits, without wrapping twice."""
+    if isinstance(client, InstrumentedClient):
+        return client
+    return InstrumentedClient(client, metrics, limits)
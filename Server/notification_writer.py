@@ -0,0 +1,92 @@
+import json
+import time
+import logging
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class NotificationWriter:
+    """Buffer notification records and write them as multi-row inserts.
+
+    A flush happens when the buffer reaches batch_size records or when flush_interval
+    seconds have passed since the last one. Call flush() at the end of a run to write the
+    remainder. A batch that still fails after a retry is logged and appended to
+    failure_log_path so no audit row is silently lost. on_written, if set, is called with
+    each batch after it has been inserted.
+    """
+
+    def __init__(self, supabase_client, table: str = "notifications", batch_size: int = 100,
+                 flush_interval: float = 5.0, failure_log_path: Optional[str] = None,
+                 on_written: Optional[Callable[[List[Dict[str, Any]]], None]] = None):
+        self.supabase = supabase_client
+        self.table = table
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.failure_log_path = failure_log_path
+        self.on_written = on_written
+        self.written_count = 0
+        self.failed_count = 0
+        self._buffer: List[Dict[str, Any]] = []
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        # Serialises inserts so batches reach the database in the order they were buffered
+        self._write_lock = threading.Lock()
+
+    def add(self, record: Dict[str, Any]) -> None:
+        """Queue a record, flushing if the size or time threshold has been reached."""
+        with self._lock:
+            self._buffer.append(record)
+            due = (len(self._buffer) >= self.batch_size
+                   or time.monotonic() - self._last_flush >= self.flush_interval)
+            batch = self._take() if due else None
+        if batch:
+            self._write(batch)
+
+    def flush(self) -> Dict[str, int]:
+        """Write everything still buffered and return the running written/failed counts."""
+        with self._lock:
+            batch = self._take()
+        if batch:
+            self._write(batch)
+        return {"written": self.written_count, "failed": self.failed_count}
+
+    def _take(self) -> List[Dict[str, Any]]:
+        batch, self._buffer = self._buffer, []
+        self._last_flush = time.monotonic()
+        return batch
+
+    def _write(self, batch: List[Dict[str, Any]]) -> None:
+        with self._write_lock:
+            for offset in range(0, len(batch), self.batch_size):
+                chunk = batch[offset:offset + self.batch_size]
+                error = None
+                for _ in range(2):
+                    try:
+                        self.supabase.table(self.table).insert(chunk).execute()
+                        error = None
+                        break
+                    except Exception as e:
+                        error = e
+                if error is None:
+                    self.written_count += len(chunk)
+                    if self.on_written:
+                        self.on_written(chunk)
+                else:
+                    self._report_failure(chunk, error)
+
+    def _report_failure(self, chunk: List[Dict[str, Any]], error: Exception) -> None:
+        self.failed_count += len(chunk)
+        keys = [f"{record.get('user_id')}/{record.get('license_type')}-{record.get('license_id')}" for record in chunk]
+        logger.error(f"Failed to write batch of {len(chunk)} notifications: {str(error)}; records: {keys}")
+        if not self.failure_log_path:
+            return
+        try:
+            with open(self.failure_log_path, "a", encoding="utf-8") as failure_log:
+                failed_at = datetime.now().isoformat()
+                for record in chunk:
+                    failure_log.write(json.dumps({"failed_at": failed_at, "error": str(error), "record": record}, default=str) + "\n")
+        except OSError as e:
+            logger.error(f"Could not record failed notifications to {self.failure_log_path}: {str(e)}")
@@ -0,0 +1,254 @@
+import json
+import time
+import sqlite3
+import smtplib
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+# Outbox entry states
+PENDING = "pending"
+SENDING = "sending"
+SENT = "sent"
+FAILED = "failed"
+
+
+class OutboxEntry(NamedTuple):
+    id: int
+    idempotency_key: str
+    user_id: str
+    to_email: str
+    message: bytes
+    on_sent: Dict[str, Any]
+    attempts: int
+
+
+def is_permanent_failure(error: Exception) -> bool:
+    """True for SMTP errors a retry cannot fix: 5xx replies and refused recipients."""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPResponseException):
+        return error.smtp_code >= 500
+    return False
+
+
+class Outbox:
+    """Durable spool of rendered reminder emails waiting to be sent.
+
+    Backed by a local SQLite file. Each entry holds the finished MIME message and what to
+    record once it is confirmed sent. Entries are keyed by idempotency key, so the same
+    reminder is only ever queued once. An entry still marked SENDING when the outbox is
+    opened was interrupted mid-send and may have gone out, so it is marked FAILED rather
+    than sent again.
+    """
+
+    def __init__(self, path: str, retention_days: int = 7):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS outbox ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " idempotency_key TEXT NOT NULL UNIQUE,"
+            " user_id TEXT NOT NULL,"
+            " to_email TEXT NOT NULL,"
+            " message BLOB NOT NULL,"
+            " on_sent TEXT NOT NULL,"
+            " status TEXT NOT NULL,"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " next_attempt_at REAL NOT NULL,"
+            " last_error TEXT,"
+            " created_at TEXT NOT NULL,"
+            " updated_at TEXT NOT NULL)"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt_at)")
+        self._connection.execute(
+            "DELETE FROM outbox WHERE status IN (?, ?) AND created_at < ?",
+            (SENT, FAILED, (datetime.now() - timedelta(days=retention_days)).isoformat())
+        )
+        interrupted = self._connection.execute(
+            "UPDATE outbox SET status = ?, last_error = ?, updated_at = ? WHERE status = ?",
+            (FAILED, "interrupted while sending", datetime.now().isoformat(), SENDING)
+        ).rowcount
+        if interrupted:
+            logger.warning(f"Outbox: {interrupted} emails were interrupted mid-send and will not be retried")
+
+    def enqueue(self, idempotency_key: str, user_id: str, to_email: str, message: bytes,
+                on_sent: Dict[str, Any]) -> bool:
+        """Queue a rendered email. Returns False if one with this key was already queued."""
+        now = datetime.now().isoformat()
+        with self._lock:
+            cursor = self._connection.execute(
+                "INSERT OR IGNORE INTO outbox (idempotency_key, user_id, to_email, message, on_sent, status,"
+                " next_attempt_at, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (idempotency_key, user_id, to_email, message, json.dumps(on_sent, default=str), PENDING,
+                 time.time(), now, now)
+            )
+            return cursor.rowcount == 1
+
+    def claim(self) -> Optional[OutboxEntry]:
+        """Take the oldest entry that is due for an attempt, marking it SENDING."""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT id, idempotency_key, user_id, to_email, message, on_sent, attempts FROM outbox"
+                " WHERE status = ? AND next_attempt_at <= ? ORDER BY next_attempt_at, id LIMIT 1",
+                (PENDING, time.time())
+            ).fetchone()
+            if row is None:
+                return None
+            self._set(row[0], SENDING, attempts=row[6] + 1)
+        return OutboxEntry(row[0], row[1], row[2], row[3], row[4], json.loads(row[5]), row[6] + 1)
+
+    def mark_sent(self, entry: OutboxEntry) -> None:
+        with self._lock:
+            self._set(entry.id, SENT)
+
+    def mark_retry(self, entry: OutboxEntry, error: str, delay: float) -> None:
+        with self._lock:
+            self._set(entry.id, PENDING, error=error, next_attempt_at=time.time() + delay)
+
+    def mark_failed(self, entry: OutboxEntry, error: str) -> None:
+        with self._lock:
+            self._set(entry.id, FAILED, error=error)
+
+    def _set(self, entry_id: int, status: str, attempts: Optional[int] = None, error: Optional[str] = None,
+             next_attempt_at: Optional[float] = None) -> None:
+        self._connection.execute(
+            "UPDATE outbox SET status = ?, attempts = coalesce(?, attempts), last_error = coalesce(?, last_error),"
+            " next_attempt_at = coalesce(?, next_attempt_at), updated_at = ? WHERE id = ?",
+            (status, attempts, error, next_attempt_at, datetime.now().isoformat(), entry_id)
+        )
+
+    def abandon_pending(self, error: str) -> List[OutboxEntry]:
+        """Give up on every entry still waiting to be sent, marking it FAILED, and return them.
+
+        Only call this once the delivery workers have stopped.
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT id, idempotency_key, user_id, to_email, message, on_sent, attempts FROM outbox"
+                " WHERE status IN (?, ?)", (PENDING, SENDING)
+            ).fetchall()
+            for row in rows:
+                self._set(row[0], FAILED, error=error)
+        return [OutboxEntry(row[0], row[1], row[2], row[3], row[4], json.loads(row[5]), row[6]) for row in rows]
+
+    def pending_count(self) -> int:
+        """Entries not yet sent or given up on."""
+        with self._lock:
+            return self._connection.execute(
+                "SELECT count(*) FROM outbox WHERE status IN (?, ?)", (PENDING, SENDING)
+            ).fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+
+class OutboxDelivery:
+    """Worker threads draining an Outbox, retrying transient failures with exponential backoff.
+
+    send is called with each claimed entry and raises on failure. on_sent runs after a
+    confirmed send and on_failed after the last attempt, or straight away for permanent
+    failures. Workers run until stop(); drain() waits for the outbox to empty first.
+    """
+
+    def __init__(self, outbox: Outbox, send: Callable[[OutboxEntry], None],
+                 on_sent: Callable[[OutboxEntry], None], on_failed: Callable[[OutboxEntry, str], None],
+                 workers: int = 2, max_attempts: int = 6, base_delay: float = 30.0, max_delay: float = 900.0,
+                 poll_interval: float = 0.2):
+        self.outbox = outbox
+        self.send = send
+        self.on_sent = on_sent
+        self.on_failed = on_failed
+        self.workers = max(1, workers)
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+        self.sent_count = 0
+        self.retry_count = 0
+        self.failed_count = 0
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._count_lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+
+    def start(self) -> "OutboxDelivery":
+        self._stop.clear()
+        self._threads = [
+            threading.Thread(target=self._work, name=f"outbox-{index}", daemon=True)
+            for index in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def notify(self) -> None:
+        """Wake idle workers after an entry has been queued."""
+        self._wake.set()
+
+    def backoff(self, attempts: int) -> float:
+        """Seconds to wait before the next attempt after the given number of failed ones."""
+        return min(self.max_delay, self.base_delay * 2 ** (attempts - 1))
+
+    def drain(self, timeout: Optional[float] = None) -> bool:
+        """Block until every queued email is sent or given up on. False if timeout passes first."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.outbox.pending_count():
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(self.poll_interval)
+        return True
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def _work(self) -> None:
+        while not self._stop.is_set():
+            entry = self.outbox.claim()
+            if entry is None:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+                continue
+            self._deliver(entry)
+
+    def _deliver(self, entry: OutboxEntry) -> None:
+        try:
+            self.send(entry)
+        except Exception as e:
+            error = str(e)
+            if is_permanent_failure(e) or entry.attempts >= self.max_attempts:
+                self.outbox.mark_failed(entry, error)
+                with self._count_lock:
+                    self.failed_count += 1
+                logger.error(f"Outbox: giving up on email to {entry.to_email} after {entry.attempts} attempts: {error}")
+                self._run_callback(self.on_failed, entry, error)
+            else:
+                delay = self.backoff(entry.attempts)
+                self.outbox.mark_retry(entry, error, delay)
+                with self._count_lock:
+                    self.retry_count += 1
+                logger.warning(f"Outbox: email to {entry.to_email} failed (attempt {entry.attempts}), "
+                               f"retrying in {delay:.0f}s: {error}")
+            return
+
+        self.outbox.mark_sent(entry)
+        with self._count_lock:
+            self.sent_count += 1
+        self._run_callback(self.on_sent, entry)
+
+    def _run_callback(self, callback: Callable, *args) -> None:
+        try:
+            callback(*args)
+        except Exception as e:
+            logger.error(f"Outbox: error recording delivery of {args[0].idempotency_key}: {str(e)}")
@@ -0,0 +1,102 @@
+import queue
+import logging
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Marks the end of a stage's input
+_STOP = object()
+
+
+class Stage:
+    """One step of a StagedPipeline.
+
+    The handler receives an item from the previous stage and returns the item for the next
+    stage, or None to drop it. A fan-out stage returns an iterable of items instead.
+    """
+
+    def __init__(self, name: str, handler: Callable[[Any], Any], workers: int = 1, fan_out: bool = False):
+        self.name = name
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.fan_out = fan_out
+
+
+class StagedPipeline:
+    """Run items through a chain of stages, each with its own worker threads, joined by bounded queues."""
+
+    def __init__(self, stages: List[Stage], queue_size: int = 100,
+                 describe: Optional[Callable[[Any], str]] = None):
+        self.stages = stages
+        self.queue_size = max(1, queue_size)
+        self.describe = describe or repr
+        self.completed: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def run(self, items: Iterable[Any]) -> Dict[str, int]:
+        """Feed items through every stage and block until all of them are done.
+
+        Returns the number of items each stage handled without raising.
+        """
+        self.completed = {stage.name: 0 for stage in self.stages}
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+        remaining = [stage.workers for stage in self.stages]
+        threads = []
+
+        for index, stage in enumerate(self.stages):
+            for worker in range(stage.workers):
+                thread = threading.Thread(
+                    target=self._work,
+                    args=(index, queues, remaining),
+                    name=f"{stage.name}-{worker}",
+                    daemon=True
+                )
+                thread.start()
+                threads.append(thread)
+
+        try:
+            for item in items:
+                queues[0].put(item)
+        finally:
+            for _ in range(self.stages[0].workers):
+                queues[0].put(_STOP)
+            for thread in threads:
+                thread.join()
+
+        return self.completed
+
+    def _work(self, index: int, queues: List[queue.Queue], remaining: List[int]) -> None:
+        stage = self.stages[index]
+        inbox = queues[index]
+        outbox = queues[index + 1] if index + 1 < len(queues) else None
+
+        while True:
+            item = inbox.get()
+            if item is _STOP:
+                break
+            try:
+                result = stage.handler(item)
+            except Exception as e:
+                # Isolate the failure to this item; the rest of the run carries on
+                logger.error(f"Error in {stage.name} stage for {self.describe(item)}: {str(e)}")
+                continue
+
+            with self._lock:
+                self.completed[stage.name] += 1
+
+            if outbox is None or result is None:
+                continue
+            if stage.fan_out:
+                for output in result:
+                    outbox.put(output)
+            else:
+                outbox.put(result)
+
+        # The last worker out of a stage tells every worker of the next stage to stop
+        with self._lock:
+            remaining[index] -= 1
+            last_worker = remaining[index] == 0
+        if last_worker and outbox is not None:
+            for _ in range(self.stages[index + 1].workers):
+                outbox.put(_STOP)
@@ -0,0 +1,130 @@
+import logging
+from datetime import date
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import psycopg2
+from psycopg2 import sql
+
+from license_item import LicenseItem
+
+logger = logging.getLogger(__name__)
+
+
+class LicenseSource(NamedTuple):
+    """One license table as the reminder query reads it."""
+    table_name: str
+    settings_type: str
+    expiry_field: str
+    status_filter: Optional[Tuple[str, str]]
+    # Columns read from each row; None reads the whole row
+    columns: Optional[Tuple[str, ...]] = None
+
+
+def _json_row(alias: str, columns: Optional[Tuple[str, ...]]) -> sql.Composable:
+    """The row as jsonb, with only the given columns if there are any."""
+    if not columns:
+        return sql.SQL("to_jsonb({})").format(sql.Identifier(alias))
+    return sql.SQL("jsonb_build_object({})").format(sql.SQL(", ").join(
+        sql.SQL("{}, {}.{}").format(sql.Literal(column), sql.Identifier(alias), sql.Identifier(column))
+        for column in columns
+    ))
+
+
+class PostgresLicenseSource:
+    """Streams active users with their expiring licenses straight from Postgres.
+
+    One query covers every license table: a UNION ALL normalising each table's expiry
+    column and status rule, joined to the user's license_type_settings for the type and
+    to active profiles. Rows come back ordered by user through a server-side cursor, so
+    each user is yielded with all of their license data as soon as their rows are read.
+    Profiles, settings and license rows are read whole unless their columns are given.
+    """
+
+    def __init__(self, dsn: str, sources: List[LicenseSource], fetch_size: int = 2000,
+                 profile_columns: Optional[Tuple[str, ...]] = None, settings_columns: Optional[Tuple[str, ...]] = None):
+        self.dsn = dsn
+        self.sources = sources
+        self.fetch_size = fetch_size
+        self.profile_columns = profile_columns
+        self.settings_columns = settings_columns
+        self._positions = {source.table_name: index for index, source in enumerate(sources)}
+        self._query = self._build_query()
+
+    def _license_select(self, source: LicenseSource) -> sql.Composed:
+        expiry = sql.SQL("l.{}::date").format(sql.Identifier(source.expiry_field))
+        status = sql.SQL("")
+        if source.status_filter:
+            status_field, status_value = source.status_filter
+            status = sql.SQL(" AND l.{} = {}").format(sql.Identifier(status_field), sql.Literal(status_value))
+        # The user's settings for the type come back alongside the row, null if they have none
+        return sql.SQL(
+            "SELECT l.user_id, {table} AS license_table, {license_row} AS license_row,"
+            " CASE WHEN s.user_id IS NULL THEN NULL ELSE jsonb_build_object("
+            "'reminder_days_before', s.reminder_days_before,"
+            " 'reminder_frequency', s.reminder_frequency,"
+            " 'notifications_enabled', s.notifications_enabled) END AS type_settings"
+            " FROM {relation} l"
+            " LEFT JOIN LATERAL (SELECT user_id, reminder_days_before, reminder_frequency, notifications_enabled"
+            " FROM license_type_settings WHERE user_id = l.user_id AND type = {settings_type} LIMIT 1) s ON true"
+            " WHERE {expiry} IS NOT NULL AND {expiry} >= %(today)s"
+            " AND {expiry} <= %(today)s + coalesce(s.reminder_days_before, 7){status}"
+        ).format(
+            table=sql.Literal(source.table_name),
+            relation=sql.Identifier(source.table_name),
+            license_row=_json_row("l", source.columns),
+            settings_type=sql.Literal(source.settings_type),
+            expiry=expiry,
+            status=status
+        )
+
+    def _build_query(self) -> sql.Composed:
+        licenses = sql.SQL(" UNION ALL ").join(self._license_select(source) for source in self.sources)
+        return sql.SQL(
+            "WITH licenses AS ({licenses})"
+            " SELECT {profile} AS profile,"
+            " coalesce((SELECT jsonb_agg({settings}) FROM license_type_settings lts WHERE lts.user_id = p.id),"
+            " '[]'::jsonb) AS license_type_settings,"
+            " licenses.license_table, licenses.license_row, licenses.type_settings"
+            " FROM licenses JOIN profiles p ON p.id = licenses.user_id"
+            " WHERE p.subscription_status = 'active'"
+            " ORDER BY p.id, licenses.license_table"
+        ).format(
+            licenses=licenses,
+            profile=_json_row("p", self.profile_columns),
+            settings=_json_row("lts", self.settings_columns)
+        )
+
+    def iter_users(self, today: date) -> Iterator[Tuple[Dict[str, Any], List[List[LicenseItem]]]]:
+        """Yield (user, license data per table) for active users with a license in their reminder window.
+
+        The user dict carries license_type_settings like the profiles query with the embed.
+        """
+        connection = psycopg2.connect(self.dsn)
+        try:
+            connection.set_session(readonly=True)
+            # A named cursor keeps the result on the server and fetches it fetch_size rows at a time
+            with connection.cursor(name="license_reminders") as cursor:
+                cursor.itersize = self.fetch_size
+                cursor.execute(self._query, {"today": today})
+
+                user, license_data, user_count = None, None, 0
+                for profile, license_settings, table_name, row, type_settings in cursor:
+                    if user is None or profile["id"] != user["id"]:
+                        if user is not None:
+                            yield user, license_data
+                        user = profile
+                        user["license_type_settings"] = license_settings
+                        license_data = [[] for _ in self.sources]
+                        user_count += 1
+                    position = self._positions[table_name]
+                    item = LicenseItem.from_row(table_name, row, self.sources[position].expiry_field)
+                    if item is None:
+                        continue
+                    if type_settings is not None:
+                        item.apply_settings(type_settings)
+                    license_data[position].append(item)
+                if user is not None:
+                    yield user, license_data
+            logger.info(f"Postgres source: {user_count} users with licenses in their reminder window")
+        finally:
+            connection.close()
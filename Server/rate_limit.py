@@ -0,0 +1,240 @@
+"""Adaptive rate limiting for calls to Supabase and the SMTP server.
+
+Each endpoint (a PostgREST table) and each SMTP account gets an AdaptiveLimiter: a token
+bucket for the request rate plus a cap on calls in flight. Both adapt AIMD-style: every
+throttling reply (HTTP 429/503, SMTP 4xx) halves them, every success adds a little back.
+Throttled calls are retried after an exponential backoff with full jitter, so workers
+that were throttled together do not come back together.
+
+The limits start unbounded unless configured; the first throttling reply sets them from
+the throughput observed at the time.
+"""
+import os
+import time
+import random
+import smtplib
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+# Requests per second per PostgREST endpoint and calls in flight; 0 leaves it to adaptation
+SUPABASE_RATE_LIMIT = float(os.getenv("SUPABASE_RATE_LIMIT") or 0)
+SUPABASE_MAX_CONCURRENCY = int(os.getenv("SUPABASE_MAX_CONCURRENCY") or 0)
+SUPABASE_THROTTLE_RETRIES = int(os.getenv("SUPABASE_THROTTLE_RETRIES") or 4)
+# Messages per second per SMTP account; concurrency is already capped by the pool size
+SMTP_RATE_LIMIT = float(os.getenv("SMTP_RATE_LIMIT") or 0)
+SMTP_THROTTLE_RETRIES = int(os.getenv("SMTP_THROTTLE_RETRIES") or 2)
+# Backoff between retries of a throttled call: full jitter up to base * 2^attempt, capped
+THROTTLE_BASE_DELAY = float(os.getenv("THROTTLE_BASE_DELAY") or 0.5)
+THROTTLE_MAX_DELAY = float(os.getenv("THROTTLE_MAX_DELAY") or 30)
+
+
+def backoff_with_jitter(attempt: int, base_delay: float, max_delay: float) -> float:
+    """Seconds to wait before retry number attempt: uniform between 0 and the exponential cap."""
+    return random.uniform(0, min(max_delay, base_delay * 2 ** (attempt - 1)))
+
+
+def postgrest_retry_after(error: Exception, idempotent: bool = True) -> Optional[float]:
+    """Seconds to hold off if error is PostgREST throttling, or None if it is not.
+
+    postgrest-py reports a reply without a JSON error body with the HTTP status as the
+    code. 503 is only retried for idempotent requests, as the request may have run.
+    """
+    try:
+        status = int(getattr(error, "code", None))
+    except (TypeError, ValueError):
+        return None
+    if status == 429 or (status == 503 and idempotent):
+        return 0.0
+    return None
+
+
+def smtp_retry_after(error: Exception) -> Optional[float]:
+    """Seconds to hold off if error is an SMTP 4xx (temporary) reply, or None if it is not."""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        codes = [code for code, _ in error.recipients.values()]
+        return 0.0 if codes and all(400 <= code < 500 for code in codes) else None
+    if isinstance(error, smtplib.SMTPResponseException) and 400 <= error.smtp_code < 500:
+        return 0.0
+    return None
+
+
+class AdaptiveLimiter:
+    """Token bucket and in-flight cap for one endpoint or account, adapted on throttling.
+
+    None for rate or concurrency means unbounded. On a throttling reply both are
+    multiplied by decrease (at most once per cooldown, so one burst of rejections counts
+    once), starting from the observed throughput if they were unbounded. Each success
+    then adds 1/rate to the rate and 1/concurrency to the cap, so at full speed they grow
+    by about one request per second each second and one call per round of calls, up to
+    the configured maximums.
+    """
+
+    def __init__(self, name: str, max_rate: float = 0.0, max_concurrency: int = 0, burst: Optional[float] = None,
+                 decrease: float = 0.5, min_rate: float = 0.5, cooldown: float = 1.0):
+        self.name = name
+        self.max_rate = max_rate
+        self.max_concurrency = max_concurrency
+        self.rate: Optional[float] = max_rate or None
+        self.concurrency: Optional[float] = float(max_concurrency) if max_concurrency else None
+        self.decrease = decrease
+        self.min_rate = min_rate
+        self.cooldown = cooldown
+        self.throttled_count = 0
+        self._burst = burst
+        self._tokens = self._capacity()
+        self._refilled = time.monotonic()
+        self._paused_until = 0.0
+        self._in_flight = 0
+        self._last_decrease = float("-inf")
+        self._window_start = time.monotonic()
+        self._window_count = 0
+        self._observed_rate = 0.0
+        self._condition = threading.Condition()
+
+    def _capacity(self) -> float:
+        return self._burst or max(1.0, self.rate or 1.0)
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self._capacity(), self._tokens + (now - self._refilled) * self.rate)
+        self._refilled = now
+
+    def _count_call(self, now: float) -> None:
+        elapsed = now - self._window_start
+        if elapsed >= 1.0:
+            self._observed_rate = self._window_count / elapsed
+            self._window_start, self._window_count = now, 0
+        self._window_count += 1
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        """Wait for a token and a free in-flight slot, and hold the slot for the block."""
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                if self.concurrency is not None and self._in_flight >= max(1, int(self.concurrency)):
+                    self._condition.wait()
+                    continue
+                wait = self._paused_until - now
+                if wait <= 0 and self.rate is not None:
+                    self._refill(now)
+                    wait = 0 if self._tokens >= 1 else (1 - self._tokens) / self.rate
+                if wait > 0:
+                    self._condition.wait(wait)
+                    continue
+                if self.rate is not None:
+                    self._tokens -= 1
+                self._in_flight += 1
+                self._count_call(now)
+                break
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._in_flight -= 1
+                self._condition.notify()
+
+    def on_success(self) -> None:
+        """Additive increase."""
+        with self._condition:
+            if self.rate is not None and (not self.max_rate or self.rate < self.max_rate):
+                self.rate += 1.0 / self.rate
+                if self.max_rate:
+                    self.rate = min(self.rate, self.max_rate)
+            if self.concurrency is not None and (not self.max_concurrency or self.concurrency < self.max_concurrency):
+                self.concurrency += 1.0 / max(self.concurrency, 1.0)
+                if self.max_concurrency:
+                    self.concurrency = min(self.concurrency, float(self.max_concurrency))
+                self._condition.notify_all()
+
+    def on_throttle(self, retry_after: Optional[float] = None) -> None:
+        """Multiplicative decrease, and no calls at all for retry_after seconds if given."""
+        with self._condition:
+            self.throttled_count += 1
+            now = time.monotonic()
+            if retry_after:
+                self._paused_until = max(self._paused_until, now + retry_after)
+            if now - self._last_decrease < self.cooldown:
+                return
+            self._last_decrease = now
+            current_rate = self.rate if self.rate is not None else max(self._observed_rate, 1.0)
+            self.rate = max(self.min_rate, current_rate * self.decrease)
+            self._tokens = min(self._tokens, self._capacity())
+            self._refilled = now
+            current_concurrency = self.concurrency if self.concurrency is not None else max(self._in_flight, 1)
+            self.concurrency = max(1.0, current_concurrency * self.decrease)
+        logger.warning(f"Throttled by {self.name}: slowing to {self.rate:.1f}/s, {int(self.concurrency)} at a time")
+
+
+class RateLimits:
+    """Adaptive limiters by name, and retrying calls made through them."""
+
+    def __init__(self, max_rate: float = 0.0, max_concurrency: int = 0, retries: int = 3,
+                 base_delay: float = THROTTLE_BASE_DELAY, max_delay: float = THROTTLE_MAX_DELAY):
+        self.max_rate = max_rate
+        self.max_concurrency = max_concurrency
+        self.retries = retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._limiters: Dict[str, AdaptiveLimiter] = {}
+        self._lock = threading.Lock()
+
+    def limiter(self, name: str) -> AdaptiveLimiter:
+        with self._lock:
+            limiter = self._limiters.get(name)
+            if limiter is None:
+                limiter = self._limiters[name] = AdaptiveLimiter(name, self.max_rate, self.max_concurrency)
+            return limiter
+
+    def call(self, name: str, fn: Callable[[], Any], retry_after: Callable[[Exception], Optional[float]],
+             metrics=None) -> Any:
+        """Run fn under the named limiter, retrying with jittered backoff while it is throttled.
+
+        retry_after classifies an error: None to raise it straight away, otherwise the
+        seconds the server asked to wait (0 if it did not say).
+        """
+        limiter = self.limiter(name)
+        attempt = 0
+        while True:
+            with limiter.slot():
+                try:
+                    result = fn()
+                except Exception as e:
+                    hold_off = retry_after(e)
+                    if hold_off is None:
+                        raise
+                    limiter.on_throttle(hold_off)
+                    if metrics is not None:
+                        metrics.increment("throttled_total", limiter=name)
+                    if attempt >= self.retries:
+                        raise
+                else:
+                    limiter.on_success()
+                    return result
+            attempt += 1
+            time.sleep(max(hold_off, backoff_with_jitter(attempt, self.base_delay, self.max_delay)))
+
+
+_shared: Dict[str, RateLimits] = {}
+_shared_lock = threading.Lock()
+
+
+def _shared_limits(kind: str, factory: Callable[[], RateLimits]) -> RateLimits:
+    with _shared_lock:
+        if kind not in _shared:
+            _shared[kind] = factory()
+        return _shared[kind]
+
+
+def supabase_rate_limits() -> RateLimits:
+    """The process-wide limiters for PostgREST endpoints, shared by every job in the process."""
+    return _shared_limits("supabase", lambda: RateLimits(SUPABASE_RATE_LIMIT, SUPABASE_MAX_CONCURRENCY,
+                                                         retries=SUPABASE_THROTTLE_RETRIES))
+
+
+def smtp_rate_limits() -> RateLimits:
+    """The process-wide limiters for SMTP accounts."""
+    return _shared_limits("smtp", lambda: RateLimits(SMTP_RATE_LIMIT, retries=SMTP_THROTTLE_RETRIES))
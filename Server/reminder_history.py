@@ -0,0 +1,102 @@
+import logging
+import threading
+from datetime import date, datetime, timezone
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Message prefixes of the notifications the reminder run writes, which its checks look for
+REMINDER_MESSAGE_PREFIX = "Email sent: License expires"
+PAUSE_MESSAGE_PREFIX = "Notifications paused until"
+# Days before a paused license is mentioned in a reminder email again
+PAUSE_NOTICE_DAYS = 5
+
+
+def reminder_message(days_until: int, expiry_date: date) -> str:
+    """The notification message for an item a reminder email was sent about."""
+    return f"{REMINDER_MESSAGE_PREFIX} in {days_until} days (on {expiry_date})"
+
+
+def pause_notice_message(resume_date: date) -> str:
+    """The notification message for a paused item a reminder email mentioned."""
+    return f"{PAUSE_MESSAGE_PREFIX} {resume_date}"
+
+
+def parse_created_at(created_at: Any) -> Optional[datetime]:
+    """Parse a notifications.created_at value into an aware datetime, assuming UTC if naive."""
+    if isinstance(created_at, str):
+        created_at = datetime.fromisoformat(created_at.replace("Z", "+00:00"))
+    if not isinstance(created_at, datetime):
+        return None
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    return created_at
+
+
+class ReminderHistoryIndex:
+    """In-memory index of recent reminder and pause notifications, keyed by user and license.
+
+    Loaded once per run for the look-back window the checks need, then kept current from
+    the notifications written during the run.
+    """
+
+    def __init__(self):
+        self._last_reminder: Dict[str, datetime] = {}
+        self._last_pause_notice: Dict[Tuple[str, str], datetime] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, supabase_client, since: datetime, page_size: int = 1000) -> "ReminderHistoryIndex":
+        """Build the index from notifications created at or after since."""
+        index = cls()
+        loaded = 0
+        for prefix in (REMINDER_MESSAGE_PREFIX, PAUSE_MESSAGE_PREFIX):
+            start = 0
+            while True:
+                response = supabase_client.table("notifications") \
+                    .select("user_id,license_id,message,created_at") \
+                    .like("message", f"{prefix}%") \
+                    .gte("created_at", since.isoformat()) \
+                    .order("created_at") \
+                    .range(start, start + page_size - 1) \
+                    .execute()
+                page = response.data or []
+                for row in page:
+                    index.record(row)
+                loaded += len(page)
+                if len(page) < page_size:
+                    break
+                start += page_size
+        logger.info(f"Loaded {loaded} recent reminder notifications since {since.date()}")
+        return index
+
+    def record(self, notification: Dict[str, Any], created_at: Optional[datetime] = None) -> None:
+        """Add a notification row to the index if it is one the reminder checks care about."""
+        message = notification.get("message") or ""
+        created = created_at or parse_created_at(notification.get("created_at")) or datetime.now(timezone.utc)
+        user_id = notification.get("user_id")
+
+        with self._lock:
+            if message.startswith(REMINDER_MESSAGE_PREFIX):
+                previous = self._last_reminder.get(user_id)
+                if previous is None or created > previous:
+                    self._last_reminder[user_id] = created
+            elif message.startswith(PAUSE_MESSAGE_PREFIX):
+                key = (user_id, str(notification.get("license_id")))
+                previous = self._last_pause_notice.get(key)
+                if previous is None or created > previous:
+                    self._last_pause_notice[key] = created
+
+    def record_written(self, notifications: Iterable[Dict[str, Any]]) -> None:
+        """Index a batch of notifications that has just been inserted."""
+        written_at = datetime.now(timezone.utc)
+        for notification in notifications:
+            self.record(notification, written_at)
+
+    def last_reminder_date(self, user_id: str) -> Optional[datetime]:
+        with self._lock:
+            return self._last_reminder.get(user_id)
+
+    def last_pause_notice(self, user_id: str, license_id: str) -> Optional[datetime]:
+        with self._lock:
+            return self._last_pause_notice.get((user_id, str(license_id)))
@@ -0,0 +1,99 @@
+import logging
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional
+
+from license_item import LicenseItem
+from license_settings import DEFAULT_REMINDER_DAYS_BEFORE, DEFAULT_REMINDER_FREQUENCY
+
+logger = logging.getLogger(__name__)
+
+# Days between reminders for each reminder_frequency, as in should_send_reminder
+FREQUENCY_DAYS = {
+    "daily": 1,
+    "weekly": 7,
+    "monthly": 28
+}
+
+
+def next_due_date(expiry_date: Optional[date], reminder_days_before: Any, reminder_frequency: Optional[str],
+                  notifications_enabled: Any, last_sent: Optional[date]) -> Optional[date]:
+    """First day a reminder could next go out for an item, or None if none will.
+
+    That is the start of the reminder window, or one frequency interval after the last
+    send, whichever is later. Mirrors reminder_next_due() in the reminder_schedule migration.
+    """
+    if expiry_date is None or not notifications_enabled:
+        return None
+    days_before = DEFAULT_REMINDER_DAYS_BEFORE if reminder_days_before is None else reminder_days_before
+    if not isinstance(days_before, int) or days_before <= 0:
+        return None
+
+    due = expiry_date - timedelta(days=days_before)
+    interval = FREQUENCY_DAYS.get(reminder_frequency or DEFAULT_REMINDER_FREQUENCY)
+    if last_sent is not None and interval is not None:
+        due = max(due, last_sent + timedelta(days=interval))
+    return due if due <= expiry_date else None
+
+
+class ReminderSchedule:
+    """Reads and advances the reminder_schedule table of next-due dates per license item.
+
+    The table is created and kept current by supabase/migrations/*_reminder_schedule.sql;
+    this side finds the users with something due and records the sends the run makes.
+    """
+
+    def __init__(self, supabase_client, page_size: int = 1000, table: str = "reminder_schedule"):
+        self.supabase = supabase_client
+        self.page_size = page_size
+        self.table = table
+
+    def due_user_ids(self, today: date) -> List[str]:
+        """Users with at least one unexpired item due on or before today, in id order."""
+        user_ids = set()
+        start = 0
+        while True:
+            response = self.supabase.table(self.table) \
+                .select("user_id") \
+                .lte("next_due_date", today.isoformat()) \
+                .gte("expiry_date", today.isoformat()) \
+                .order("user_id") \
+                .order("license_type") \
+                .order("license_id") \
+                .range(start, start + self.page_size - 1) \
+                .execute()
+            page = response.data or []
+            user_ids.update(row["user_id"] for row in page)
+            if len(page) < self.page_size:
+                return sorted(user_ids)
+            start += self.page_size
+
+    def sent_rows(self, user_id: str, license_items: Iterable[LicenseItem], sent_on: date) -> List[Dict[str, Any]]:
+        """Schedule rows moving each item reminded about on sent_on to its next due date."""
+        rows = []
+        for item in license_items:
+            due = next_due_date(item.expiry_date, item.reminder_days_before, item.reminder_frequency,
+                                item.notifications_enabled, sent_on)
+            rows.append({
+                "license_type": item.table,
+                "license_id": str(item.id),
+                "user_id": user_id,
+                "expiry_date": item.expiry_date.isoformat(),
+                "next_due_date": due.isoformat() if due else None,
+                "last_sent_at": sent_on.isoformat(),
+                "updated_at": datetime.now().isoformat()
+            })
+        return rows
+
+    def record_sent(self, user_id: str, license_items: Iterable[LicenseItem], sent_on: date) -> None:
+        """Move each item reminded about today to its next due date."""
+        self.record_rows(user_id, self.sent_rows(user_id, license_items, sent_on))
+
+    def record_rows(self, user_id: str, rows: List[Dict[str, Any]]) -> None:
+        """Write schedule rows built by sent_rows."""
+        if not rows:
+            return
+        try:
+            self.supabase.table(self.table).upsert(rows, on_conflict="license_type,license_id").execute()
+        except Exception as e:
+            # The item stays due, so the next run re-checks it against the notification history
+            logger.error(f"Failed to update reminder schedule for user {user_id}: {str(e)}")
@@ -0,0 +1,208 @@
+import sqlite3
+import logging
+import threading
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Journal states for a user's reminder on a given day
+SENDING = "sending"
+DONE = "done"
+
+
+def idempotency_key(user_id: str, run_date: date) -> str:
+    """The key identifying one user's reminder for one day."""
+    return f"reminder:{run_date.isoformat()}:{user_id}"
+
+
+class BaseRunJournal:
+    """Which users a day's reminder run has finished with, whatever stores the entries.
+
+    A user is marked SENDING just before their email goes out and DONE once they are
+    fully processed. A restarted run skips every user with an entry for the day: DONE
+    users are finished, and SENDING users may already have been emailed, so they are
+    skipped rather than risk a second send.
+    """
+
+    def __init__(self, run_date: Optional[date]):
+        self.run_date = run_date or date.today()
+        self._lock = threading.Lock()
+        self._completed: Set[str] = set()
+        self._in_doubt: Set[str] = set()
+
+    def _resume(self, entries: Iterable[Tuple[str, str]]) -> None:
+        for user_id, status in entries:
+            (self._completed if status == DONE else self._in_doubt).add(user_id)
+        if self._completed or self._in_doubt:
+            logger.info(f"Resuming run for {self.run_date}: {len(self._completed)} users done, "
+                        f"{len(self._in_doubt)} interrupted mid-send will be skipped")
+
+    def should_skip(self, user_id: str) -> bool:
+        """True if the user already has an entry for today's run."""
+        with self._lock:
+            if user_id in self._in_doubt:
+                logger.warning(f"User {user_id}: skipped, previous run was interrupted while sending")
+                return True
+            return user_id in self._completed
+
+    def mark_sending(self, user_id: str) -> bool:
+        """Claim the user's send for today. Returns False if it was already claimed."""
+        with self._lock:
+            if user_id in self._completed or user_id in self._in_doubt:
+                return False
+            # Taken before the claim, so no other thread of this run claims the user meanwhile
+            self._in_doubt.add(user_id)
+        # The claim may be a network round-trip, so it runs outside the lock; the store's
+        # key makes it succeed for only one claimant
+        return self._claim(user_id)
+
+    def mark_done(self, user_id: str) -> None:
+        with self._lock:
+            self._complete(user_id)
+            self._in_doubt.discard(user_id)
+            self._completed.add(user_id)
+
+    def release(self, user_id: str) -> None:
+        """Drop the user's entry for the day, so a rerun sends their reminder after all."""
+        with self._lock:
+            self._delete(user_id)
+            self._in_doubt.discard(user_id)
+            self._completed.discard(user_id)
+
+    def _claim(self, user_id: str) -> bool:
+        raise NotImplementedError
+
+    def _complete(self, user_id: str) -> None:
+        raise NotImplementedError
+
+    def _delete(self, user_id: str) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class RunJournal(BaseRunJournal):
+    """Run journal in a local SQLite file, for runs that always restart on the same host."""
+
+    def __init__(self, path: str, run_date: Optional[date] = None, retention_days: int = 7):
+        super().__init__(run_date)
+        self.path = path
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS reminder_journal ("
+            " idempotency_key TEXT PRIMARY KEY,"
+            " run_date TEXT NOT NULL,"
+            " user_id TEXT NOT NULL,"
+            " status TEXT NOT NULL,"
+            " updated_at TEXT NOT NULL)"
+        )
+        self._connection.execute(
+            "DELETE FROM reminder_journal WHERE run_date < ?",
+            ((self.run_date - timedelta(days=retention_days)).isoformat(),)
+        )
+        self._resume(self._connection.execute(
+            "SELECT user_id, status FROM reminder_journal WHERE run_date = ?", (self.run_date.isoformat(),)))
+
+    def _claim(self, user_id: str) -> bool:
+        # A local write is quick, so the connection stays behind the journal's lock
+        with self._lock:
+            return self._write(user_id, SENDING, replace=False) == 1
+
+    def _complete(self, user_id: str) -> None:
+        self._write(user_id, DONE, replace=True)
+
+    def _delete(self, user_id: str) -> None:
+        self._connection.execute("DELETE FROM reminder_journal WHERE idempotency_key = ?",
+                                 (idempotency_key(user_id, self.run_date),))
+
+    def _write(self, user_id: str, status: str, replace: bool) -> int:
+        verb = "INSERT OR REPLACE" if replace else "INSERT OR IGNORE"
+        cursor = self._connection.execute(
+            f"{verb} INTO reminder_journal (idempotency_key, run_date, user_id, status, updated_at) VALUES (?, ?, ?, ?, ?)",
+            (idempotency_key(user_id, self.run_date), self.run_date.isoformat(), user_id, status, datetime.now().isoformat())
+        )
+        return cursor.rowcount
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+
+class SupabaseRunJournal(BaseRunJournal):
+    """Run journal in the reminder_journal table, shared by every runner and worker.
+
+    A claim is an insert that does nothing if the key exists, so of two runs (or a rerun
+    on a fresh machine) only one gets to send a user's reminder for the day. DONE marks
+    only save a restarted run from re-evaluating users, so they are written in batches.
+    """
+
+    def __init__(self, supabase_client, run_date: Optional[date] = None, retention_days: int = 7,
+                 table: str = "reminder_journal", page_size: int = 1000, batch_size: int = 500):
+        super().__init__(run_date)
+        self.supabase = supabase_client
+        self.table = table
+        self.batch_size = batch_size
+        self._pending_done: List[Dict[str, str]] = []
+        self.supabase.table(self.table) \
+            .delete() \
+            .lt("run_date", (self.run_date - timedelta(days=retention_days)).isoformat()) \
+            .execute()
+        self._resume(self._load(page_size))
+
+    def _load(self, page_size: int) -> List[Tuple[str, str]]:
+        entries = []
+        start = 0
+        while True:
+            page = self.supabase.table(self.table) \
+                .select("user_id,status") \
+                .eq("run_date", self.run_date.isoformat()) \
+                .order("idempotency_key") \
+                .range(start, start + page_size - 1) \
+                .execute().data or []
+            entries.extend((row["user_id"], row["status"]) for row in page)
+            if len(page) < page_size:
+                return entries
+            start += page_size
+
+    def _row(self, user_id: str, status: str) -> Dict[str, str]:
+        return {
+            "idempotency_key": idempotency_key(user_id, self.run_date),
+            "run_date": self.run_date.isoformat(),
+            "user_id": user_id,
+            "status": status,
+            "updated_at": datetime.now(timezone.utc).isoformat()
+        }
+
+    def _claim(self, user_id: str) -> bool:
+        response = self.supabase.table(self.table) \
+            .upsert(self._row(user_id, SENDING), on_conflict="idempotency_key", ignore_duplicates=True) \
+            .execute()
+        return bool(response.data)
+
+    def _complete(self, user_id: str) -> None:
+        self._pending_done.append(self._row(user_id, DONE))
+        if len(self._pending_done) >= self.batch_size:
+            self._flush()
+
+    def _delete(self, user_id: str) -> None:
+        key = idempotency_key(user_id, self.run_date)
+        self._pending_done = [row for row in self._pending_done if row["idempotency_key"] != key]
+        self.supabase.table(self.table).delete().eq("idempotency_key", key).execute()
+
+    def _flush(self) -> None:
+        rows, self._pending_done = self._pending_done, []
+        if not rows:
+            return
+        try:
+            self.supabase.table(self.table).upsert(rows, on_conflict="idempotency_key").execute()
+        except Exception as e:
+            # A lost DONE mark only means the user is evaluated again after a restart
+            logger.warning(f"Could not record {len(rows)} finished users in the run journal: {str(e)}")
+
+    def close(self) -> None:
+        with self._lock:
+            self._flush()
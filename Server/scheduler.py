@@ -0,0 +1,289 @@
+"""Long-running scheduler hosting the three Server jobs in one process.
+
+Runs send_reminders, manage_notify and check_subscriptions on their own intervals,
+sharing one Supabase client, the reminder service's SMTP pool and its compiled email
+template between runs. A small HTTP endpoint on localhost reports job status and accepts
+run-now requests.
+
+    python scheduler.py                         # run the scheduler
+    python scheduler.py run-now reminders       # ask a running scheduler to start a job now
+    python scheduler.py run-now                 # ... or every job
+    python scheduler.py status
+"""
+import os
+import sys
+import json
+import time
+import signal
+import logging
+import argparse
+import threading
+import urllib.request
+import urllib.error
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional
+
+import send_reminders
+import manage_notify
+import check_subscriptions
+from metrics import RunMetrics
+
+logger = logging.getLogger(__name__)
+
+# Seconds between runs of each job; 0 disables a job
+REMINDERS_INTERVAL = float(os.getenv("SCHEDULER_REMINDERS_INTERVAL") or 86400)
+NOTIFY_INTERVAL = float(os.getenv("SCHEDULER_NOTIFY_INTERVAL") or 3600)
+SUBSCRIPTIONS_INTERVAL = float(os.getenv("SCHEDULER_SUBSCRIPTIONS_INTERVAL") or 3600)
+# Run every job once at startup instead of waiting a full interval
+RUN_ON_START = os.getenv("SCHEDULER_RUN_ON_START", "true").lower() not in ("0", "false", "no")
+# Local control endpoint for status and run-now; only bound to localhost
+SCHEDULER_HOST = os.getenv("SCHEDULER_HOST", "127.0.0.1")
+SCHEDULER_PORT = int(os.getenv("SCHEDULER_PORT") or 8787)
+
+
+class Job:
+    """One scheduled job: what to run, how often, and how its last run went."""
+
+    def __init__(self, name: str, run: Callable[[], Any], interval: float,
+                 close: Optional[Callable[[], None]] = None):
+        self.name = name
+        self.run = run
+        self.interval = interval
+        # Releases what the job keeps warm between runs, at shutdown
+        self.close = close
+        self.next_run: Optional[float] = None
+        self.running = False
+        self.runs = 0
+        self.last_started: Optional[str] = None
+        self.last_finished: Optional[str] = None
+        self.last_duration: Optional[float] = None
+        self.last_status: Optional[str] = None
+        self.last_error: Optional[str] = None
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "interval_seconds": self.interval,
+            "running": self.running,
+            "runs": self.runs,
+            "next_run_in_seconds": None if self.next_run is None else max(0.0, round(self.next_run - time.monotonic(), 1)),
+            "last_started": self.last_started,
+            "last_finished": self.last_finished,
+            "last_duration_seconds": self.last_duration,
+            "last_status": self.last_status,
+            "last_error": self.last_error
+        }
+
+
+class Scheduler:
+    """Run jobs on their intervals, each on its own thread, never two runs of a job at once."""
+
+    def __init__(self, jobs: List[Job], tick: float = 1.0):
+        self.jobs = {job.name: job for job in jobs}
+        self.tick = tick
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def schedule(self, run_on_start: bool) -> None:
+        now = time.monotonic()
+        for job in self.jobs.values():
+            if job.interval > 0:
+                job.next_run = now if run_on_start else now + job.interval
+
+    def trigger(self, name: str) -> str:
+        """Make a job due now. Returns 'started', 'running' or 'unknown'."""
+        with self._lock:
+            job = self.jobs.get(name)
+            if job is None:
+                return "unknown"
+            if job.running:
+                return "running"
+            job.next_run = time.monotonic()
+        self._wake.set()
+        return "started"
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {name: job.status() for name, job in self.jobs.items()}
+
+    def run_forever(self) -> None:
+        while not self._stop.is_set():
+            now = time.monotonic()
+            with self._lock:
+                due = [job for job in self.jobs.values()
+                       if not job.running and job.next_run is not None and job.next_run <= now]
+                for job in due:
+                    job.running = True
+            for job in due:
+                thread = threading.Thread(target=self._run_job, args=(job,), name=f"job-{job.name}")
+                self._threads.append(thread)
+                thread.start()
+            self._threads = [thread for thread in self._threads if thread.is_alive()]
+            self._wake.wait(self.tick)
+            self._wake.clear()
+
+    def request_stop(self) -> None:
+        """Stop starting new runs; safe to call from a signal handler."""
+        self._stop.set()
+        self._wake.set()
+
+    def stop(self) -> None:
+        """Stop scheduling and wait for runs in progress to finish."""
+        self.request_stop()
+        for thread in list(self._threads):
+            thread.join()
+
+    def _run_job(self, job: Job) -> None:
+        job.last_started = datetime.now().isoformat()
+        logger.info(f"Scheduler: starting {job.name}")
+        started = time.perf_counter()
+        try:
+            job.run()
+            status, error = "success", None
+        except Exception as e:
+            status, error = "failure", str(e)
+            logger.error(f"Scheduler: {job.name} failed: {str(e)}")
+        duration = round(time.perf_counter() - started, 3)
+        with self._lock:
+            job.running = False
+            job.runs += 1
+            job.last_finished = datetime.now().isoformat()
+            job.last_duration = duration
+            job.last_status = status
+            job.last_error = error
+            job.next_run = time.monotonic() + job.interval if job.interval > 0 else None
+        logger.info(f"Scheduler: {job.name} finished with {status} in {duration}s")
+
+
+def build_jobs(supabase_client) -> List[Job]:
+    """Create the three jobs around one shared client and long-lived service objects.
+
+    Each job keeps one metrics registry for the life of the process, so counters are
+    cumulative across runs and the metrics files are rewritten after every run.
+    """
+    reminder_service = send_reminders.LicenseReminderService(supabase_client)
+    notification_manager = manage_notify.NotificationManager(supabase_client)
+    subscription_metrics = RunMetrics("check_subscriptions")
+
+    def run_reminders():
+        try:
+            reminder_service.send_reminders()
+        finally:
+            # Sessions would not survive the wait for the next run
+            reminder_service.smtp_pool.close()
+            reminder_service.metrics.write(send_reminders.METRICS_FILE)
+
+    def run_notify():
+        try:
+            notification_manager.process_all_tables()
+        finally:
+            notification_manager.metrics.write(manage_notify.METRICS_FILE)
+
+    def run_subscriptions():
+        try:
+            check_subscriptions.update_expired_subscriptions(supabase_client, metrics=subscription_metrics)
+        finally:
+            subscription_metrics.write(check_subscriptions.METRICS_FILE)
+
+    return [
+        Job("reminders", run_reminders, REMINDERS_INTERVAL, close=reminder_service.smtp_pool.close),
+        Job("notify", run_notify, NOTIFY_INTERVAL),
+        Job("subscriptions", run_subscriptions, SUBSCRIPTIONS_INTERVAL)
+    ]
+
+
+class _ControlHandler(BaseHTTPRequestHandler):
+    """GET /status, POST /run/<job> or POST /run for every job."""
+
+    def _reply(self, code: int, payload: Dict[str, Any]) -> None:
+        body = json.dumps(payload, indent=2).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self) -> None:
+        if self.path.rstrip("/") == "/status":
+            self._reply(200, self.server.scheduler.status())
+        else:
+            self._reply(404, {"error": "not found"})
+
+    def do_POST(self) -> None:
+        parts = [part for part in self.path.split("/") if part]
+        if not parts or parts[0] != "run" or len(parts) > 2:
+            self._reply(404, {"error": "not found"})
+            return
+        scheduler: Scheduler = self.server.scheduler
+        names = parts[1:] or list(scheduler.jobs)
+        results = {name: scheduler.trigger(name) for name in names}
+        self._reply(404 if "unknown" in results.values() else 202, results)
+
+    def log_message(self, format: str, *args) -> None:
+        logger.debug(f"Scheduler control: {format % args}")
+
+
+def serve() -> None:
+    jobs = build_jobs(send_reminders.connect())
+    scheduler = Scheduler(jobs)
+    scheduler.schedule(RUN_ON_START)
+
+    control = ThreadingHTTPServer((SCHEDULER_HOST, SCHEDULER_PORT), _ControlHandler)
+    control.daemon_threads = True
+    control.scheduler = scheduler
+    threading.Thread(target=control.serve_forever, name="scheduler-control", daemon=True).start()
+    logger.info(f"Scheduler started: {', '.join(f'{job.name} every {job.interval:.0f}s' for job in jobs if job.interval > 0)}; "
+                f"control on http://{SCHEDULER_HOST}:{SCHEDULER_PORT}")
+
+    def shutdown(signum, frame):
+        logger.info(f"Scheduler: received signal {signum}, stopping after runs in progress")
+        scheduler.request_stop()
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+    try:
+        scheduler.run_forever()
+    finally:
+        scheduler.stop()
+        control.shutdown()
+        for job in jobs:
+            if job.close:
+                job.close()
+        logger.info("Scheduler stopped")
+
+
+def _request(method: str, path: str) -> int:
+    request = urllib.request.Request(f"http://{SCHEDULER_HOST}:{SCHEDULER_PORT}{path}", method=method)
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            print(response.read().decode("utf-8"))
+            return 0
+    except urllib.error.HTTPError as e:
+        print(e.read().decode("utf-8"))
+        return 1
+    except urllib.error.URLError as e:
+        print(f"Scheduler not reachable on {SCHEDULER_HOST}:{SCHEDULER_PORT}: {e.reason}", file=sys.stderr)
+        return 1
+
+
+def main(argv: List[str] = None) -> None:
+    parser = argparse.ArgumentParser(description="Run the Server jobs on a schedule in one process.")
+    commands = parser.add_subparsers(dest="command")
+    commands.add_parser("serve", help="run the scheduler (default)")
+    run_now = commands.add_parser("run-now", help="start jobs on a running scheduler now")
+    run_now.add_argument("jobs", nargs="*", help="reminders, notify and/or subscriptions (default: all)")
+    commands.add_parser("status", help="show job status from a running scheduler")
+    args = parser.parse_args(argv)
+
+    if args.command == "run-now":
+        sys.exit(max([_request("POST", f"/run/{job}") for job in args.jobs] or [_request("POST", "/run")]))
+    elif args.command == "status":
+        sys.exit(_request("GET", "/status"))
+    else:
+        serve()
+
+
+if __name__ == "__main__":
+    main()
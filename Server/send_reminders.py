@@ -1,24 +1,39 @@
 import os
 import sys
-import smtplib
 import logging
-from datetime import datetime, timedelta
-from typing import List, Dict, Tuple, Any, Optional
+import argparse
+import threading
+from datetime import date, datetime, timedelta, timezone
+from typing import List, Dict, Tuple, Any, Optional, Callable, Iterable, Iterator
+from email import message_from_bytes
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from dotenv import load_dotenv
 from jinja2 import Environment, FileSystemLoader
 from supabase import create_client, Client
 
-# Configure logging with a simpler format and INFO level
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("reminders.log"),
-        logging.StreamHandler(sys.stdout)
-    ]
+from notification_writer import NotificationWriter
+from outbox import Outbox, OutboxDelivery, OutboxEntry
+from pipeline import Stage, StagedPipeline
+from rate_limit import smtp_rate_limits, supabase_rate_limits
+from postgres_source import LicenseSource, PostgresLicenseSource
+from reminder_history import (
+    PAUSE_MESSAGE_PREFIX, PAUSE_NOTICE_DAYS, REMINDER_MESSAGE_PREFIX, ReminderHistoryIndex, parse_created_at,
+    pause_notice_message, reminder_message
 )
+from reminder_schedule import ReminderSchedule
+from shard_leases import ShardLeaseTable, parse_shard, shard_of
+from run_journal import BaseRunJournal, RunJournal, SupabaseRunJournal, idempotency_key
+from column_projections import columns_for, license_columns, select_list
+from license_formats import get_license_format
+from license_item import LicenseItem
+from license_settings import DEFAULT_REMINDER_DAYS_BEFORE, PAUSE_DAYS, LicenseSettingsResolver
+from log_setup import configure_logging
+from metrics import RunMetrics, instrument_client, timed
+from smtp_pool import SMTPConnectionPool
+
+# Log through the shared queued setup (see log_setup)
+configure_logging("reminders.log", logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Load environment variables
@@ -31,31 +46,130 @@ SMTP_PORT_STR = os.getenv("SMTP_PORT", "587")
 SMTP_PORT = int(SMTP_PORT_STR) if SMTP_PORT_STR else 587
 EMAIL_USERNAME = os.getenv("EMAIL_USERNAME")
 EMAIL_PASSWORD = os.getenv("EMAIL_PASSWORD")
-
-# Check for required environment variables
-required_env_vars = [
-    'SUPABASE_URL', 'SUPABASE_KEY',
-    'SMTP_SERVER', 'SMTP_PORT', 'EMAIL_USERNAME', 'EMAIL_PASSWORD'
-]
-missing_env_vars = [var for var in required_env_vars if not globals().get(var)]
-if missing_env_vars:
-    logger.critical(f"Missing required environment variables: {', '.join(missing_env_vars)}")
-    sys.exit(1)
-
-# Initialize Supabase client
-try:
-    supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
-    logger.info("Database connection established")
-except Exception as e:
-    logger.critical(f"Database connection failed: {str(e)}")
-    sys.exit(1)
+# Users loaded per bulk fetch, and rows per page (kept at or below PostgREST max_rows)
+REMINDER_BATCH_SIZE = int(os.getenv("REMINDER_BATCH_SIZE") or 100)
+REMINDER_PAGE_SIZE = int(os.getenv("REMINDER_PAGE_SIZE") or 1000)
+# Active profiles fetched per keyset page
+PROFILE_PAGE_SIZE = int(os.getenv("PROFILE_PAGE_SIZE") or 500)
+# Persistent SMTP sessions shared by all sends, and messages per session before it is recycled
+SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE") or 2)
+SMTP_MAX_MESSAGES_PER_CONNECTION = int(os.getenv("SMTP_MAX_MESSAGES_PER_CONNECTION") or 100)
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "true").lower() not in ("0", "false", "no")
+# Seconds an idle SMTP session is kept for reuse; older ones are closed, as the server has likely dropped them
+SMTP_MAX_IDLE_SECONDS = float(os.getenv("SMTP_MAX_IDLE_SECONDS") or 60)
+# Concurrent staged pipeline: on/off, worker threads per stage, and items buffered between stages
+REMINDER_CONCURRENT = os.getenv("REMINDER_CONCURRENT", "").lower() in ("1", "true", "yes")
+REMINDER_FETCH_WORKERS = int(os.getenv("REMINDER_FETCH_WORKERS") or 2)
+REMINDER_EVALUATE_WORKERS = int(os.getenv("REMINDER_EVALUATE_WORKERS") or 4)
+REMINDER_RENDER_WORKERS = int(os.getenv("REMINDER_RENDER_WORKERS") or 2)
+REMINDER_SEND_WORKERS = int(os.getenv("REMINDER_SEND_WORKERS") or SMTP_POOL_SIZE)
+REMINDER_QUEUE_SIZE = int(os.getenv("REMINDER_QUEUE_SIZE") or 100)
+# Buffered notification writes: rows per insert, seconds between flushes, and where failed rows go
+NOTIFICATION_BATCH_SIZE = int(os.getenv("NOTIFICATION_BATCH_SIZE") or 100)
+NOTIFICATION_FLUSH_INTERVAL = float(os.getenv("NOTIFICATION_FLUSH_INTERVAL") or 5)
+NOTIFICATION_FAILURE_LOG = os.getenv("NOTIFICATION_FAILURE_LOG", "failed_notifications.jsonl")
+# Notification history preloaded per run: the longest reminder frequency (monthly) is 28 days,
+# and an older last reminder passes every frequency check just like no reminder at all
+REMINDER_HISTORY_DAYS = 28
+# Journal of users finished per day, so a restarted run resumes without double-sending:
+# "supabase" for the reminder_journal table (needs its migration applied), which survives
+# the throwaway CI runners; a file path for a local SQLite journal; empty disables it
+REMINDER_JOURNAL = os.getenv("REMINDER_JOURNAL", "supabase")
+# Durable outbox of rendered emails, drained by delivery workers that retry transient SMTP
+# failures with exponential backoff; an empty path sends inline. A run waits up to
+# OUTBOX_DRAIN_TIMEOUT seconds for retries, then reports anything left as failed
+REMINDER_OUTBOX = os.getenv("REMINDER_OUTBOX", "reminder_outbox.sqlite3")
+OUTBOX_WORKERS = int(os.getenv("OUTBOX_WORKERS") or SMTP_POOL_SIZE)
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS") or 6)
+OUTBOX_RETRY_DELAY = float(os.getenv("OUTBOX_RETRY_DELAY") or 30)
+OUTBOX_MAX_RETRY_DELAY = float(os.getenv("OUTBOX_MAX_RETRY_DELAY") or 900)
+OUTBOX_DRAIN_TIMEOUT = float(os.getenv("OUTBOX_DRAIN_TIMEOUT") or 1200)
+# Read only users with reminders due from the reminder_schedule table (needs its migration applied)
+REMINDER_SCHEDULE = os.getenv("REMINDER_SCHEDULE", "").lower() in ("1", "true", "yes")
+# Optional direct Postgres connection: one streamed query replaces the per-batch PostgREST reads
+SUPABASE_DB_URL = os.getenv("SUPABASE_DB_URL")
+POSTGRES_FETCH_SIZE = int(os.getenv("POSTGRES_FETCH_SIZE") or 2000)
+# Where run metrics go at the end: Prometheus textfile for .prom, JSON summary otherwise
+METRICS_FILE = os.getenv("REMINDER_METRICS_FILE", "reminders_metrics.json")
+# Seconds a worker's claim on a shard lasts without renewal before another worker may take it over
+SHARD_LEASE_SECONDS = float(os.getenv("REMINDER_SHARD_LEASE_SECONDS") or 300)
 
 # Initialize Jinja2 environment for email templates
-env = Environment(loader=FileSystemLoader('templates'))
+env = Environment(loader=FileSystemLoader(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')))
+
+def connect() -> Client:
+    """Check the required environment variables and create the Supabase client, exiting on failure."""
+    required_env_vars = [
+        'SUPABASE_URL', 'SUPABASE_KEY',
+        'SMTP_SERVER', 'SMTP_PORT', 'EMAIL_USERNAME', 'EMAIL_PASSWORD'
+    ]
+    missing_env_vars = [var for var in required_env_vars if not globals().get(var)]
+    if missing_env_vars:
+        logger.critical(f"Missing required environment variables: {', '.join(missing_env_vars)}")
+        sys.exit(1)
+
+    try:
+        supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+        logger.info("Database connection established")
+        return supabase
+    except Exception as e:
+        logger.critical(f"Database connection failed: {str(e)}")
+        sys.exit(1)
 
 class LicenseReminderService:
-    def __init__(self, supabase_client: Client):
-        self.supabase = supabase_client
+    def __init__(self, supabase_client: Client, batch_size: int = None, page_size: int = None,
+                 smtp_pool: Optional[SMTPConnectionPool] = None, profile_page_size: int = None,
+                 metrics: Optional[RunMetrics] = None, journal_path: Optional[str] = None,
+                 use_schedule: Optional[bool] = None, database_url: Optional[str] = None,
+                 outbox_path: Optional[str] = None, shard: Optional[Tuple[int, int]] = None):
+        self.metrics = metrics or RunMetrics("send_reminders")
+        # Every query made through the client is counted, timed and rate limited per table
+        self.supabase = instrument_client(supabase_client, self.metrics, supabase_rate_limits())
+        # Users per bulk fetch, rows per page when paging through bulk results, and profiles per page
+        self.batch_size = batch_size or REMINDER_BATCH_SIZE
+        self.page_size = page_size or REMINDER_PAGE_SIZE
+        self.profile_page_size = profile_page_size or PROFILE_PAGE_SIZE
+        self.smtp_pool = smtp_pool or SMTPConnectionPool(
+            SMTP_SERVER, SMTP_PORT, EMAIL_USERNAME, EMAIL_PASSWORD,
+            pool_size=SMTP_POOL_SIZE,
+            max_messages_per_connection=SMTP_MAX_MESSAGES_PER_CONNECTION,
+            use_starttls=SMTP_STARTTLS,
+            limits=smtp_rate_limits(),
+            max_idle_seconds=SMTP_MAX_IDLE_SECONDS
+        )
+        self.notification_writer = NotificationWriter(
+            self.supabase,
+            batch_size=NOTIFICATION_BATCH_SIZE,
+            flush_interval=NOTIFICATION_FLUSH_INTERVAL,
+            failure_log_path=NOTIFICATION_FAILURE_LOG
+        )
+        # Compiled once and reused for every email
+        self.email_template = env.get_template('email_template.html')
+        # Run journal, opened by send_reminders: "supabase", a SQLite path, or empty to disable it
+        self.journal_path = REMINDER_JOURNAL if journal_path is None else journal_path
+        self.journal: Optional[BaseRunJournal] = None
+        # Email outbox and its delivery workers, opened by send_reminders; an empty path disables them
+        self.outbox_path = REMINDER_OUTBOX if outbox_path is None else outbox_path
+        self.outbox: Optional[Outbox] = None
+        self.delivery: Optional[OutboxDelivery] = None
+        # Next-due schedule: when enabled, only users with an item due today are read
+        self.use_schedule = REMINDER_SCHEDULE if use_schedule is None else use_schedule
+        self.schedule = ReminderSchedule(self.supabase, page_size=self.page_size)
+        # (index, count) when this worker handles one shard of the users; None means all users
+        self.shard = shard
+        # Set by the lease heartbeat when the shard being worked on is lost to another worker
+        self.lease_lost: Optional[threading.Event] = None
+        # The run's date, fixed when send_reminders starts; None means ask the clock
+        self.today: Optional[date] = None
+        # Recent reminder history, preloaded by send_reminders; None means query per check
+        self.reminder_history: Optional[ReminderHistoryIndex] = None
+        # Worker threads per stage when running the concurrent pipeline
+        self.pipeline_workers = {
+            "fetch": REMINDER_FETCH_WORKERS,
+            "evaluate": REMINDER_EVALUATE_WORKERS,
+            "render": REMINDER_RENDER_WORKERS,
+            "send": REMINDER_SEND_WORKERS
+        }
         self.tables = {
             "drivers": "drivers",
             "firearms": "firearms",
@@ -68,94 +182,101 @@ class LicenseReminderService:
             "psira_records": "psira_records",
             "competency": "competency"
         }
+        # Map license types used in settings to their actual table names
+        self.type_to_table_map = {
+            "drivers": "drivers",
+            "firearms": "firearms",
+            "prpd": "prpd",
+            "vehicles": "vehicles",
+            "works": "works",
+            "others": "other_documents",
+            "passports": "passports",
+            "tvlicenses": "tv_licenses",
+            "psira": "psira_records",
+            "competency": "competency"
+        }
+        # Tables that have status column, with the column and value that marks an active row
+        self.status_filters = {
+            "drivers": ("status", "active"),
+            "firearms": ("status", "active"),
+            "prpd": ("status", "active"),
+            "vehicles": ("status", "active"),
+            "works": ("status", "active"),
+            "psira_records": ("reg_status", "ACTIVE"),
+            "competency": ("status", "active")
+        }
+        # Tables whose expiry is not stored in expiry_date
+        self.expiry_fields = {
+            "psira_records": "certificate_expiry_date"
+        }
+        # Select lists built from the column registry, so only what the run reads is fetched
+        self.settings_select = select_list(columns_for("reminders", "license_type_settings"))
+        self.license_selects = {
+            table_name: select_list(self._license_columns(table_name)) for table_name in self.tables.values()
+        }
+        self.profile_select = select_list(columns_for("reminders", "profiles"),
+                                          {"license_type_settings": columns_for("reminders", "license_type_settings")})
+        # Direct Postgres source for users and license data; None reads through PostgREST
+        database_url = SUPABASE_DB_URL if database_url is None else database_url
+        self.postgres_source = PostgresLicenseSource(
+            database_url, self._license_sources(), fetch_size=POSTGRES_FETCH_SIZE,
+            profile_columns=columns_for("reminders", "profiles"),
+            settings_columns=columns_for("reminders", "license_type_settings")
+        ) if database_url else None
+
+    def _license_columns(self, table_name: str) -> Tuple[str, ...]:
+        """The columns the reminder run reads from a license table."""
+        status_field = self.status_filters[table_name][0] if table_name in self.status_filters else None
+        return license_columns("reminders", table_name, self.expiry_fields.get(table_name, "expiry_date"), status_field)
+
+    def _license_sources(self) -> List[LicenseSource]:
+        """Describe each license table, in self.tables order, for the direct Postgres query."""
+        table_to_type_map = {tbl_val: type_key for type_key, tbl_val in self.type_to_table_map.items()}
+        return [
+            LicenseSource(table_name, table_to_type_map.get(table_name, table_name),
+                          self.expiry_fields.get(table_name, "expiry_date"), self.status_filters.get(table_name),
+                          self._license_columns(table_name))
+            for table_name in self.tables.values()
+        ]
+
+    def settings_resolver(self, license_settings: Optional[Iterable[Dict[str, Any]]]) -> LicenseSettingsResolver:
+        """Index a user's license_type_settings rows by the table each type is stored in."""
+        return LicenseSettingsResolver(license_settings, self.type_to_table_map)
 
-    def get_license_data(self, user_id: str) -> Tuple[List[Dict], ...]:
-        """Fetch license-related data from the Supabase database."""
+    @timed("get_license_data")
+    def get_license_data(self, user_id: str, license_settings: Optional[List[Dict[str, Any]]] = None) -> Tuple[List[Dict], ...]:
+        """Fetch license-related data from the Supabase database.
+
+        license_settings are the user's license_type_settings rows, as embedded in their
+        profile; they are only queried when not given.
+        """
         try:
-            # First get all license type settings for this user
-            response = self.supabase.table("license_type_settings").select("*").eq("user_id", user_id).execute()
-            license_settings = response.data or []
-            
-            # Map license types used in settings to their actual table names
-            type_to_table_map = {
-                "drivers": "drivers",
-                "firearms": "firearms",
-                "prpd": "prpd",
-                "vehicles": "vehicles",
-                "works": "works",
-                "others": "other_documents",
-                "passports": "passports",
-                "tvlicenses": "tv_licenses",
-                "psira": "psira_records",
-                "competency": "competency"
-            }
+            if license_settings is None:
+                response = self.supabase.table("license_type_settings").select(self.settings_select).eq("user_id", user_id).execute()
+                license_settings = response.data or []
             
             # Log settings info concisely
             if license_settings:
-                logger.info(f"User {user_id}: Found {len(license_settings)} license type settings")
+                logger.info("User %s: Found %d license type settings", user_id, len(license_settings), extra={"user_id": user_id})
             
             results = [license_settings]
+            resolver = self.settings_resolver(license_settings)
+            window_end = self._reminder_window_end(resolver.settings())
 
-            # Tables that have status column
-            status_tables = ['drivers', 'firearms', 'prpd', 'vehicles', 'works', 'psira_records', 'competency']
-            
             found_count = 0
             for table_name in self.tables.values():
                 try:
-                    # Simple query without complex filters
-                    response = self.supabase.table(table_name).select("*").eq("user_id", user_id).execute()
-                    
-                    # Filter in Python instead of SQL
-                    data = response.data or []
-                    filtered_data = []
-                    
-                    # Use the correct expiry date field based on table
-                    expiry_field = 'expiry_date'
-                    if table_name == 'psira_records':
-                        expiry_field = 'certificate_expiry_date'
-                    
-                    for item in data:
-                        # Skip items with null expiry_date
-                        expiry_value = item.get(expiry_field)
-                        if not expiry_value:
-                            continue
-                            
-                        # For tables with status, check if status is active
-                        if table_name in status_tables:
-                            # Special check for psira_records
-                            if table_name == 'psira_records':
-                                if item.get("reg_status") != "ACTIVE":
-                                    continue
-                            elif item.get("status") != "active":
-                                continue
-                            
-                        # Add to filtered data
-                        item['table'] = table_name
-                        item['actual_expiry_field'] = expiry_field # Track which field holds the expiry
-                        filtered_data.append(item)
+                    # Status, expiry and reminder window filters run in the database
+                    query = self.supabase.table(table_name).select(self.license_selects[table_name]).eq("user_id", user_id)
+                    response = self._apply_license_filters(query, table_name, window_end).execute()
                     
+                    filtered_data = self._filter_table_rows(table_name, response.data or [])
                     found_count += len(filtered_data)
                     
-                    # Get reminder settings for each item
-                    settings_type = table_name # Default to table name
-                    for type_key, tbl_val in type_to_table_map.items():
-                        if tbl_val == table_name:
-                            settings_type = type_key
-                            break
-                            
-                    settings_response = self.supabase.table("license_type_settings") \
-                        .select("reminder_days_before,reminder_frequency,notifications_enabled") \
-                        .eq("user_id", user_id) \
-                        .eq("type", settings_type) \
-                        .execute()
-                    
-                    # Apply settings to each license item
-                    if settings_response.data:
-                        for item in filtered_data:
-                            settings_data = settings_response.data[0]
-                            item["reminder_days_before"] = settings_data.get("reminder_days_before", 7) # Default to 7
-                            item["reminder_frequency"] = settings_data.get("reminder_frequency", "weekly") # Default to weekly
-                            item["notifications_enabled_type"] = settings_data.get("notifications_enabled", False) # Check if enabled for this type
+                    # Apply the user's settings for the table's type to each license item
+                    settings_data = resolver.for_table(table_name)
+                    if settings_data:
+                        self._apply_type_settings(filtered_data, settings_data)
                     
                     results.append(filtered_data)
                 except Exception as e:
@@ -163,83 +284,194 @@ class LicenseReminderService:
                     results.append([])
             
             if found_count > 0:
-                logger.info(f"User {user_id}: Found {found_count} total licenses/documents")
+                logger.info("User %s: Found %d total licenses/documents", user_id, found_count, extra={"user_id": user_id})
             return tuple(results)
         except Exception as e:
             logger.error(f"Data fetch error for user {user_id}: {str(e)}")
             return tuple([[] for _ in range(len(self.tables) + 1)])
 
-    def filter_expiring_licenses(self, data: List[Dict[str, Any]], days_before: int) -> Tuple[List[Dict], List[Dict]]:
+    @timed("get_license_data")
+    def get_license_data_bulk(self, user_ids: List[str],
+                              resolvers: Optional[Dict[str, LicenseSettingsResolver]] = None) -> Dict[str, List[List[LicenseItem]]]:
+        """Fetch license data for a batch of users with one query per table, grouped by user.
+
+        resolvers hold each user's settings, built from their embedded profile data; the
+        batch's settings are only queried when they are not given.
+        """
+        grouped = {user_id: [[] for _ in self.tables] for user_id in user_ids}
+        if not user_ids:
+            return grouped
+
+        if resolvers is None:
+            settings_by_user = {user_id: [] for user_id in user_ids}
+            try:
+                settings_rows = self._select_for_users("license_type_settings", self.settings_select, user_ids)
+                for row in settings_rows:
+                    settings_by_user.setdefault(row.get("user_id"), []).append(row)
+            except Exception as e:
+                logger.warning(f"Error fetching license_type_settings for batch: {str(e)}")
+            resolvers = {user_id: self.settings_resolver(rows) for user_id, rows in settings_by_user.items()}
+
+        window_end = self._reminder_window_end(
+            settings_data for resolver in resolvers.values() for settings_data in resolver.settings()
+        )
+
+        for index, table_name in enumerate(self.tables.values()):
+            try:
+                rows = self._select_for_users(
+                    table_name, self.license_selects[table_name], user_ids,
+                    lambda query, table_name=table_name: self._apply_license_filters(query, table_name, window_end)
+                )
+            except Exception as e:
+                logger.warning(f"Error fetching {table_name} data for batch: {str(e)}")
+                continue
+
+            rows_by_user = {}
+            for item in self._filter_table_rows(table_name, rows):
+                rows_by_user.setdefault(item.user_id, []).append(item)
+
+            for user_id, items in rows_by_user.items():
+                if user_id not in grouped:
+                    continue
+                resolver = resolvers.get(user_id)
+                settings_data = resolver.for_table(table_name) if resolver else None
+                if settings_data:
+                    self._apply_type_settings(items, settings_data)
+                grouped[user_id][index] = items
+
+        found_count = sum(len(items) for tables in grouped.values() for items in tables)
+        logger.info(f"Batch of {len(user_ids)} users: Found {found_count} total licenses/documents")
+        return grouped
+
+    def _select_for_users(self, table_name: str, columns: str, user_ids: List[str],
+                          query_filter: Optional[Callable[[Any], Any]] = None) -> List[Dict]:
+        """Select rows belonging to any of the given users, paging past the PostgREST row cap."""
+        rows = []
+        start = 0
+        while True:
+            query = self.supabase.table(table_name).select(columns).in_("user_id", user_ids)
+            if query_filter:
+                query = query_filter(query)
+            response = query \
+                .order("id") \
+                .range(start, start + self.page_size - 1) \
+                .execute()
+            page = response.data or []
+            rows.extend(page)
+            if len(page) < self.page_size:
+                return rows
+            start += self.page_size
+
+    def _today(self) -> date:
+        return self.today or datetime.now().date()
+
+    def _reminder_window_end(self, license_settings: Iterable[Dict[str, Any]]) -> str:
+        """Return the last expiry date any of the given settings could remind about."""
+        longest_days_before = DEFAULT_REMINDER_DAYS_BEFORE
+        for settings_data in license_settings:
+            days_before = settings_data.get("reminder_days_before")
+            if isinstance(days_before, int) and days_before > longest_days_before:
+                longest_days_before = days_before
+        return (self._today() + timedelta(days=longest_days_before)).isoformat()
+
+    def _apply_license_filters(self, query, table_name: str, window_end: str):
+        """Restrict a license table query to active rows expiring inside the reminder window."""
+        expiry_field = self.expiry_fields.get(table_name, "expiry_date")
+        query = query \
+            .filter(expiry_field, "not.is", "null") \
+            .gte(expiry_field, self._today().isoformat()) \
+            .lte(expiry_field, window_end)
+        if table_name in self.status_filters:
+            status_field, status_value = self.status_filters[table_name]
+            query = query.eq(status_field, status_value)
+        return query
+
+    def _filter_table_rows(self, table_name: str, data: List[Dict]) -> List[LicenseItem]:
+        """Keep rows with an expiry date and an active status, as LicenseItems of their table."""
+        filtered_data = []
+
+        # Use the correct expiry date field based on table
+        expiry_field = self.expiry_fields.get(table_name, "expiry_date")
+
+        for row in data:
+            # For tables with status, check if status is active (the query already filters it)
+            if table_name in self.status_filters:
+                status_field, status_value = self.status_filters[table_name]
+                if row.get(status_field) != status_value:
+                    continue
+
+            # Rows with a null or unparseable expiry date are skipped
+            item = LicenseItem.from_row(table_name, row, expiry_field)
+            if item is not None:
+                filtered_data.append(item)
+
+        return filtered_data
+
+    @staticmethod
+    def _apply_type_settings(items: List[LicenseItem], settings_data: Dict[str, Any]) -> None:
+        """Resolve the reminder settings for a license type onto each of its items."""
+        for item in items:
+            item.apply_settings(settings_data)
+
+    @timed("filter_expiring_licenses")
+    def filter_expiring_licenses(self, data: List[LicenseItem], days_before: int) -> Tuple[List[LicenseItem], List[LicenseItem]]:
         """Filter licenses expiring within a specified number of days."""
         expiring_licenses = []
         paused_licenses = []
+        today = self._today()
         
         for item in data:
+            # Check if notifications are enabled for this specific type
+            if not item.notifications_enabled:
+                continue
+
+            # Calculate days until expiration
+            days_until_expiry = (item.expiry_date - today).days
+            
+            # Get reminder days setting for this license
+            reminder_days = days_before if item.reminder_days_before is None else item.reminder_days_before
+            
+            # Check if we should send reminder today
             try:
-                # Use the correct expiry field
-                expiry_field = item.get('actual_expiry_field', 'expiry_date')
-                expiry_date_str = item.get(expiry_field)
-                
-                if not expiry_date_str:
-                    continue
-                
-                # Parse expiry_date if it's a string
-                if isinstance(expiry_date_str, str):
-                    expiry_date = datetime.strptime(expiry_date_str, "%Y-%m-%d").date()
-                elif isinstance(expiry_date_str, datetime):
-                    expiry_date = expiry_date_str.date()
-                else:
-                    continue # Skip if not a valid date type
-                    
-                # Calculate days until expiration
-                days_until_expiry = (expiry_date - datetime.now().date()).days
-                
-                # Get reminder days setting for this license
-                reminder_days = item.get('reminder_days_before', days_before)
-                
-                # Check if notifications are enabled for this specific type
-                notifications_enabled = item.get('notifications_enabled_type', False)
-                if not notifications_enabled:
-                    continue
-                
-                # Check if we should send reminder today
                 if 0 <= days_until_expiry <= reminder_days:
-                    if item.get("notifications_paused", False):
+                    if item.notifications_paused:
                         paused_licenses.append(item)
                         continue
                     expiring_licenses.append(item)
-                    
-            except (ValueError, TypeError) as e:
-                logger.warning(f"Invalid date format for item ID {item.get('id')} field {expiry_field}: {e}")
+            except TypeError as e:
+                logger.warning("Invalid reminder_days_before for item ID %s: %s", item.id, e)
                 continue
             
         return expiring_licenses, paused_licenses
 
+    def build_message(self, to_email: str, subject: str, body: Dict[str, str]) -> MIMEMultipart:
+        """Assemble the MIME message for an HTML email with a plain-text alternative."""
+        msg = MIMEMultipart('alternative')
+        msg["Subject"] = subject
+        msg["From"] = EMAIL_USERNAME
+        msg["To"] = to_email
+
+        msg.attach(MIMEText(body['plain'], 'plain'))
+        msg.attach(MIMEText(body['html'], 'html'))
+        return msg
+
+    @timed("send_email")
     def send_email(self, to_email: str, subject: str, body: Dict[str, str]) -> Dict[str, Any]:
         """Send an HTML email notification."""
         try:
-            msg = MIMEMultipart('alternative')
-            msg["Subject"] = subject
-            msg["From"] = EMAIL_USERNAME
-            msg["To"] = to_email
-
-            msg.attach(MIMEText(body['plain'], 'plain'))
-            msg.attach(MIMEText(body['html'], 'html'))
-
-            with smtplib.SMTP(SMTP_SERVER, SMTP_PORT) as server:
-                server.starttls()
-                server.login(EMAIL_USERNAME, EMAIL_PASSWORD)
-                server.send_message(msg)
-                
-                logger.info(f"Email sent to {to_email}")
-                
-                return {
-                    "success": True,
-                    "to_email": to_email,
-                    "subject": subject,
-                    "sent_at": datetime.now().isoformat()
-                }
+            self.smtp_pool.send_message(self.build_message(to_email, subject, body))
+            self.metrics.increment("emails_total", result="success")
+            
+            logger.info("Email sent to %s", to_email)
+            
+            return {
+                "success": True,
+                "to_email": to_email,
+                "subject": subject,
+                "sent_at": datetime.now().isoformat()
+            }
         except Exception as e:
+            self.metrics.increment("emails_total", result="failure")
             logger.error(f"Email failed to {to_email}: {str(e)}")
             return {
                 "success": False,
@@ -249,31 +481,38 @@ class LicenseReminderService:
                 "attempted_at": datetime.now().isoformat()
             }
 
-    def create_notification(self, user_id: str, license_item: Dict[str, Any], message: str) -> None:
-        """Create a notification record in the notifications table."""
+    @timed("create_notification")
+    def create_notification(self, user_id: str, license_item: LicenseItem, message: str) -> None:
+        """Queue a notification record for the next batched insert into the notifications table."""
         try:
-            notification_data = {
-                "user_id": user_id,
-                "license_type": license_item["table"],
-                "license_id": license_item["id"],
-                "message": message,
-                "read": False
-            }
-            
-            self.supabase.table("notifications").insert(notification_data).execute()
+            self.notification_writer.add(self._notification_record(user_id, license_item, message))
         except Exception as e:
             logger.error(f"Failed to create notification for {user_id}: {str(e)}")
 
+    @staticmethod
+    def _notification_record(user_id: str, license_item: LicenseItem, message: str) -> Dict[str, Any]:
+        return {
+            "user_id": user_id,
+            "license_type": license_item.table,
+            "license_id": license_item.id,
+            "message": message,
+            "read": False
+        }
+
     def check_last_pause_notification(self, user_id: str, license_id: str) -> bool:
         """Check if a pause notification was sent in the last 5 days for this license."""
         try:
-            five_days_ago = (datetime.now() - timedelta(days=5)).isoformat()
+            if self.reminder_history is not None:
+                last_notice = self.reminder_history.last_pause_notice(user_id, license_id)
+                return last_notice is None or last_notice < datetime.now(timezone.utc) - timedelta(days=PAUSE_NOTICE_DAYS)
+
+            five_days_ago = (datetime.now() - timedelta(days=PAUSE_NOTICE_DAYS)).isoformat()
             
             response = self.supabase.table("notifications") \
-                .select("*") \
+                .select(select_list(columns_for("reminders", "notifications"))) \
                 .eq("user_id", user_id) \
                 .eq("license_id", license_id) \
-                .like("message", "Notifications paused until%") \
+                .like("message", f"{PAUSE_MESSAGE_PREFIX}%") \
                 .gte("created_at", five_days_ago) \
                 .execute()
             
@@ -282,70 +521,60 @@ class LicenseReminderService:
             logger.error(f"Notification check error: {str(e)}")
             return False  # On error, don't send notification
 
-    def build_email_body(self, user: Dict[str, Any], expiring_licenses: List[Dict[str, Any]], paused_licenses: List[Dict[str, Any]] = None) -> Dict[str, str]:
+    @timed("build_email_body")
+    def build_email_body(self, user: Dict[str, Any], expiring_licenses: List[LicenseItem], paused_licenses: List[LicenseItem] = None) -> Dict[str, str]:
         """Construct the email body using templates."""
-        template = env.get_template('email_template.html')
-        html_content = template.render(
+        # Render each item once; both the HTML and plain-text bodies are built from the entries
+        expiring_entries = [self.render_license_entry(license_item) for license_item in expiring_licenses]
+        paused_entries = []
+        for license_item in paused_licenses or []:
+            entry = self.render_license_entry(license_item)
+            entry["text"] += f" (Notifications will resume on {self._resume_date(license_item).isoformat()})"
+            paused_entries.append(entry)
+
+        html_content = self.email_template.render(
             user=user,
-            expiring_licenses=expiring_licenses,
-            paused_licenses=paused_licenses or [],
-            license_service=self
+            expiring_licenses=expiring_entries,
+            paused_licenses=paused_entries
         )
 
         plain_text = f"Hello {user['first_name']} {user['last_name']},\n\n"
         plain_text += "The following licenses/documents are nearing their expiry date:\n\n"
-        for license_item in expiring_licenses:
-            item_text = self.format_license_text(license_item)
-            plain_text += f"- {item_text}\n"
+        plain_text += "".join(f"- {entry['text']}\n" for entry in expiring_entries)
 
-        if paused_licenses:
+        if paused_entries:
             plain_text += "\nThe following licenses have paused notifications:\n\n"
-            for license_item in paused_licenses:
-                item_text = self.format_license_text(license_item)
-                paused_date_str = license_item.get("notifications_paused_date", datetime.now().strftime("%Y-%m-%d"))
-                paused_date = datetime.strptime(paused_date_str, "%Y-%m-%d")
-                enable_date = paused_date + timedelta(days=7)
-                item_text += f" (Notifications will resume on {enable_date.strftime('%Y-%m-%d')})"
-                plain_text += f"- {item_text}\n"
+            plain_text += "".join(f"- {entry['text']}\n" for entry in paused_entries)
 
         plain_text += "\nPlease take the necessary actions to renew them.\n\n"
         plain_text += "Best regards,\nRemlic Support Team"
 
         return {'plain': plain_text, 'html': html_content}
 
-    def format_license_text(self, license_item: Dict[str, Any]) -> str:
+    def _resume_date(self, license_item: LicenseItem) -> date:
+        """The day manage_notify switches a paused item's notifications back on: PAUSE_DAYS after its last update."""
+        updated_at = parse_created_at(license_item.updated_at)
+        paused_on = updated_at.date() if updated_at is not None else self._today()
+        return paused_on + timedelta(days=PAUSE_DAYS)
+
+    def render_license_entry(self, license_item: LicenseItem) -> Dict[str, Any]:
+        """Render the icon, plain-text line and HTML summary for a license item."""
+        return get_license_format(license_item.table).render(license_item, license_item.expiry_date.isoformat())
+
+    def format_license_text(self, license_item: LicenseItem) -> str:
         """Format the license text for email content."""
-        table = license_item.get('table', '')
-        expiry_field = license_item.get('actual_expiry_field', 'expiry_date')
-        expiry_date = license_item.get(expiry_field, 'N/A')
-        
-        if table == 'vehicles':
-            item_text = f"Vehicle License: {license_item.get('make', '')} {license_item.get('model', '')} ({license_item.get('registration_number', '')}) expires on {expiry_date}"
-        elif table == 'drivers':
-            item_text = f"Driver License for {license_item.get('first_name', '')} {license_item.get('last_name', '')} expires on {expiry_date}"
-        elif table == 'firearms':
-            item_text = f"Firearm License: {license_item.get('make_model', '')} ({license_item.get('registration_number', '')}) expires on {expiry_date}"
-        elif table == 'works':
-            item_text = f"Work Contract: {license_item.get('contract_name', '')} with {license_item.get('company_name', '')} expires on {expiry_date}"
-        elif table == 'passports':
-            item_text = f"Passport: {license_item.get('first_name', '')} {license_item.get('last_name', '')} ({license_item.get('passport_number', '')}) expires on {expiry_date}"
-        elif table == 'tv_licenses':
-            item_text = f"TV License: {license_item.get('first_name', '')} {license_item.get('last_name', '')} ({license_item.get('license_number', '')}) expires on {expiry_date}"
-        elif table == 'psira_records':
-            item_text = f"PSIRA Record: {license_item.get('first_name', '')} {license_item.get('last_name', '')} ({license_item.get('psira_number', '')}) expires on {expiry_date}"
-        elif table == 'competency':
-            item_text = f"Competency Certificate: {license_item.get('first_name', '')} {license_item.get('last_name', '')} ({license_item.get('firearm_type', '')}) expires on {expiry_date}"
-        else: # Handles other_documents
-            item_text = f"{license_item.get('description', 'Unnamed Document')} expires on {expiry_date}"
-        return item_text
+        return self.render_license_entry(license_item)["text"]
 
     def get_last_reminder_date(self, user_id: str) -> Optional[datetime]:
         """Get the date of the last reminder sent to the user."""
         try:
+            if self.reminder_history is not None:
+                return self.reminder_history.last_reminder_date(user_id)
+
             response = self.supabase.table("notifications") \
                 .select("created_at") \
                 .eq("user_id", user_id) \
-                .like("message", "License expiring%") \
+                .like("message", f"{REMINDER_MESSAGE_PREFIX}%") \
                 .order("created_at", desc=True) \
                 .limit(1) \
                 .execute()
@@ -353,17 +582,13 @@ class LicenseReminderService:
             if not response.data or len(response.data) == 0:
                 return None
                 
-            created_at = response.data[0].get("created_at")
-            
-            if isinstance(created_at, str):
-                return datetime.fromisoformat(created_at.replace("Z", "+00:00"))
-            return created_at
+            return parse_created_at(response.data[0].get("created_at"))
         except Exception as e:
             logger.error(f"Error retrieving last reminder date: {str(e)}")
             return None
 
     def should_send_reminder(self, 
-                           expiry_date: datetime, 
+                           expiry_date: date, 
                            last_reminder: Optional[datetime],
                            reminder_frequency: str,
                            reminder_days_before: int) -> bool:
@@ -373,17 +598,19 @@ class LicenseReminderService:
             if not isinstance(reminder_days_before, int) or reminder_days_before <= 0:
                 return False
             
-            # Ensure expiry_date is a datetime object
-            if not isinstance(expiry_date, datetime):
-                logger.warning(f"Expiry date is not a datetime object: {expiry_date}")
+            # Ensure expiry_date is a date (a datetime is compared by its date)
+            if isinstance(expiry_date, datetime):
+                expiry_date = expiry_date.date()
+            elif not isinstance(expiry_date, date):
+                logger.warning("Expiry date is not a date object: %s", expiry_date)
                 return False
             
             # Calculate the target reminder date
             target_reminder_date = expiry_date - timedelta(days=reminder_days_before)
-            current_date = datetime.now().date()  # Use date only for comparison
+            current_date = self._today()
             
             # Send if today is the target reminder date or between target and expiry
-            if not (target_reminder_date.date() <= current_date <= expiry_date.date()):
+            if not (target_reminder_date <= current_date <= expiry_date):
                  return False
             
             # If no previous reminder, send immediately if within window
@@ -407,8 +634,30 @@ class LicenseReminderService:
             logger.error(f"Reminder check error: {str(e)}")
             return False
 
-    def process_user_notifications(self, user: Dict[str, Any], license_settings: List[Dict[str, Any]], all_license_data: List[List[Dict[str, Any]]]) -> None:
-        """Process notifications for a single user based on their reminder settings."""
+    def process_user_notifications(self, user: Dict[str, Any], license_settings: List[Dict[str, Any]], all_license_data: List[List[LicenseItem]]) -> bool:
+        """Process notifications for a single user based on their reminder settings.
+
+        Returns False if their email could not be sent, so they are not counted as done.
+        """
+        pending = self.evaluate_user_notifications(user, license_settings, all_license_data)
+        if not pending:
+            return True
+
+        final_expiring_list, all_paused = pending
+        try:
+            email_body = self.build_email_body(user, final_expiring_list, all_paused)
+            return self._delivered(self.deliver_user_notifications(user, final_expiring_list, email_body, all_paused))
+        except Exception as e:
+            logger.error(f"Email processing error for user {user['id']}: {str(e)}")
+            return False
+
+    def evaluate_user_notifications(self, user: Dict[str, Any], license_settings: List[Dict[str, Any]],
+                                    all_license_data: List[List[LicenseItem]]) -> Optional[Tuple[List[LicenseItem], List[LicenseItem]]]:
+        """Work out which expiring and paused items the user should be emailed about, if any.
+
+        Expiring items are due by their type's reminder frequency; paused items are only
+        mentioned again once PAUSE_NOTICE_DAYS have passed since their last pause notice.
+        """
         user_id = user['id']
         user_email = user.get('email')
         all_expiring = []
@@ -416,133 +665,465 @@ class LicenseReminderService:
         
         if not user_email:
             logger.error(f"No email found for user {user_id}")
-            return
+            return None
         
-        # Get user's global settings (not used per type, but useful for defaults)
-        global_reminder_days_before = 7 # Default global days
-        global_reminder_frequency = "weekly" # Default global frequency
+        # The user's settings per table, with defaults filled in
+        resolver = self.settings_resolver(license_settings)
         
         # Process each license type fetched
         for license_type_data in all_license_data:
             if not license_type_data:
                 continue
             
-            # Get the table name from the first item
-            table_name = license_type_data[0].get('table') if license_type_data else None
-            if not table_name:
-                continue
-                
-            # Find the corresponding settings for this license type (table name)
-            type_settings = next((s for s in license_settings if s.get('type') == license_type_data[0].get('type_key')), None)
-            
-            # Use type-specific settings or fall back to defaults
-            type_reminder_days = type_settings.get("reminder_days_before", global_reminder_days_before) if type_settings else global_reminder_days_before
-            notifications_enabled_for_type = type_settings.get("notifications_enabled", False) if type_settings else False
-            
-            if not notifications_enabled_for_type:
-                # logger.info(f"User {user_id}: Notifications disabled for type {table_name}")
+            # Find the settings for this license type by the items' table
+            type_settings = resolver.for_table(license_type_data[0].table)
+            if not type_settings or not type_settings["notifications_enabled"]:
                 continue
             
             # Filter expiring licenses using type-specific settings
-            expiring, paused = self.filter_expiring_licenses(license_type_data, type_reminder_days)
+            expiring, paused = self.filter_expiring_licenses(license_type_data, type_settings["reminder_days_before"])
             
             all_expiring.extend(expiring)
             all_paused.extend(paused)
         
-        # Send email if there are any expiring or paused licenses
-        if all_expiring or all_paused:
-            try:
-                # Log what we're sending
-                if all_expiring:
-                    license_ids = [f"{item.get('table')}-{item.get('id')}" for item in all_expiring]
-                    logger.info(f"User {user_id}: Preparing notification for {len(all_expiring)} expiring items: {license_ids}")
-                
-                # Get last reminder date for the user (any type)
-                last_reminder_date = self.get_last_reminder_date(user_id)
-                
-                # Filter items that actually need a reminder based on frequency
-                final_expiring_list = []
-                for item in all_expiring:
-                    expiry_field = item.get('actual_expiry_field', 'expiry_date')
-                    expiry_date_str = item.get(expiry_field)
-                    if not expiry_date_str: continue
-                    
-                    expiry_date_obj = None
-                    if isinstance(expiry_date_str, str):
-                        expiry_date_obj = datetime.strptime(expiry_date_str, "%Y-%m-%d")
-                    elif isinstance(expiry_date_str, datetime):
-                        expiry_date_obj = expiry_date_str
-                    else:
-                        continue
-                        
-                    type_settings = next((s for s in license_settings if s.get('type') == item.get('type_key')), None)
-                    frequency = type_settings.get('reminder_frequency', global_reminder_frequency) if type_settings else global_reminder_frequency
-                    days_before = type_settings.get('reminder_days_before', global_reminder_days_before) if type_settings else global_reminder_days_before
-                    
-                    if self.should_send_reminder(expiry_date_obj, last_reminder_date, frequency, days_before):
-                        final_expiring_list.append(item)
-                        
-                # Only send if there are items in the final list after frequency check
-                if final_expiring_list or all_paused:
-                    logger.info(f"User {user_id}: Sending email for {len(final_expiring_list)} expiring and {len(all_paused)} paused items.")
-                    email_body = self.build_email_body(user, final_expiring_list, all_paused)
-                    email_result = self.send_email(user_email, "License Expiry Notification", email_body)
+        # Nothing to send if there are no expiring or paused licenses
+        if not (all_expiring or all_paused):
+            return None
+
+        try:
+            # Log what we're sending; the item IDs only when debugging
+            if all_expiring:
+                logger.info("User %s: Preparing notification for %d expiring items", user_id, len(all_expiring),
+                            extra={"user_id": user_id})
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("User %s: expiring items %s", user_id,
+                                 [f"{item.table}-{item.id}" for item in all_expiring], extra={"user_id": user_id})
+            
+            # Get last reminder date for the user (any type)
+            last_reminder_date = self.get_last_reminder_date(user_id)
+            
+            # Filter items that actually need a reminder based on frequency
+            final_expiring_list = []
+            for item in all_expiring:
+                type_settings = resolver.for_table(item.table)
+                if self.should_send_reminder(item.expiry_date, last_reminder_date,
+                                             type_settings["reminder_frequency"], type_settings["reminder_days_before"]):
+                    final_expiring_list.append(item)
                     
-                    if email_result["success"]:
-                        for license_item in final_expiring_list:
-                            expiry_field = license_item.get('actual_expiry_field', 'expiry_date')
-                            expiry_date = license_item.get(expiry_field)
-                            if isinstance(expiry_date, str):
-                                expiry_date = datetime.strptime(expiry_date, "%Y-%m-%d").date()
-                            elif isinstance(expiry_date, datetime):
-                                expiry_date = expiry_date.date()
-                                
-                            days_until = (expiry_date - datetime.now().date()).days
-                            message = f"Email sent: License expires in {days_until} days (on {expiry_date})"
-                            self.create_notification(user_id, license_item, message)
-                    else:
-                        logger.error(f"Email delivery failed for user {user_id}: {email_result['error']}")
-                        for license_item in final_expiring_list:
-                            message = f"Failed to send email: {email_result['error']}"
-                            self.create_notification(user_id, license_item, message)
-            except Exception as e:
-                logger.error(f"Email processing error for user {user_id}: {str(e)}")
+            paused_notices = [item for item in all_paused if self.check_last_pause_notification(user_id, item.id)]
+
+            # Only send if there are items in the final list after the frequency and pause notice checks
+            if not (final_expiring_list or paused_notices):
+                return None
 
-    def send_reminders(self):
+            logger.info("User %s: Sending email for %d expiring and %d paused items.", user_id,
+                        len(final_expiring_list), len(paused_notices), extra={"user_id": user_id})
+            return final_expiring_list, paused_notices
+        except Exception as e:
+            logger.error(f"Email processing error for user {user_id}: {str(e)}")
+            return None
+
+    def deliver_user_notifications(self, user: Dict[str, Any], final_expiring_list: List[LicenseItem],
+                                   email_body: Dict[str, str],
+                                   paused_licenses: Optional[List[LicenseItem]] = None) -> Optional[Dict[str, Any]]:
+        """Send the rendered reminder email and record a notification for each expiring and paused item."""
+        user_id = user['id']
+        # Claim today's send in the journal first so a restarted run cannot send it again
+        if self.journal is not None and not self.journal.mark_sending(user_id):
+            logger.warning("User %s: reminder already sent today, skipping", user_id, extra={"user_id": user_id})
+            return None
+
+        try:
+            if self.outbox is not None:
+                return self._queue_user_notifications(user, final_expiring_list, email_body, paused_licenses)
+            email_result = self.send_email(user.get('email'), "License Expiry Notification", email_body)
+        except Exception:
+            self._release_claim(user_id)
+            raise
+
+        if email_result["success"]:
+            if self.use_schedule:
+                self.schedule.record_sent(user_id, final_expiring_list, self._today())
+            for license_item in final_expiring_list:
+                days_until = (license_item.expiry_date - self._today()).days
+                self.create_notification(user_id, license_item, reminder_message(days_until, license_item.expiry_date))
+            for license_item in paused_licenses or []:
+                self.create_notification(user_id, license_item, pause_notice_message(self._resume_date(license_item)))
+        else:
+            logger.error(f"Email delivery failed for user {user_id}: {email_result['error']}")
+            for license_item in final_expiring_list:
+                message = f"Failed to send email: {email_result['error']}"
+                self.create_notification(user_id, license_item, message)
+            # Nothing was sent, so a rerun today may try again
+            self._release_claim(user_id)
+        return email_result
+
+    @staticmethod
+    def _delivered(email_result: Optional[Dict[str, Any]]) -> bool:
+        """False only for an email that was attempted and failed; None means it was skipped."""
+        return email_result is None or bool(email_result.get("success"))
+
+    def _release_claim(self, user_id: str) -> None:
+        if self.journal is not None:
+            self.journal.release(user_id)
+
+    def _queue_user_notifications(self, user: Dict[str, Any], final_expiring_list: List[LicenseItem],
+                                  email_body: Dict[str, str],
+                                  paused_licenses: Optional[List[LicenseItem]] = None) -> Dict[str, Any]:
+        """Spool the rendered email to the outbox, with the records to write once it is sent."""
+        user_id = user['id']
+        subject = "License Expiry Notification"
+        message = self.build_message(user.get('email'), subject, email_body)
+        on_sent = {
+            "notifications": [
+                self._notification_record(
+                    user_id, license_item,
+                    reminder_message((license_item.expiry_date - self._today()).days, license_item.expiry_date)
+                )
+                for license_item in final_expiring_list
+            ],
+            # Written only once the email is sent; a failed send reports on the expiring items alone
+            "pause_notices": [
+                self._notification_record(user_id, license_item, pause_notice_message(self._resume_date(license_item)))
+                for license_item in paused_licenses or []
+            ],
+            "schedule": self.schedule.sent_rows(user_id, final_expiring_list, self._today()) if self.use_schedule else []
+        }
+        if self.outbox.enqueue(idempotency_key(user_id, self._today()), user_id, user.get('email'),
+                               message.as_bytes(), on_sent):
+            self.delivery.notify()
+        else:
+            logger.warning("User %s: reminder already queued today, skipping", user_id, extra={"user_id": user_id})
+        return {
+            "success": True,
+            "queued": True,
+            "to_email": user.get('email'),
+            "subject": subject,
+            "queued_at": datetime.now().isoformat()
+        }
+
+    @timed("send_email")
+    def _send_outbox_entry(self, entry: OutboxEntry) -> None:
+        self.smtp_pool.send_message(message_from_bytes(entry.message))
+
+    def _on_outbox_sent(self, entry: OutboxEntry) -> None:
+        """Record a confirmed send: its notifications and, with the schedule on, the next due dates."""
+        self.metrics.increment("emails_total", result="success")
+        logger.info("Email sent to %s", entry.to_email)
+        for record in entry.on_sent.get("notifications", []) + entry.on_sent.get("pause_notices", []):
+            self.notification_writer.add(record)
+        self.schedule.record_rows(entry.user_id, entry.on_sent.get("schedule", []))
+
+    def _on_outbox_failed(self, entry: OutboxEntry, error: str) -> None:
+        self.metrics.increment("emails_total", result="failure")
+        logger.error(f"Email delivery failed for user {entry.user_id}: {error}")
+        for record in entry.on_sent.get("notifications", []):
+            self.notification_writer.add({**record, "message": f"Failed to send email: {error}"})
+
+    def _open_outbox(self) -> None:
+        """Open the outbox and start its delivery workers, which also pick up earlier runs' retries."""
+        self.outbox = Outbox(self.outbox_path)
+        self.delivery = OutboxDelivery(
+            self.outbox,
+            send=self._send_outbox_entry,
+            on_sent=self._on_outbox_sent,
+            on_failed=self._on_outbox_failed,
+            workers=OUTBOX_WORKERS,
+            max_attempts=OUTBOX_MAX_ATTEMPTS,
+            base_delay=OUTBOX_RETRY_DELAY,
+            max_delay=OUTBOX_MAX_RETRY_DELAY
+        ).start()
+
+    def _close_outbox(self) -> None:
+        """Wait for queued emails to be delivered or given up on, then stop the workers.
+
+        Emails still undelivered at the timeout are given up on rather than left for the
+        next run, which on a fresh CI runner would never see them: they get the failure
+        notifications, and their users' journal entries are dropped so a rerun can retry.
+        """
+        drained = self.delivery.drain(OUTBOX_DRAIN_TIMEOUT)
+        self.delivery.stop()
+        if not drained:
+            abandoned = self.outbox.abandon_pending("not delivered before the run ended")
+            logger.warning(f"Outbox: {len(abandoned)} emails still awaiting retry at the end of the run, "
+                           f"reporting them as failed")
+            for entry in abandoned:
+                self._on_outbox_failed(entry, "not delivered before the run ended")
+                if self.journal is not None and entry.idempotency_key == idempotency_key(entry.user_id, self.today):
+                    try:
+                        self.journal.release(entry.user_id)
+                    except Exception as e:
+                        logger.error(f"Could not release the journal entry of user {entry.user_id}: {str(e)}")
+        self.metrics.set_gauge("outbox_retries", self.delivery.retry_count)
+        self.metrics.set_gauge("outbox_pending", self.outbox.pending_count())
+        self.outbox.close()
+        self.outbox = None
+        self.delivery = None
+
+    def send_reminders(self, concurrent: Optional[bool] = None):
         """Main function to send reminders. Processes all users with active subscriptions."""
+        if concurrent is None:
+            concurrent = REMINDER_CONCURRENT
         try:
-            # Get all users with active subscriptions
+            logger.info(f"Processing reminders for active users ({self.profile_page_size} per page)")
+            # One date for the whole run, even if it crosses midnight
+            self.today = datetime.now().date()
+
+            # Load recent reminder history once and keep it current from this run's writes
+            self._load_reminder_history()
+            # Users finished by an earlier attempt at today's run are skipped
+            self.journal = self._open_journal()
+            if self.outbox_path:
+                self._open_outbox()
+            if self.shard is not None:
+                processed_count = self._run_shards(concurrent)
+            else:
+                processed_count = self._run_users(self._pending_entries(), concurrent)
+
+            logger.info(f"Completed processing reminders: {processed_count} active users processed")
+            self.metrics.set_gauge("users_processed", processed_count)
+        except Exception as e:
+            logger.error(f"Reminder processing error: {str(e)}")
+            raise
+        finally:
+            if self.outbox is not None:
+                self._close_outbox()
+            # Write out notifications still sitting in the buffer
+            written = self.notification_writer.flush()
+            logger.info(f"Notification records written: {written['written']}, failed: {written['failed']}")
+            self.metrics.set_gauge("notifications_written", written['written'])
+            self.metrics.set_gauge("notifications_failed", written['failed'])
+            if self.journal is not None:
+                self.journal.close()
+                self.journal = None
+
+    def _load_reminder_history(self) -> None:
+        self.reminder_history = ReminderHistoryIndex.load(
+            self.supabase,
+            datetime.now(timezone.utc) - timedelta(days=REMINDER_HISTORY_DAYS),
+            page_size=self.page_size
+        )
+        self.notification_writer.on_written = self.reminder_history.record_written
+
+    def _lease_is_lost(self) -> bool:
+        return self.lease_lost is not None and self.lease_lost.is_set()
+
+    def _open_journal(self) -> Optional[BaseRunJournal]:
+        if not self.journal_path:
+            return None
+        if self.journal_path != "supabase":
+            return RunJournal(self.journal_path, run_date=self.today)
+        try:
+            return SupabaseRunJournal(self.supabase, run_date=self.today, page_size=self.page_size)
+        except Exception as e:
+            logger.error(f"Run journal unavailable, a rerun today may send reminders again: {str(e)}")
+            return None
+
+    def _pending_entries(self, shard: Optional[int] = None) -> Iterator[Tuple[Dict[str, Any], Optional[List[List[LicenseItem]]]]]:
+        """Yield (user, license data or None) for users still to process, optionally only one shard's."""
+        if self.postgres_source is not None:
+            logger.info("Reading users and license data directly from Postgres")
+            entries = self.postgres_source.iter_users(self.today)
+        else:
+            users = self.iter_due_users() if self.use_schedule else self.iter_active_users()
+            entries = ((user, None) for user in users)
+        for entry in entries:
+            if self._lease_is_lost():
+                return
+            user_id = entry[0]['id']
+            if shard is not None and shard_of(user_id, self.shard[1]) != shard:
+                continue
+            if self.journal is None or not self.journal.should_skip(user_id):
+                yield entry
+
+    def _run_users(self, entries: Iterable[Tuple[Dict[str, Any], Any]], concurrent: bool) -> int:
+        # Users stream in page by page and are grouped into batches for the bulk fetch, or
+        # arrive with their license data from Postgres
+        batches = self._batched(entries, self.batch_size)
+        if concurrent:
+            return self._run_pipeline(batches)
+        return self._run_sequential(batches)
+
+    def _run_shards(self, concurrent: bool) -> int:
+        """Process this worker's shard, then any shard nobody has finished or holds a live lease on.
+
+        Shards are claimed through leases renewed while the shard is worked on, so a shard
+        whose worker died is picked up once its lease runs out. Before taking a shard over,
+        the reminder history is reloaded so the frequency checks see what the previous owner
+        sent, and the run journal's claim refuses users it was sending to. A worker that
+        loses its lease stops sending for the shard and leaves it unfinished for the new owner.
+        """
+        shard_index, shard_count = self.shard
+        leases = ShardLeaseTable(self.supabase, self._today(), shard_count, lease_seconds=SHARD_LEASE_SECONDS)
+        leases.prune()
+        processed_count = 0
+        for shard in [shard_index] + [other for other in range(shard_count) if other != shard_index]:
+            if not leases.acquire(shard):
+                continue
+            if shard != shard_index:
+                logger.info(f"Taking over shard {shard}/{shard_count}, reloading reminder history")
+                self.notification_writer.flush()
+                self._load_reminder_history()
+            logger.info(f"Processing shard {shard}/{shard_count} as {leases.owner}")
+            with leases.heartbeat(shard) as lease_lost:
+                self.lease_lost = lease_lost
+                try:
+                    shard_processed = self._run_users(self._pending_entries(shard), concurrent)
+                finally:
+                    self.lease_lost = None
+            processed_count += shard_processed
+            if lease_lost.is_set():
+                self.metrics.increment("shards_lost_total")
+                logger.warning(f"Stopped shard {shard}/{shard_count} after losing its lease: "
+                               f"{shard_processed} users processed")
+                continue
+            leases.complete(shard)
+            self.metrics.increment("shards_completed_total", takeover=str(shard != shard_index).lower())
+            logger.info(f"Completed shard {shard}/{shard_count}: {shard_processed} users processed")
+        return processed_count
+
+    def iter_active_users(self) -> Iterator[Dict[str, Any]]:
+        """Yield users with active subscriptions, paging through profiles by id cursor."""
+        last_id = None
+        while True:
+            query = self.supabase.table("profiles")\
+                .select(self.profile_select)\
+                .eq("subscription_status", "active")
+            if last_id is not None:
+                query = query.gt("id", last_id)
+            response = query.order("id").limit(self.profile_page_size).execute()
+
+            page = response.data or []
+            yield from page
+            if len(page) < self.profile_page_size:
+                return
+            last_id = page[-1]['id']
+
+    def iter_due_users(self) -> Iterator[Dict[str, Any]]:
+        """Yield active users with a reminder due today, falling back to all active users."""
+        try:
+            due_user_ids = self.schedule.due_user_ids(self._today())
+        except Exception as e:
+            logger.warning(f"Reminder schedule unavailable, checking all active users: {str(e)}")
+            yield from self.iter_active_users()
+            return
+
+        logger.info(f"Reminder schedule: {len(due_user_ids)} users have reminders due")
+        for user_ids in self._batched(due_user_ids, self.batch_size):
             response = self.supabase.table("profiles")\
-                .select("*, license_type_settings(*)")\
+                .select(self.profile_select)\
                 .eq("subscription_status", "active")\
+                .in_("id", user_ids)\
+                .order("id")\
                 .execute()
-                
-            active_users = response.data or []
-            logger.info(f"Processing reminders for {len(active_users)} active users")
-            processed_count = 0
-            
-            for user in active_users:
+            yield from response.data or []
+
+    @staticmethod
+    def _batched(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+        """Group an iterable into lists of at most size items."""
+        batch = []
+        for item in items:
+            batch.append(item)
+            if len(batch) >= size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def _fetch_batch(self, batch: List[Tuple[Dict[str, Any], Optional[List[List[LicenseItem]]]]]) -> List[Tuple[Dict[str, Any], List[List[LicenseItem]]]]:
+        """Pair each user with their license data, bulk-fetching it for users that came without."""
+        # Settings come embedded in each profile, so only the license tables are queried
+        resolvers = {
+            user['id']: self.settings_resolver(user.get('license_type_settings'))
+            for user, license_data in batch if license_data is None
+        }
+        grouped_license_data = self.get_license_data_bulk(list(resolvers), resolvers) if resolvers else {}
+        return [
+            (user, grouped_license_data.get(user['id'], []) if license_data is None else license_data)
+            for user, license_data in batch
+        ]
+
+    def _mark_done(self, user_id: str) -> None:
+        if self.journal is not None:
+            self.journal.mark_done(user_id)
+
+    def _run_sequential(self, batches: Iterable[List[Tuple[Dict[str, Any], Any]]]) -> int:
+        """Process each batch of users one user at a time on the calling thread."""
+        processed_count = 0
+        for batch in batches:
+            # Fetch license data for the whole batch, one query per table
+            for user, all_license_data in self._fetch_batch(batch):
+                if self._lease_is_lost():
+                    break
                 user_id = user['id']
                 try:
                     # Extract license settings from the user profile data
                     license_settings = user.get('license_type_settings', [])
                     
-                    # Fetch all license data for the user
-                    _, *all_license_data = self.get_license_data(user_id)
-                    
                     # Process notifications for this user
-                    self.process_user_notifications(user, license_settings, all_license_data)
+                    if self.process_user_notifications(user, license_settings, all_license_data):
+                        self._mark_done(user_id)
                     processed_count += 1
                 except Exception as e:
                     logger.error(f"Error processing user {user_id}: {str(e)}")
-            
-            logger.info(f"Completed processing reminders: {processed_count} active users processed")
-        except Exception as e:
-            logger.error(f"Reminder processing error: {str(e)}")
-            raise
+        return processed_count
+
+    def _run_pipeline(self, batches: Iterable[List[Tuple[Dict[str, Any], Any]]]) -> int:
+        """Process batches of users through concurrent fetch, evaluate, render and send stages."""
+
+        def fetch(batch):
+            return [
+                {"user": user, "license_data": license_data}
+                for user, license_data in self._fetch_batch(batch)
+            ]
+
+        def evaluate(work):
+            user = work["user"]
+            pending = self.evaluate_user_notifications(user, user.get('license_type_settings', []), work["license_data"])
+            if not pending:
+                self._mark_done(user['id'])
+                return None
+            work["expiring"], work["paused"] = pending
+            return work
+
+        def render(work):
+            work["email_body"] = self.build_email_body(work["user"], work["expiring"], work["paused"])
+            return work
+
+        def send(work):
+            # Users already in flight when the lease went are left to the new owner
+            if self._lease_is_lost():
+                return
+            email_result = self.deliver_user_notifications(work["user"], work["expiring"], work["email_body"], work["paused"])
+            if self._delivered(email_result):
+                self._mark_done(work["user"]['id'])
+
+        def describe(item):
+            if isinstance(item, list):
+                return f"batch of {len(item)} users"
+            return f"user {item['user']['id']}"
+
+        pipeline = StagedPipeline([
+            Stage("fetch", fetch, workers=self.pipeline_workers["fetch"], fan_out=True),
+            Stage("evaluate", evaluate, workers=self.pipeline_workers["evaluate"]),
+            Stage("render", render, workers=self.pipeline_workers["render"]),
+            Stage("send", send, workers=self.pipeline_workers["send"])
+        ], queue_size=REMINDER_QUEUE_SIZE, describe=describe)
+        completed = pipeline.run(batches)
+        return completed["evaluate"]
+
+def main(argv: List[str] = None) -> None:
+    parser = argparse.ArgumentParser(description="Send license expiry reminders to active users.")
+    parser.add_argument("--shard", metavar="i/N",
+                        help="process shard i of N (users split by a stable hash of their id), "
+                             "then help finish shards other workers left unfinished")
+    args = parser.parse_args(argv)
+    try:
+        shard = parse_shard(args.shard) if args.shard else None
+    except ValueError as e:
+        parser.error(str(e))
 
-def main() -> None:
-    license_service = LicenseReminderService(supabase)
+    license_service = LicenseReminderService(connect(), shard=shard)
     try:
         logger.info("Starting reminder service...")
         license_service.send_reminders()
@@ -550,6 +1131,9 @@ def main() -> None:
     except Exception as e:
         logger.critical(f"Reminder service failed critically: {str(e)}")
         raise
+    finally:
+        license_service.smtp_pool.close()
+        license_service.metrics.write(METRICS_FILE)
     
 if __name__ == "__main__":
     main()
@@ -0,0 +1,142 @@
+import os
+import time
+import uuid
+import socket
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta, timezone
+from typing import Iterator, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def parse_shard(spec: str) -> Tuple[int, int]:
+    """Parse an "i/N" shard spec into (index, count), with 0 <= index < count."""
+    try:
+        index, count = (int(part) for part in spec.split("/"))
+    except ValueError:
+        raise ValueError(f"Shard must look like i/N, got {spec!r}")
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Shard index must be between 0 and {count - 1}, got {spec!r}")
+    return index, count
+
+
+def shard_of(user_id: str, shard_count: int) -> int:
+    """Stable shard for a profile id: the same on every worker, process and Python version."""
+    digest = hashlib.sha1(str(user_id).encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % shard_count
+
+
+class ShardLeaseTable:
+    """Lease-based claims on the shards of one day's run, in the reminder_shard_leases table.
+
+    A claim is a conditional update that only succeeds while the shard is unfinished and
+    its lease is free, expired or already ours, so at most one live worker owns a shard.
+    The owner renews the lease while it works; if it dies the lease runs out and another
+    worker can take the shard over.
+    """
+
+    def __init__(self, supabase_client, run_date: date, shard_count: int, lease_seconds: float = 300,
+                 owner: Optional[str] = None, table: str = "reminder_shard_leases", retention_days: int = 7):
+        self.supabase = supabase_client
+        self.run_date = run_date
+        self.shard_count = shard_count
+        self.lease_seconds = lease_seconds
+        # Unique per run, so two workers in one process never share a claim
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.table = table
+        self.retention_days = retention_days
+
+    def _shard_query(self, query, shard: int):
+        return query \
+            .eq("run_date", self.run_date.isoformat()) \
+            .eq("shard_count", self.shard_count) \
+            .eq("shard", shard)
+
+    def prune(self) -> None:
+        """Drop leases of runs older than the retention window."""
+        try:
+            self.supabase.table(self.table) \
+                .delete() \
+                .lt("run_date", (self.run_date - timedelta(days=self.retention_days)).isoformat()) \
+                .execute()
+        except Exception as e:
+            logger.warning(f"Could not prune old shard leases: {str(e)}")
+
+    def acquire(self, shard: int) -> bool:
+        """Claim the shard if it is unfinished and nobody else holds a live lease on it."""
+        now = datetime.now(timezone.utc)
+        # Make sure the shard's row exists; a no-op if another worker created it first
+        self.supabase.table(self.table).upsert({
+            "run_date": self.run_date.isoformat(),
+            "shard_count": self.shard_count,
+            "shard": shard
+        }, on_conflict="run_date,shard_count,shard", ignore_duplicates=True).execute()
+
+        response = self._shard_query(self.supabase.table(self.table).update({
+            "owner": self.owner,
+            "lease_expires_at": (now + timedelta(seconds=self.lease_seconds)).isoformat(),
+            "updated_at": now.isoformat()
+        }), shard) \
+            .is_("completed_at", "null") \
+            .or_(f'lease_expires_at.is.null,lease_expires_at.lt."{now.isoformat()}",owner.eq."{self.owner}"') \
+            .execute()
+        return bool(response.data)
+
+    def renew(self, shard: int) -> bool:
+        """Extend our lease. False if it was lost to another worker."""
+        now = datetime.now(timezone.utc)
+        response = self._shard_query(self.supabase.table(self.table).update({
+            "lease_expires_at": (now + timedelta(seconds=self.lease_seconds)).isoformat(),
+            "updated_at": now.isoformat()
+        }), shard) \
+            .eq("owner", self.owner) \
+            .execute()
+        return bool(response.data)
+
+    def complete(self, shard: int) -> None:
+        now = datetime.now(timezone.utc).isoformat()
+        self._shard_query(self.supabase.table(self.table).update({
+            "completed_at": now,
+            "lease_expires_at": None,
+            "updated_at": now
+        }), shard) \
+            .eq("owner", self.owner) \
+            .execute()
+
+    @contextmanager
+    def heartbeat(self, shard: int) -> Iterator[threading.Event]:
+        """Keep renewing the shard's lease in the background while the block runs.
+
+        Yields an event that is set once the lease is lost: taken over by another worker,
+        or left unrenewed for so long that it may have run out. The block should stop
+        working on the shard when it is set.
+        """
+        stopped = threading.Event()
+        lost = threading.Event()
+
+        def renew_until_stopped():
+            renewed_at = time.monotonic()
+            while not stopped.wait(self.lease_seconds / 3):
+                try:
+                    if not self.renew(shard):
+                        logger.warning(f"Lease on shard {shard}/{self.shard_count} was taken over by another worker")
+                        lost.set()
+                        return
+                    renewed_at = time.monotonic()
+                except Exception as e:
+                    logger.warning(f"Could not renew lease on shard {shard}/{self.shard_count}: {str(e)}")
+                    if time.monotonic() - renewed_at >= self.lease_seconds:
+                        logger.warning(f"Lease on shard {shard}/{self.shard_count} may have run out, giving it up")
+                        lost.set()
+                        return
+
+        thread = threading.Thread(target=renew_until_stopped, name=f"lease-{shard}", daemon=True)
+        thread.start()
+        try:
+            yield lost
+        finally:
+            stopped.set()
+            thread.join()
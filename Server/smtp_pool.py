@@ -0,0 +1,139 @@
+import time
+import queue
+import smtplib
+import logging
+import threading
+from email.message import Message
+from typing import Optional
+
+from rate_limit import RateLimits, smtp_retry_after
+
+logger = logging.getLogger(__name__)
+
+
+class PooledSMTPConnection:
+    """A single authenticated SMTP session that counts the messages sent over it."""
+
+    def __init__(self, host: str, port: int, username: str, password: str, timeout: float,
+                 use_starttls: bool = True):
+        self.server = smtplib.SMTP(host, port, timeout=timeout)
+        if use_starttls:
+            self.server.starttls()
+        self.server.login(username, password)
+        self.messages_sent = 0
+        self.last_used = time.monotonic()
+
+    def send_message(self, msg: Message) -> None:
+        self.server.send_message(msg)
+        self.messages_sent += 1
+        self.last_used = time.monotonic()
+
+    def close(self) -> None:
+        try:
+            self.server.quit()
+        except Exception:
+            try:
+                self.server.close()
+            except Exception:
+                pass
+
+
+class SMTPConnectionPool:
+    """Send many messages over a small number of persistent, authenticated SMTP sessions.
+
+    Given rate limits (see rate_limit.RateLimits), sends run under an adaptive limiter for
+    the account and are retried with jittered backoff on 4xx throttling replies. Sessions
+    left idle longer than max_idle_seconds are closed rather than reused, since servers
+    drop idle clients, and a send that finds its session dropped retries on a new one.
+    """
+
+    # The server refused this message but the session is still usable
+    REJECTION_ERRORS = (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError)
+    # The session is unusable and the message may be retried on a fresh one
+    RECONNECT_ERRORS = (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, ConnectionError, TimeoutError)
+
+    def __init__(self, host: str, port: int, username: str, password: str,
+                 pool_size: int = 2, max_messages_per_connection: int = 100,
+                 timeout: float = 30.0, max_retries: int = 1, use_starttls: bool = True,
+                 limits: Optional[RateLimits] = None, max_idle_seconds: float = 60.0):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.pool_size = max(1, pool_size)
+        self.max_messages_per_connection = max(1, max_messages_per_connection)
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.use_starttls = use_starttls
+        self.limits = limits
+        self.max_idle_seconds = max_idle_seconds
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.pool_size)
+
+    def _connect(self) -> PooledSMTPConnection:
+        connection = PooledSMTPConnection(self.host, self.port, self.username, self.password,
+                                          self.timeout, self.use_starttls)
+        logger.debug("Opened SMTP connection to %s:%s", self.host, self.port)
+        return connection
+
+    def _acquire(self) -> PooledSMTPConnection:
+        while True:
+            try:
+                connection = self._idle.get_nowait()
+            except queue.Empty:
+                return self._connect()
+            if time.monotonic() - connection.last_used <= self.max_idle_seconds:
+                return connection
+            # Likely dropped by the server by now
+            connection.close()
+
+    def _release(self, connection: PooledSMTPConnection) -> None:
+        # Recycle sessions that have carried their share of messages
+        if connection.messages_sent >= self.max_messages_per_connection:
+            connection.close()
+            return
+        self._idle.put(connection)
+
+    def send_message(self, msg: Message) -> None:
+        """Send a message on a pooled connection, reconnecting if the session has dropped."""
+        if self.limits is None:
+            self._send_message(msg)
+        else:
+            self.limits.call(f"smtp:{self.username}@{self.host}", lambda: self._send_message(msg), smtp_retry_after)
+
+    def _send_message(self, msg: Message) -> None:
+        with self._slots:
+            connection: Optional[PooledSMTPConnection] = None
+            attempt = 0
+            while True:
+                try:
+                    if connection is None:
+                        # A retry opens a new session: other idle ones may have dropped too
+                        connection = self._acquire() if attempt == 0 else self._connect()
+                    connection.send_message(msg)
+                    self._release(connection)
+                    return
+                except self.REJECTION_ERRORS:
+                    self._release(connection)
+                    raise
+                except self.RECONNECT_ERRORS as e:
+                    if connection is not None:
+                        connection.close()
+                        connection = None
+                    if attempt >= self.max_retries:
+                        raise
+                    attempt += 1
+                    logger.warning(f"SMTP connection lost ({str(e)}), reconnecting")
+                except Exception:
+                    # Discard the session rather than reuse a connection in an unknown state
+                    if connection is not None:
+                        connection.close()
+                    raise
+
+    def close(self) -> None:
+        """Close every idle connection held by the pool. The pool reconnects if used again."""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
@@ -0,0 +1,230 @@
+-- Next reminder due date for every license item, so the daily reminder run reads only
+-- the items due today instead of every license row.
+--
+-- Rows are kept current by triggers on the license tables and on license_type_settings.
+-- send_reminders.py advances last_sent_at and next_due_date after each reminder it sends.
+-- next_due_date is never later than the first day send_reminders could send again, so
+-- the run still applies its own window and frequency checks to what it reads.
+
+create table if not exists public.reminder_schedule (
+    license_type text not null,
+    license_id text not null,
+    user_id uuid not null,
+    expiry_date date not null,
+    next_due_date date,
+    last_sent_at date,
+    updated_at timestamptz not null default now(),
+    primary key (license_type, license_id)
+);
+
+create index if not exists reminder_schedule_due_idx
+    on public.reminder_schedule (next_due_date, user_id)
+    where next_due_date is not null;
+
+create index if not exists reminder_schedule_user_idx
+    on public.reminder_schedule (user_id, license_type);
+
+alter table public.reminder_schedule enable row level security;
+
+-- License tables feeding the schedule: settings type, expiry column and optional status filter.
+-- Matches type_to_table_map, expiry_fields and status_filters in send_reminders.py.
+create or replace function public.reminder_schedule_sources()
+returns table (table_name text, settings_type text, expiry_column text, status_column text, active_value text)
+language sql
+immutable
+as $$
+    values
+        ('drivers', 'drivers', 'expiry_date', 'status', 'active'),
+        ('firearms', 'firearms', 'expiry_date', 'status', 'active'),
+        ('prpd', 'prpd', 'expiry_date', 'status', 'active'),
+        ('vehicles', 'vehicles', 'expiry_date', 'status', 'active'),
+        ('works', 'works', 'expiry_date', 'status', 'active'),
+        ('other_documents', 'others', 'expiry_date', '', ''),
+        ('passports', 'passports', 'expiry_date', '', ''),
+        ('tv_licenses', 'tvlicenses', 'expiry_date', '', ''),
+        ('psira_records', 'psira', 'certificate_expiry_date', 'reg_status', 'ACTIVE'),
+        ('competency', 'competency', 'expiry_date', 'status', 'active')
+$$;
+
+-- First day a reminder could go out: the start of the reminder window, or one frequency
+-- interval after the last send, whichever is later. Null once nothing more will be sent.
+-- Mirrors next_due_date() in reminder_schedule.py.
+create or replace function public.reminder_next_due(
+    expiry date,
+    days_before integer,
+    frequency text,
+    enabled boolean,
+    last_sent date
+)
+returns date
+language sql
+immutable
+as $$
+    select case when due is null or due > expiry then null else due end
+    from (
+        select case
+            when expiry is null or not coalesce(enabled, false) or coalesce(days_before, 7) <= 0 then null
+            else greatest(
+                expiry - coalesce(days_before, 7),
+                last_sent + case coalesce(frequency, 'weekly')
+                    when 'daily' then 1
+                    when 'weekly' then 7
+                    when 'monthly' then 28
+                end
+            )
+        end as due
+    ) as candidate
+$$;
+
+-- Keep one license table's row in the schedule. Trigger arguments: settings type, expiry
+-- column, status column ('' for none) and the status value that marks an active row.
+create or replace function public.reminder_schedule_sync_license()
+returns trigger
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+    settings_type text := tg_argv[0];
+    expiry_column text := tg_argv[1];
+    status_column text := tg_argv[2];
+    active_value text := tg_argv[3];
+    row_data jsonb;
+    expiry date;
+    enabled boolean;
+    days_before integer;
+    frequency text;
+begin
+    if tg_op = 'DELETE' then
+        delete from reminder_schedule where license_type = tg_table_name and license_id = old.id::text;
+        return old;
+    end if;
+
+    row_data := to_jsonb(new);
+    expiry := (row_data ->> expiry_column)::date;
+    if expiry is null or (status_column <> '' and row_data ->> status_column is distinct from active_value) then
+        delete from reminder_schedule where license_type = tg_table_name and license_id = new.id::text;
+        return new;
+    end if;
+
+    select s.notifications_enabled, s.reminder_days_before, s.reminder_frequency
+      into enabled, days_before, frequency
+      from license_type_settings s
+     where s.user_id = new.user_id and s.type = settings_type
+     limit 1;
+
+    insert into reminder_schedule (license_type, license_id, user_id, expiry_date, next_due_date)
+    values (tg_table_name, new.id::text, new.user_id, expiry,
+            reminder_next_due(expiry, days_before, frequency, enabled, null))
+    on conflict (license_type, license_id) do update set
+        user_id = excluded.user_id,
+        expiry_date = excluded.expiry_date,
+        next_due_date = reminder_next_due(excluded.expiry_date, days_before, frequency, enabled,
+                                          reminder_schedule.last_sent_at),
+        updated_at = now();
+    return new;
+end;
+$$;
+
+-- Recompute a user's items of one type when their reminder settings change
+create or replace function public.reminder_schedule_sync_settings()
+returns trigger
+language plpgsql
+security definer
+set search_path = public
+as $$
+begin
+    if tg_op in ('UPDATE', 'DELETE') then
+        update reminder_schedule rs
+           set next_due_date = null, updated_at = now()
+          from reminder_schedule_sources() src
+         where src.settings_type = old.type
+           and rs.license_type = src.table_name
+           and rs.user_id = old.user_id;
+    end if;
+
+    if tg_op in ('INSERT', 'UPDATE') then
+        update reminder_schedule rs
+           set next_due_date = reminder_next_due(rs.expiry_date, new.reminder_days_before,
+                                                 new.reminder_frequency, new.notifications_enabled,
+                                                 rs.last_sent_at),
+               updated_at = now()
+          from reminder_schedule_sources() src
+         where src.settings_type = new.type
+           and rs.license_type = src.table_name
+           and rs.user_id = new.user_id;
+        return new;
+    end if;
+    return old;
+end;
+$$;
+
+-- Rebuild the schedule from the license tables, keeping known last sends. Run once below
+-- to backfill, and safe to run again to reconcile after bulk changes made with triggers off.
+create or replace function public.rebuild_reminder_schedule()
+returns void
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+    src record;
+begin
+    for src in select * from reminder_schedule_sources() loop
+        execute format(
+            'delete from reminder_schedule rs
+              where rs.license_type = %1$L
+                and not exists (select 1 from %2$I l
+                                 where l.id::text = rs.license_id and l.%3$I is not null %4$s)',
+            src.table_name, src.table_name, src.expiry_column,
+            case when src.status_column <> '' then format('and l.%I = %L', src.status_column, src.active_value) else '' end
+        );
+        execute format(
+            'insert into reminder_schedule (license_type, license_id, user_id, expiry_date, next_due_date)
+             select %1$L, l.id::text, l.user_id, l.%3$I::date,
+                    reminder_next_due(l.%3$I::date, s.reminder_days_before, s.reminder_frequency,
+                                      s.notifications_enabled, rs.last_sent_at)
+               from %2$I l
+               left join lateral (
+                    select reminder_days_before, reminder_frequency, notifications_enabled
+                      from license_type_settings
+                     where user_id = l.user_id and type = %5$L
+                     limit 1
+               ) s on true
+               left join reminder_schedule rs on rs.license_type = %1$L and rs.license_id = l.id::text
+              where l.%3$I is not null %4$s
+             on conflict (license_type, license_id) do update set
+                user_id = excluded.user_id,
+                expiry_date = excluded.expiry_date,
+                next_due_date = excluded.next_due_date,
+                updated_at = now()',
+            src.table_name, src.table_name, src.expiry_column,
+            case when src.status_column <> '' then format('and l.%I = %L', src.status_column, src.active_value) else '' end,
+            src.settings_type
+        );
+    end loop;
+end;
+$$;
+
+do $$
+declare
+    src record;
+begin
+    for src in select * from public.reminder_schedule_sources() loop
+        execute format('drop trigger if exists reminder_schedule_sync on public.%I', src.table_name);
+        execute format(
+            'create trigger reminder_schedule_sync
+                after insert or update or delete on public.%I
+                for each row execute function public.reminder_schedule_sync_license(%L, %L, %L, %L)',
+            src.table_name, src.settings_type, src.expiry_column, src.status_column, src.active_value
+        );
+    end loop;
+end;
+$$;
+
+drop trigger if exists reminder_schedule_sync on public.license_type_settings;
+create trigger reminder_schedule_sync
+    after insert or update or delete on public.license_type_settings
+    for each row execute function public.reminder_schedule_sync_settings();
+
+select public.rebuild_reminder_schedule();
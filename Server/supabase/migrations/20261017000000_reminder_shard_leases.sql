@@ -0,0 +1,19 @@
+-- Lease-based claims on the shards of a sharded reminder run (send_reminders.py --shard i/N).
+--
+-- One row per shard per run date. A worker owns a shard while lease_expires_at is in the
+-- future and renews it while it works; once the lease runs out without completed_at being
+-- set, another worker may claim the shard and finish it.
+
+create table if not exists public.reminder_shard_leases (
+    run_date date not null,
+    shard_count integer not null,
+    shard integer not null,
+    owner text,
+    lease_expires_at timestamptz,
+    completed_at timestamptz,
+    updated_at timestamptz not null default now(),
+    primary key (run_date, shard_count, shard),
+    check (shard >= 0 and shard < shard_count)
+);
+
+alter table public.reminder_shard_leases enable row level security;
@@ -0,0 +1,27 @@
+-- High-water marks of the incremental scans made by manage_notify.py and check_subscriptions.py.
+--
+-- One row per job and scope (a table). watermark is the cutoff the last successful scan
+-- covered, so the next run only looks at rows that crossed the cutoff since; reconciled_at
+-- is when the scope was last scanned in full, which is repeated periodically as a safety net.
+
+create table if not exists public.job_watermarks (
+    job text not null,
+    scope text not null,
+    watermark timestamptz not null,
+    reconciled_at timestamptz,
+    updated_at timestamptz not null default now(),
+    primary key (job, scope)
+);
+
+alter table public.job_watermarks enable row level security;
+
+-- Incremental scans read a range of updated_at among paused rows, and of subscription end dates
+create index if not exists drivers_paused_updated_at_idx on public.drivers (updated_at) where notifications_paused;
+create index if not exists firearms_paused_updated_at_idx on public.firearms (updated_at) where notifications_paused;
+create index if not exists prpd_paused_updated_at_idx on public.prpd (updated_at) where notifications_paused;
+create index if not exists vehicles_paused_updated_at_idx on public.vehicles (updated_at) where notifications_paused;
+create index if not exists works_paused_updated_at_idx on public.works (updated_at) where notifications_paused;
+create index if not exists other_documents_paused_updated_at_idx on public.other_documents (updated_at) where notifications_paused;
+create index if not exists competency_paused_updated_at_idx on public.competency (updated_at) where notifications_paused;
+create index if not exists psira_records_paused_updated_at_idx on public.psira_records (updated_at) where notifications_paused;
+create index if not exists profiles_subscription_end_date_idx on public.profiles (subscription_end_date);
@@ -0,0 +1,18 @@
+-- Run journal of send_reminders.py: which users a day's reminder run has claimed or finished.
+--
+-- One row per user per run date, keyed by the same idempotency key as the email outbox.
+-- A worker inserts the row as 'sending' (doing nothing if it exists) before emailing the
+-- user, and only sends if its insert created the row; 'done' marks users fully processed.
+-- Kept in the database so a rerun on a fresh CI runner still knows who was emailed.
+
+create table if not exists public.reminder_journal (
+    idempotency_key text primary key,
+    run_date date not null,
+    user_id uuid not null,
+    status text not null check (status in ('sending', 'done')),
+    updated_at timestamptz not null default now()
+);
+
+create index if not exists reminder_journal_run_date_idx on public.reminder_journal (run_date);
+
+alter table public.reminder_journal enable row level security;
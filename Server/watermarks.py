@@ -0,0 +1,84 @@
+import os
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, NamedTuple, Optional
+
+from reminder_history import parse_created_at
+
+logger = logging.getLogger(__name__)
+
+# Incremental scans start this far before the last watermark, to allow for clock skew between hosts
+WATERMARK_OVERLAP_SECONDS = float(os.getenv("WATERMARK_OVERLAP_SECONDS") or 900)
+# Hours between full scans, the safety net for rows an incremental scan cannot see; 0 always scans in full
+WATERMARK_RECONCILE_HOURS = float(os.getenv("WATERMARK_RECONCILE_HOURS") or 24)
+
+
+class Watermark(NamedTuple):
+    # The cutoff the last successful scan covered: rows at or before it have been handled
+    value: datetime
+    # When the last successful full scan ran, None if none has
+    reconciled_at: Optional[datetime]
+
+
+class WatermarkStore:
+    """High-water marks of incremental scans, per job and scope, in the job_watermarks table.
+
+    A job that updates every row past a moving cutoff records the cutoff once a scan of a
+    scope (a table) succeeds; the next run only looks at rows that crossed the cutoff
+    since. Rows that got past an old cutoff without crossing it in between (a backdated
+    write, a row restored from backup) are only caught by a full scan, which runs when
+    the last one is older than the reconcile interval, and whenever the store is unusable.
+    """
+
+    def __init__(self, supabase_client, table: str = "job_watermarks",
+                 overlap_seconds: float = WATERMARK_OVERLAP_SECONDS,
+                 reconcile_hours: float = WATERMARK_RECONCILE_HOURS):
+        self.supabase = supabase_client
+        self.table = table
+        self.overlap = timedelta(seconds=overlap_seconds)
+        self.reconcile_interval = timedelta(hours=reconcile_hours)
+
+    def load(self, job: str) -> Dict[str, Watermark]:
+        """The job's watermarks by scope."""
+        response = self.supabase.table(self.table) \
+            .select("scope,watermark,reconciled_at") \
+            .eq("job", job) \
+            .execute()
+        marks = {}
+        for row in response.data or []:
+            value = parse_created_at(row.get("watermark"))
+            if value is not None:
+                marks[row["scope"]] = Watermark(value, parse_created_at(row.get("reconciled_at")))
+        return marks
+
+    def scan_starts(self, job: str, scopes: Iterable[str], full: bool = False) -> Dict[str, Optional[datetime]]:
+        """Where each scope's scan starts: just before its watermark, or None to scan it in full."""
+        scopes = list(scopes)
+        if full or not self.reconcile_interval:
+            return dict.fromkeys(scopes)
+        try:
+            marks = self.load(job)
+        except Exception as e:
+            logger.warning(f"Watermarks for {job} unavailable, scanning in full: {str(e)}")
+            return dict.fromkeys(scopes)
+
+        now = datetime.now(timezone.utc)
+        starts = {}
+        for scope in scopes:
+            mark = marks.get(scope)
+            if mark is None or mark.reconciled_at is None or now - mark.reconciled_at >= self.reconcile_interval:
+                starts[scope] = None
+            else:
+                starts[scope] = mark.value - self.overlap
+        return starts
+
+    def advance(self, job: str, scope: str, value: datetime, full: bool) -> None:
+        """Record a successful scan of scope up to value; a failure to record only costs a wider next scan."""
+        now = datetime.now(timezone.utc).isoformat()
+        row = {"job": job, "scope": scope, "watermark": value.isoformat(), "updated_at": now}
+        if full:
+            row["reconciled_at"] = now
+        try:
+            self.supabase.table(self.table).upsert(row, on_conflict="job,scope").execute()
+        except Exception as e:
+            logger.warning(f"Could not record the {job} watermark for {scope}: {str(e)}")